@@ -1,19 +1,37 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 
+from backend.app.warmup import configured_components, readiness
 from backend.routes.datasets import router as datasets_router
 from backend.routes.sequences import router as sequences_router
 from backend.routes.frames import router as frames_router
 from backend.routes.media import router as media_router
 from backend.routes.search import router as search_router   
 from backend.routes.caption import router as caption_router
+from backend.routes.export import router as export_router
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm in the background so the server accepts connections and /ready can report progress
+    readiness.start(configured_components())
+    yield
 
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 @app.get("/")
 def root():
     return {"status": "Navis backend running"}
 
+@app.get("/ready")
+def ready():
+    """Readiness probe: 200 once every configured component is warm, 503 while loading or failed."""
+    status = readiness.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
 from fastapi.middleware.cors import CORSMiddleware
 
 from fastapi.middleware.cors import CORSMiddleware
@@ -33,4 +51,4 @@ app.include_router(frames_router,    prefix="/frames")
 app.include_router(media_router)
 app.include_router(search_router) 
 app.include_router(caption_router)
-
+app.include_router(export_router)
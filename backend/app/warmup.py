@@ -0,0 +1,107 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+import os
+import threading
+import time
+import traceback
+
+import numpy as np
+
+# Components to preload at startup (comma-separated, "none" to disable). Default: whatever the
+# configured search backend needs plus the text encoder; "caption" (BLIP-large) is opt-in.
+WARMUP_COMPONENTS = os.environ.get("WARMUP_COMPONENTS")
+
+
+def _warm_index():
+    from backend.services.search_index import get_index
+    bundle = get_index()  # SEARCH_DEFAULT_MODEL; other models still load on their first request
+    # Shards already ran a raw probe on load; this also exercises the filter bitmaps and merge
+    dim = next(iter(bundle.shards.values())).index.d
+    bundle.search(np.zeros((1, dim), dtype=np.float32), 10)
+
+
+def _warm_pgvector():
+    from backend.services.embedding_models import get_embedding_model
+    from backend.services.pgvector_search import PGVECTOR_MODEL, get_pgvector_backend
+    dims = get_embedding_model(PGVECTOR_MODEL).dims
+    get_pgvector_backend().search(np.zeros((1, dims), dtype=np.float32), 1)
+
+
+def _warm_text_encoder():
+    from backend.services.embedding_models import get_embedding_model
+    from backend.services.text_embed import warm_up_text_encoder
+    warm_up_text_encoder(get_embedding_model().encoder)
+
+
+def _warm_caption():
+    from PIL import Image
+    from backend.routes.caption import get_caption_model
+    processor, model = get_caption_model()
+    inputs = processor(Image.new("RGB", (64, 64)), return_tensors="pt")
+    model.generate(**inputs, max_length=5, num_beams=1)
+
+
+COMPONENTS: Dict[str, Callable[[], None]] = {
+    "index": _warm_index,
+    "pgvector": _warm_pgvector,
+    "text_encoder": _warm_text_encoder,
+    "caption": _warm_caption,
+}
+
+
+def configured_components() -> List[str]:
+    if WARMUP_COMPONENTS is not None:
+        names = [name.strip() for name in WARMUP_COMPONENTS.split(",") if name.strip()]
+        if names == ["none"]:
+            return []
+        unknown = [name for name in names if name not in COMPONENTS]
+        if unknown:
+            print(f"⚠️ Unknown warm-up components ignored: {', '.join(unknown)}")
+        return [name for name in names if name in COMPONENTS]
+    search = "pgvector" if os.environ.get("SEARCH_BACKEND", "faiss") == "pgvector" else "index"
+    return [search, "text_encoder"]
+
+
+class Readiness:
+    """Per-component warm-up status: pending -> loading -> ready | failed, with load time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.components: Dict[str, dict] = {}
+
+    def _update(self, name: str, **fields):
+        with self._lock:
+            self.components[name].update(fields)
+
+    def _run(self, name: str):
+        started = time.time()
+        self._update(name, status="loading", started_at=started)
+        try:
+            COMPONENTS[name]()
+            self._update(name, status="ready", seconds=round(time.time() - started, 3))
+            print(f"✅ Warmed up {name} in {time.time() - started:.1f}s")
+        except Exception as e:
+            traceback.print_exc()
+            print(f"⚠️ Warm-up of {name} failed: {e}")
+            self._update(name, status="failed", seconds=round(time.time() - started, 3), error=str(e))
+
+    def start(self, names: List[str]) -> None:
+        """Warm ``names`` in parallel on background threads; returns immediately."""
+        with self._lock:
+            for name in names:
+                self.components[name] = {"status": "pending", "seconds": None, "error": None, "started_at": None}
+        if not names:
+            return
+        pool = ThreadPoolExecutor(max_workers=len(names), thread_name_prefix="warmup")
+        for name in names:
+            pool.submit(self._run, name)
+        pool.shutdown(wait=False)
+
+    def status(self) -> dict:
+        with self._lock:
+            components = {name: dict(c) for name, c in self.components.items()}
+        return {"ready": all(c["status"] == "ready" for c in components.values()), "components": components}
+
+
+readiness = Readiness()
@@ -63,4 +63,19 @@ CREATE TABLE IF NOT EXISTS navis.frames_staging (
     sensor TEXT,
     sample_token TEXT,
     media_key TEXT NOT NULL
-);
\ No newline at end of file
+);
+
+-- Google Drive file of each media_key, recorded by the gdrive ingest scripts so /media, captions
+-- and the workers resolve a frame with one lookup instead of walking the path folder by folder
+CREATE TABLE IF NOT EXISTS navis.drive_files (
+    dataset_id INTEGER NOT NULL REFERENCES navis.datasets(id),
+    media_key TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    size BIGINT,
+    md5 TEXT,
+    modified_time TIMESTAMPTZ,
+    PRIMARY KEY (dataset_id, media_key)
+);
+
+-- pgvector search backend (SEARCH_BACKEND=pgvector): backend/scripts/sync_pgvector.py adds
+-- navis.embeddings.emb_vec vector(512), a trigger that fills it from emb, and its HNSW index.
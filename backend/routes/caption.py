@@ -64,27 +64,31 @@ class BatchCaptionResponse(BaseModel):
 def generate_batch_captions(request: BatchCaptionRequest):
     """Generate captions for multiple frames by frame_id"""
     from backend.db.postgres import get_conn
-    from backend.services.drive import resolve_path, download_bytes
+    from backend.services.drive import drive_file_sql, resolve_path, download_bytes
     from psycopg.rows import dict_row
     
     if not request.frame_ids:
         return BatchCaptionResponse(captions=[])
     
     placeholders = ','.join(['%s'] * len(request.frame_ids))
-    sql = f"""
+    sql = """
     SELECT 
         f.id as frame_id,
         f.media_key,
-        d.media_base_uri
+        d.media_base_uri,
+        {file_id} AS file_id
     FROM navis.frames f
     JOIN navis.sequences s ON s.id = f.sequence_id
     JOIN navis.datasets d ON d.id = s.dataset_id
+    {drive_files_join}
     WHERE f.id IN ({placeholders})
     """
     
-    with get_conn() as conn, conn.cursor(row_factory=dict_row) as cur:
-        cur.execute(sql, request.frame_ids)
-        frames = cur.fetchall()
+    with get_conn() as conn:
+        sql = sql.format(placeholders=placeholders, **drive_file_sql(conn))
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(sql, request.frame_ids)
+            frames = cur.fetchall()
     
     frame_map = {row['frame_id']: row for row in frames}
     processor, model = get_caption_model()
@@ -104,7 +108,8 @@ def generate_batch_captions(request: BatchCaptionRequest):
             parsed_uri = urlparse(frame['media_base_uri'])
             root_id = parsed_uri.netloc
             
-            file_id = resolve_path(root_id, frame['media_key'])
+            # File id recorded at ingest; walk the path only for keys without one
+            file_id = frame['file_id'] or resolve_path(root_id, frame['media_key'])
             if not file_id:
                 raise Exception(f"Could not resolve path: {frame['media_key']}")
             
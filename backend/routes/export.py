@@ -0,0 +1,58 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import List, Literal, Optional
+
+from backend.services.embedding_models import get_embedding_model
+from backend.services.export import EXPORT_MAX_K, filter_chunks, ndjson_lines, query_chunks
+from backend.services.object_index import DEFAULT_MIN_CONFIDENCE
+from backend.services.search_index import get_index
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+
+def _object_list(objects: Optional[str]) -> Optional[List[str]]:
+    if not objects:
+        return None
+    return [obj.strip() for obj in objects.split(',') if obj.strip()]
+
+@router.get("/frames", summary="Stream frames of a query or filter set as NDJSON")
+def export_frames(
+    text: Optional[str] = Query(None, description="Natural language query (omit to export every frame matching the filters)"),
+    min_similarity: Optional[float] = Query(None, ge=-1.0, le=1.0, description="With text: every frame at or above this cosine similarity"),
+    k: Optional[int] = Query(None, ge=1, le=EXPORT_MAX_K, description="With text: the top-k frames instead of a threshold"),
+    dataset: Optional[str] = Query(None, description="Dataset slug filter (e.g. 'kitti')"),
+    sequence: Optional[str] = Query(None, description="Sequence name/scene filter"),
+    sensor: Optional[str] = Query(None, description="Sensor filter (e.g. 'image_02', 'CAM_FRONT')"),
+    objects: Optional[str] = Query(None, description="Comma-separated object types to filter (e.g., 'car,person')"),
+    objects_mode: Literal["any", "all"] = Query("any", description="Match frames with any or all of the objects"),
+    min_confidence: float = Query(DEFAULT_MIN_CONFIDENCE, ge=0.0, le=1.0, description="Minimum detection confidence for the object filter"),
+    model: Optional[str] = Query(None, description="Embedding model whose index to query (default: SEARCH_DEFAULT_MODEL)"),
+    limit: Optional[int] = Query(None, ge=1, description="Stop after this many frames (default: no limit)"),
+):
+    """
+    One JSON object per frame (frame_id, score, similarity, dataset, sequence, sensor,
+    media_key, sample_token, detections), then ``{"done": true, "count": ...}``.
+    Rows are read and written EXPORT_CHUNK_ROWS at a time (server-side cursor for
+    filter exports, windowed index scan for threshold queries), so the response
+    streams with chunked encoding and never holds the whole export. Unlike /search,
+    object types are not auto-detected from the query text.
+    """
+    filters = dict(dataset=dataset, sequence=sequence, sensor=sensor, objects=_object_list(objects),
+                   objects_mode=objects_mode, min_confidence=min_confidence)
+    if text is None:
+        chunks = filter_chunks(limit=limit, **filters)
+        trailer = {"mode": "filters"}
+    else:
+        if (min_similarity is None) == (k is None):
+            raise HTTPException(status_code=400, detail="A text export needs exactly one of min_similarity or k")
+        try:
+            model = get_embedding_model(model).key
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        try:
+            bundle = get_index(model)
+        except RuntimeError as e:
+            raise HTTPException(status_code=500, detail=f"FAISS index for {model} not loaded: {e}")
+        chunks = query_chunks(bundle, text, min_similarity=min_similarity, k=k, limit=limit, **filters)
+        trailer = {"mode": "query", "model": bundle.model, "index_version": bundle.version}
+    return StreamingResponse(ndjson_lines(chunks, trailer), media_type="application/x-ndjson")
@@ -1,19 +1,38 @@
-from fastapi import APIRouter, HTTPException, Response
+from fastapi import APIRouter, HTTPException, Query, Response
 from urllib.parse import urlparse
 from psycopg.rows import dict_row
 
 from functools import lru_cache
 import asyncio
+import os
 from concurrent.futures import ThreadPoolExecutor
 
 from backend.db.postgres import get_conn
-from backend.services.drive import resolve_path, download_bytes
+from googleapiclient.errors import HttpError
+
+from backend.services.drive import (
+    download_bytes, drive_file_sql, folder_listings, media_cache, remember_file_id, resolve_path,
+)
+from backend.services.media_cache import MemoryCache
+from backend.services.thumbnails import (
+    FORMATS, cache_variant, render_variants, snap_width, variant_cache, variant_key,
+)
 
 router = APIRouter(prefix="/media", tags=["media"])
 
 # Thread pool for non-blocking Drive downloads
 executor = ThreadPoolExecutor(max_workers=1)
 
+# Hot tier: recently served payloads by media_key, answered without the DB lookup,
+# executor hop or disk cache read (files over MEDIA_MEMORY_CACHE_MAX_ITEM_MB are not kept)
+MEDIA_MEMORY_CACHE_MB = float(os.environ.get("MEDIA_MEMORY_CACHE_MB", "256"))
+MEDIA_MEMORY_CACHE_MAX_ITEM_MB = float(os.environ.get("MEDIA_MEMORY_CACHE_MAX_ITEM_MB", "8"))
+hot_media = MemoryCache(int(MEDIA_MEMORY_CACHE_MB * 1024 * 1024), int(MEDIA_MEMORY_CACHE_MAX_ITEM_MB * 1024 * 1024))
+
+# Decoding/resizing is CPU-bound and releases the GIL in Pillow, so it gets its own pool
+# (the Drive executor stays single-threaded: the API client is not thread-safe)
+variant_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 4)
+
 @lru_cache(maxsize=1)
 def get_gdrive_root():
     """Cache the gdrive root URI to avoid repeated DB queries"""
@@ -28,26 +47,50 @@ def get_gdrive_root():
             row = cur.fetchone()
             return row['media_base_uri'] if row else None
 
-async def _serve_gdrive_async(path: str):
-    """Async wrapper to prevent blocking"""
+def _remember_file_id(dataset_id: int, media_key: str, file_id: str):
+    """Store a file id found by walking the path so the next request skips the walk."""
+    try:
+        with get_conn() as conn, conn.cursor() as cur:
+            remember_file_id(cur, dataset_id, media_key, file_id)
+            conn.commit()
+    except Exception as e:
+        print(f"[WARNING] Could not store file_id for {media_key}: {e}")
+
+def _media_response(path: str, data: bytes) -> Response:
+    return Response(
+        content=data,
+        media_type="image/png" if path.lower().endswith(".png") else "application/octet-stream",
+        headers={
+            "Cache-Control": "public, max-age=31536000",
+        }
+    )
+
+async def _load_gdrive_bytes(path: str) -> bytes:
+    """Original bytes of ``path`` from Drive (disk cache, stored file id or path walk)"""
     print(f"[DEBUG] Requested path: {path}")
     
-    # try to find dataset root by media_key join
+    # try to find dataset root (and the Drive file id recorded at ingest) by media_key join
     media_base_uri = None
+    dataset_id = None
+    file_id = None
     try:
         with get_conn() as conn:
+            parts = drive_file_sql(conn)
             with conn.cursor(row_factory=dict_row) as cur:
                 cur.execute("""
-                    SELECT d.media_base_uri
+                    SELECT d.id AS dataset_id, d.media_base_uri, {file_id} AS file_id
                     FROM navis.frames f
                     JOIN navis.sequences s ON f.sequence_id = s.id
                     JOIN navis.datasets d ON s.dataset_id = d.id
+                    {drive_files_join}
                     WHERE f.media_key = %s
                     LIMIT 1
-                """, (path,))
+                """.format(**parts), (path,))
                 row = cur.fetchone()
                 if row:
                     media_base_uri = row['media_base_uri']
+                    dataset_id = row['dataset_id']
+                    file_id = row['file_id']
                     print(f"[DEBUG] Found media_base_uri from frames: {media_base_uri}")
 
                 # fallback to cached gdrive dataset root
@@ -70,39 +113,116 @@ async def _serve_gdrive_async(path: str):
         raise HTTPException(status_code=500, detail=f"Bad media_base_uri: {media_base_uri}")
 
     root_id = parsed.netloc
-    print(f"[DEBUG] Resolving path with root_id={root_id}, path={path}")
     
     try:
         # Run blocking operations in thread pool
         loop = asyncio.get_event_loop()
-        file_id = await loop.run_in_executor(executor, resolve_path, root_id, path)
+        data = None
+        stale = False
+        if file_id:
+            print(f"[DEBUG] Stored file_id: {file_id}, downloading...")
+            try:
+                data = await loop.run_in_executor(executor, download_bytes, file_id)
+            except HttpError as e:
+                if e.resp.status != 404:
+                    raise
+                print(f"[DEBUG] Stored file_id {file_id} is gone, walking the path instead")
+                stale = True
         
-        if not file_id:
-            print(f"[ERROR] Drive file not found at: {path}")
-            raise HTTPException(status_code=404, detail=f"Drive file not found at: {path}")
-        
-        print(f"[DEBUG] Resolved to file_id: {file_id}, downloading...")
-        data = await loop.run_in_executor(executor, download_bytes, file_id)
+        if data is None:
+            print(f"[DEBUG] Resolving path with root_id={root_id}, path={path}")
+            # After a stale id the cached listings may still hold it: list the folders again
+            file_id = await loop.run_in_executor(executor, resolve_path, root_id, path, stale)
+            
+            if not file_id:
+                print(f"[ERROR] Drive file not found at: {path}")
+                raise HTTPException(status_code=404, detail=f"Drive file not found at: {path}")
+            
+            if dataset_id is not None:
+                await loop.run_in_executor(executor, _remember_file_id, dataset_id, path, file_id)
+            print(f"[DEBUG] Resolved to file_id: {file_id}, downloading...")
+            data = await loop.run_in_executor(executor, download_bytes, file_id)
         print(f"[DEBUG] Downloaded {len(data)} bytes")
-        
-        return Response(
-            content=data,
-            media_type="image/png" if path.lower().endswith(".png") else "application/octet-stream",
-            headers={
-                "Cache-Control": "public, max-age=31536000",
-            }
-        )
+        return data
     except HTTPException:
         raise
     except Exception as e:
         print(f"[ERROR] Drive error: {e}")
         raise HTTPException(status_code=500, detail=f"Drive error: {str(e)}")
 
+async def _serve_gdrive_async(path: str):
+    """Async wrapper to prevent blocking"""
+    data = await _load_gdrive_bytes(path)
+    hot_media.put(path, data, len(data))
+    return _media_response(path, data)
+
+def _variant_response(data: bytes, fmt: str) -> Response:
+    return Response(
+        content=data,
+        media_type=FORMATS[fmt][1],
+        headers={
+            "Cache-Control": "public, max-age=31536000",
+        }
+    )
+
+async def _serve_variant_async(path: str, width: int, fmt: str):
+    """Variant from the disk cache, or decoded and resized from the original once"""
+    loop = asyncio.get_event_loop()
+    key = variant_key(path, width, fmt)
+    data = await loop.run_in_executor(variant_executor, variant_cache.get, key)
+    if data is None:
+        original = hot_media.get(path)
+        if original is None:
+            original = await _load_gdrive_bytes(path)
+        try:
+            rendered = await loop.run_in_executor(variant_executor, render_variants, original, [width], fmt)
+        except Exception as e:
+            print(f"[ERROR] Could not render {path} at {width}px: {e}")
+            raise HTTPException(status_code=415, detail=f"Not a decodable image: {path}")
+        data = rendered[width]
+        await loop.run_in_executor(variant_executor, cache_variant, path, width, fmt, data)
+    hot_media.put(key, data, len(data))
+    return _variant_response(data, fmt)
+
+async def _serve_variant(path: str, w: int, fmt: str):
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format {fmt!r} (expected one of {', '.join(FORMATS)})")
+    width = snap_width(w)
+    data = hot_media.get(variant_key(path, width, fmt))
+    if data is not None:
+        return _variant_response(data, fmt)
+    try:
+        return await asyncio.wait_for(_serve_variant_async(path, width, fmt), timeout=120.0)
+    except asyncio.TimeoutError:
+        print(f"[ERROR] Timeout rendering {path}")
+        raise HTTPException(status_code=504, detail="Request timeout - download or resize took too long")
+
 @router.get("/gdrive/{path:path}")
 async def serve_gdrive(path: str):
     """Serve files from Google Drive with timeout"""
+    data = hot_media.get(path)
+    if data is not None:
+        return _media_response(path, data)
     try:
         return await asyncio.wait_for(_serve_gdrive_async(path), timeout=120.0)  # Changed from 30 to 60 seconds
     except asyncio.TimeoutError:
         print(f"[ERROR] Timeout downloading {path}")
-        raise HTTPException(status_code=504, detail="Request timeout - file download took too long")
\ No newline at end of file
+        raise HTTPException(status_code=504, detail="Request timeout - file download took too long")
+
+@router.get("/thumb/{path:path}", summary="Thumbnail of a media file")
+async def serve_thumb(path: str, w: int = Query(256, ge=1, description="Width in pixels, snapped up to a THUMB_WIDTHS size"),
+                      format: str = Query("webp", description="webp or jpeg")):
+    """Resized copy of a Drive media file for result grids (never upscaled), cached per (path, width, format)."""
+    return await _serve_variant(path, w, format)
+
+@router.get("/preview/{path:path}", summary="Large preview of a media file")
+async def serve_preview(path: str, w: int = Query(1024, ge=1, description="Width in pixels, snapped up to a THUMB_WIDTHS size"),
+                        format: str = Query("webp", description="webp or jpeg")):
+    """Like /media/thumb with a detail-view default width."""
+    return await _serve_variant(path, w, format)
+
+@router.get("/cache", summary="Media cache statistics")
+def cache_stats():
+    """In-memory hot tier, disk caches of downloaded files and resized variants (bytes, hits, misses, evictions) and Drive folder listing cache."""
+    return {"memory": hot_media.stats(), "disk": media_cache.stats(), "variants": variant_cache.stats(),
+            "folder_listings": folder_listings.stats()}
@@ -1,41 +1,28 @@
-from fastapi import APIRouter, HTTPException, Query
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Iterator, List, Literal, Optional
 from urllib.parse import urlparse
-from psycopg.rows import dict_row
-from pathlib import Path
+import json
+import os
 import numpy as np
-from collections import defaultdict
-# DON'T import faiss here - import it inside the function
 
+from backend.services.batcher import MicroBatcher
+from backend.services.text_embed import get_text_embeddings, text_cache_stats
 from backend.db.postgres import get_conn
-from backend.services.text_embed import get_text_embedding
+from backend.services.embedding_models import DEFAULT_MODEL, EMBEDDING_MODELS, EmbeddingModel, get_embedding_model
+from backend.services.frame_store import FrameStore, build_frame_store
+from backend.services.object_index import DEFAULT_MIN_CONFIDENCE
+from backend.services.pgvector_search import PGVECTOR_MODEL, get_pgvector_backend
+from backend.services.result_cache import get_result_cache
+from backend.services.search_sessions import SearchSessions
+from backend.services.search_index import IndexBundle, get_index, index_status, indexed_models, reload_index
 
 router = APIRouter(prefix="/search", tags=["search"])
 
-# Load FAISS index on startup
-BACKEND_ROOT = Path(__file__).resolve().parents[1]
-FAISS_INDEX_PATH = BACKEND_ROOT / "faiss_indexes" / "combined.index"
-FAISS_MAPPING_PATH = BACKEND_ROOT / "faiss_indexes" / "combined_mapping.npy"
-
-# Global variables for FAISS index
-_faiss_index = None
-_frame_id_mapping = None
-
-def load_faiss_index():
-    """Load FAISS index and frame ID mapping (lazy loading)"""
-    global _faiss_index, _frame_id_mapping
-    
-    if _faiss_index is not None:
-        return  # Already loaded
-    
-    if not FAISS_INDEX_PATH.exists():
-        raise RuntimeError(f"FAISS index not found at {FAISS_INDEX_PATH}")
-    
-    import faiss  # Import here instead of top of file
-    _faiss_index = faiss.read_index(str(FAISS_INDEX_PATH))
-    _frame_id_mapping = np.load(str(FAISS_MAPPING_PATH))
-    print(f"✅ Loaded FAISS index with {_faiss_index.ntotal} vectors")
+# Optional shared secret for the /search/admin endpoints (X-Admin-Token header)
+ADMIN_TOKEN = os.environ.get("NAVIS_ADMIN_TOKEN")
 
 
 class SearchHit(BaseModel):
@@ -47,11 +34,15 @@ class SearchHit(BaseModel):
     sequence: str
     sensor: str
     frame_number: str
+    duplicates: int = 0
 
 class SearchResponse(BaseModel):
     query: str
     k: int
+    model: Optional[str] = None
     hits: List[SearchHit]
+    next_cursor: Optional[str] = None
+    cached: bool = False
 
 def _media_url(media_base_uri: Optional[str], media_key: str) -> str:
     """
@@ -67,181 +58,478 @@ def _media_url(media_base_uri: Optional[str], media_key: str) -> str:
         return f"/media/gdrive/{media_key}"
     return f"/media/local/{media_key}"
 
-@router.get("", response_model=SearchResponse, summary="Semantic search over frames (FAISS-powered)")
-def search(
-    q: str = Query(..., alias="text", description="Natural language query"),
-    k: int = Query(50, ge=1, le=100, description="Top-K results"),
-    dataset: Optional[str] = Query(None, description="Dataset slug filter (e.g. 'kitti')"),
-    sequence: Optional[str] = Query(None, description="Sequence name/scene filter"),
-    objects: Optional[str] = Query(None, description="Comma-separated object types to filter (e.g., 'car,person')"),
-):
-    load_faiss_index()  # Load on first request, not at import
-    
-    if _faiss_index is None or _frame_id_mapping is None:
-        raise HTTPException(status_code=500, detail="FAISS index not loaded")
-    
-    # AUTO-DETECT object keywords in query
-    if not objects:
-        query_lower = q.lower()
-        keyword_map = {
-            'car': ['car', 'cars', 'vehicle', 'vehicles', 'automobile', 'automobiles'],
-            'person': ['person', 'people', 'pedestrian', 'pedestrians', 'human', 'humans', 'walking', 'standing', 'man', 'woman'],
-            'truck': ['truck', 'trucks', 'lorry', 'lorries'],
-            'bicycle': ['bicycle', 'bicycles', 'bike', 'bikes', 'cycling', 'cyclist', 'cyclists'],
-            'motorcycle': ['motorcycle', 'motorcycles', 'motorbike', 'motorbikes'],
-            'traffic light': ['traffic light', 'traffic lights', 'stoplight', 'stoplights', 'signal', 'signals'],
-            'bus': ['bus', 'buses'],
-            'dog': ['dog', 'dogs', 'puppy', 'puppies'],
-            'cat': ['cat', 'cats', 'kitten', 'kittens'],
-            'stop sign': ['stop sign', 'stop signs'],
-        }
-        
-        detected_objects = []
-        for obj_type, keywords in keyword_map.items():
-            if any(keyword in query_lower for keyword in keywords):
-                detected_objects.append(obj_type)
-        
-        if detected_objects:
-            objects = ','.join(detected_objects)
-            print(f"🔍 Auto-detected objects in query '{q}': {objects}")
+def _interleave_by_dataset(labels: np.ndarray) -> np.ndarray:
+    """
+    Order candidates round-robin across datasets while preserving ranking within
+    each dataset. ``labels`` holds one dataset label per ranked candidate;
+    returns positions into it.
+    """
+    codes = np.asarray(labels)
+    if len(codes) == 0:
+        return np.empty(0, dtype=np.int64)
     
-    # 1) Embed the text query
-    qvec = get_text_embedding(q)  # returns list[float] of length 512
-    qvec_np = np.array([qvec], dtype=np.float32)  # shape (1, 512)
+    # Rank of each candidate within its own dataset
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    group_start = np.r_[0, np.flatnonzero(np.diff(sorted_codes)) + 1]
+    group_size = np.diff(np.r_[group_start, len(codes)])
+    rank = np.empty(len(codes), dtype=np.int64)
+    rank[order] = np.arange(len(codes)) - np.repeat(group_start, group_size)
     
-    # 2) Determine search multiplier based on filters
-    multiplier = 3  # Default
+    # Datasets take turns in order of their best-ranked candidate
+    uniq, first_seen = np.unique(codes, return_index=True)
+    turn = first_seen[np.searchsorted(uniq, codes)]
     
+    return np.lexsort((turn, rank))
+
+def _hit_fields(store: FrameStore, row: int) -> dict:
+    """Decode the display metadata of one FAISS position (everything but the score)."""
+    code = int(store["dataset"][row])
+    media_key = store.string("media_key", row)
+    frame_id = int(store.frame_ids[row])
+    return {
+        'frame_id': frame_id,
+        'media_key': media_key,
+        'media_url': _media_url(store.vocabs["media_base_uri"][code], media_key),
+        'dataset': store.vocabs["name"][code] or store.vocabs["slug"][code],
+        'sequence': store.vocabs["sequence"][int(store["sequence"][row])],
+        'sensor': store.vocabs["sensor"][int(store["sensor"][row])] or 'N/A',
+        'frame_number': store.string("sample_token", row) or str(frame_id),
+    }
+
+# Keywords that switch on the object filter when no explicit `objects` is given
+OBJECT_KEYWORDS = {
+    'car': ['car', 'cars', 'vehicle', 'vehicles', 'automobile', 'automobiles'],
+    'person': ['person', 'people', 'pedestrian', 'pedestrians', 'human', 'humans', 'walking', 'standing', 'man', 'woman'],
+    'truck': ['truck', 'trucks', 'lorry', 'lorries'],
+    'bicycle': ['bicycle', 'bicycles', 'bike', 'bikes', 'cycling', 'cyclist', 'cyclists'],
+    'motorcycle': ['motorcycle', 'motorcycles', 'motorbike', 'motorbikes'],
+    'traffic light': ['traffic light', 'traffic lights', 'stoplight', 'stoplights', 'signal', 'signals'],
+    'bus': ['bus', 'buses'],
+    'dog': ['dog', 'dogs', 'puppy', 'puppies'],
+    'cat': ['cat', 'cats', 'kitten', 'kittens'],
+    'stop sign': ['stop sign', 'stop signs'],
+}
+
+def _object_list(q: str, objects: Optional[str]) -> Optional[List[str]]:
+    """Explicit comma-separated objects, or object types auto-detected from the query text."""
     if objects:
-        # Check if searching for rare objects
-        rare_objects = ['truck', 'motorcycle', 'traffic light', 'dog', 'bicycle', 'bus']
-        object_list = [obj.strip() for obj in objects.split(',')]
-        
-        if any(obj in rare_objects for obj in object_list):
-            multiplier = 50  # Much higher for rare objects
-        else:
-            multiplier = 10  # Normal for common objects like car/person
-    
-    search_k = min(k * multiplier, _faiss_index.ntotal)
-    distances, indices = _faiss_index.search(qvec_np, search_k)
-    
-    # 3) Map FAISS indices back to frame IDs
-    candidate_frame_ids = _frame_id_mapping[indices[0]].tolist()
-    candidate_distances = distances[0].tolist()
+        return [obj.strip() for obj in objects.split(',') if obj.strip()]
     
-    # 4) Fetch metadata from Postgres and apply filters
-    placeholders = ','.join(['%s'] * len(candidate_frame_ids))
+    query_lower = q.lower()
+    detected_objects = []
+    for obj_type, keywords in OBJECT_KEYWORDS.items():
+        if any(keyword in query_lower for keyword in keywords):
+            detected_objects.append(obj_type)
     
-    sql = f"""
-    WITH RankedFrames AS (
-        SELECT DISTINCT ON (f.media_key)
-            f.id        AS frame_id,
-            f.media_key AS media_key,
-            f.sample_token AS sample_token,
-            d.slug      AS dataset_slug,
-            d.name      AS dataset_name,
-            s.scene_token AS sequence_name,
-            s.sensor    AS sensor,
-            d.media_base_uri AS media_base_uri,
-            f.id as original_id
-        FROM navis.frames f
-        JOIN navis.sequences s ON s.id = f.sequence_id
-        JOIN navis.datasets d  ON d.id = s.dataset_id
-        WHERE f.id IN ({placeholders})
-        AND s.scene_token != '2011_09_26_drive_0001_sync'
-        ORDER BY f.media_key, f.id
+    if detected_objects:
+        print(f"🔍 Auto-detected objects in query '{q}': {','.join(detected_objects)}")
+        return detected_objects
+    return None
+
+def _rank(candidates: List[tuple], depth: int) -> List[tuple]:
+    """Merged (distance, shard, row) candidates interleaved across datasets, cut to ``depth``."""
+    slugs = {}
+    labels = np.array(
+        [slugs.setdefault(shard.store.vocabs["slug"][int(shard.store["dataset"][row])], len(slugs))
+         for _, shard, row in candidates],
+        dtype=np.int64,
     )
-    SELECT * FROM RankedFrames
-    WHERE 1=1
+    return [candidates[i] for i in _interleave_by_dataset(labels)[:depth]]
+
+def _build_hits(ranked: List[tuple], decoded: dict) -> List[SearchHit]:
+    """
+    Turn ranked (distance, shard, row) candidates into hits. ``decoded`` memoizes
+    hit metadata across queries ((shard, row) -> fields).
     """
-    
-    params = candidate_frame_ids
-    
-    # Apply dataset filter
-    if dataset:
-        sql += " AND dataset_slug = %s"
-        params.append(dataset)
-    
-    # Apply sequence filter
-    if sequence:
-        sql += " AND sequence_name = %s"
-        params.append(sequence)
-    
-    # Apply object filter
-    if objects:
-        object_list = [obj.strip() for obj in objects.split(',')]
-        placeholders_obj = ','.join(['%s'] * len(object_list))
-        sql += f"""
-            AND EXISTS (
-                SELECT 1 FROM navis.frame_objects fo
-                WHERE fo.frame_id = frame_id 
-                AND fo.object_type IN ({placeholders_obj})
-                AND fo.confidence > 0.5
-            )
-        """
-        params.extend(object_list)
-    
-    # Execute query
-    with get_conn() as conn, conn.cursor(row_factory=dict_row) as cur:
-        cur.execute(sql, params)
-        rows = cur.fetchall()
-    
-    # 5) Build response with dataset diversity
-    frame_id_to_row = {r['frame_id']: r for r in rows}
-    frame_id_to_distance = dict(zip(candidate_frame_ids, candidate_distances))
-    
-    # Group frames by dataset while preserving FAISS ranking order
-    dataset_frames = defaultdict(list)
-    seen_media_keys = set()
-    
-    for frame_id in candidate_frame_ids:
-        if frame_id in frame_id_to_row:
-            r = frame_id_to_row[frame_id]
-            media_key = r['media_key']
-            
-            # Skip duplicates
-            if media_key in seen_media_keys:
-                continue
-            
-            seen_media_keys.add(media_key)
-            dataset_name = r['dataset_name'] or r['dataset_slug']
-            
-            # Store frame data with its score
-            dataset_frames[dataset_name].append({
-                'frame_id': r['frame_id'],
-                'score': float(frame_id_to_distance[frame_id]),
-                'media_key': media_key,
-                'media_url': _media_url(r['media_base_uri'], media_key),
-                'dataset': dataset_name,
-                'sequence': r['sequence_name'],
-                'sensor': r['sensor'] or 'N/A',
-                'frame_number': r['sample_token'] or str(r['frame_id']),
-            })
-    
-    # Interleave results from different datasets for diversity
     hits: List[SearchHit] = []
-    dataset_iterators = {ds: iter(frames) for ds, frames in dataset_frames.items()}
-    datasets = list(dataset_iterators.keys())
+    for distance, shard, row in ranked:
+        key = (shard, row)
+        if key not in decoded:
+            decoded[key] = _hit_fields(shard.store, row)
+            if getattr(shard, "clusters", None) is not None:
+                decoded[key]["duplicates"] = shard.duplicates(row)
+        hits.append(SearchHit(score=distance, **decoded[key]))
+    return hits
+
+def _resolve_model(model: Optional[str]) -> EmbeddingModel:
+    """Registered embedding model for a ``model=`` parameter (None = SEARCH_DEFAULT_MODEL)."""
+    try:
+        return get_embedding_model(model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _ensure_index(model: Optional[str] = None) -> IndexBundle:
+    """Current index bundle of ``model`` (loaded on its first request, not at import)."""
+    model = _resolve_model(model).key
+    try:
+        return get_index(model)
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=f"FAISS index for {model} not loaded: {e}")
+
+# Text search backend: "faiss" (index files under faiss_indexes/) or "pgvector"
+# (HNSW index on navis.embeddings.emb_vec, filters applied in the same SQL statement)
+SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND", "faiss")
+
+def _ensure_backend(model: str):
+    """
+    Backend that serves text queries for ``model``; both expose search(qvecs, k, **filters).
+    emb_vec holds only PGVECTOR_MODEL's vectors, so other models always use FAISS.
+    """
+    if SEARCH_BACKEND == "pgvector" and model == PGVECTOR_MODEL:
+        return get_pgvector_backend()
+    return _ensure_index(model)
+
+def _filter_key(text: str, dataset: Optional[str], sequence: Optional[str], sensor: Optional[str],
+                objects: Optional[str], objects_mode: str, min_confidence: float) -> tuple:
+    """Hashable filter set for a query (queries with equal keys share one FAISS search)."""
+    object_list = _object_list(text, objects)
+    return (
+        ("dataset", dataset),
+        ("sequence", sequence),
+        ("sensor", sensor),
+        ("objects", tuple(sorted(object_list)) if object_list else None),
+        ("objects_mode", objects_mode),
+        ("min_confidence", min_confidence),
+    )
+
+def _run_queries(queries: List[tuple]) -> List[tuple]:
+    """
+    Search many (text, depth, model, filter key) queries at once: per model one
+    batched encode, and one multi-row search per distinct (filter set, depth), skipping
+    queries the result cache already holds for the loaded index version. Queries are
+    grouped by depth too: the candidate pool (and so the cross-dataset interleaving)
+    depends on k, so a query's ranking must not depend on its batch-mates. Returns
+    per query (up to ``depth`` ranked (distance, shard, row) candidates interleaved
+    across datasets, served-from-cache flag).
+    """
+    backends = {model: _ensure_backend(model) for model in {q[2] for q in queries}}
     
-    if not datasets:
-        return SearchResponse(query=q, k=k, hits=[])
+    results: List[Optional[tuple]] = [None] * len(queries)
+    groups = {}
+    for i, (text, depth, model, filters) in enumerate(queries):
+        ranked = _result_cache.get(backends[model], text, depth, filters)
+        if ranked is not None:
+            results[i] = (ranked, True)
+        else:
+            groups.setdefault((model, filters, depth), []).append(i)
     
-    # Round-robin through datasets
-    current_dataset_idx = 0
-    while len(hits) < k and dataset_iterators:
-        dataset = datasets[current_dataset_idx % len(datasets)]
-        
-        try:
-            frame_data = next(dataset_iterators[dataset])
-            hits.append(SearchHit(**frame_data))
-        except StopIteration:
-            # This dataset is exhausted, remove it
-            del dataset_iterators[dataset]
-            datasets.remove(dataset)
-            if not datasets:
-                break
-            continue
-        
-        current_dataset_idx += 1
+    # Encode only the misses, in one batch per model
+    qvecs = {}
+    for model in backends:
+        todo = [i for (group_model, _, _), idxs in groups.items() if group_model == model for i in idxs]
+        if todo:
+            encoded = get_text_embeddings([queries[i][0] for i in todo], EMBEDDING_MODELS[model].encoder)
+            qvecs.update(zip(todo, encoded))
     
-    return SearchResponse(query=q, k=k, hits=hits)
\ No newline at end of file
+    for (model, filters, depth), idxs in groups.items():
+        backend = backends[model]
+        group_candidates = backend.search(np.stack([qvecs[i] for i in idxs]), depth, **dict(filters))
+        for i, candidates in zip(idxs, group_candidates):
+            text = queries[i][0]
+            ranked = _rank(candidates, depth)
+            _result_cache.put(backend, text, depth, filters, ranked)
+            results[i] = (ranked, False)
+    return results
+
+# Concurrent /search requests arriving within SEARCH_BATCH_WINDOW_MS of each other (up to
+# SEARCH_BATCH_MAX) are run as one batched encode + search instead of one thread each.
+SEARCH_BATCH_WINDOW_MS = float(os.environ.get("SEARCH_BATCH_WINDOW_MS", "2"))
+SEARCH_BATCH_MAX = int(os.environ.get("SEARCH_BATCH_MAX", "32"))
+_result_cache = get_result_cache()
+_search_batcher = MicroBatcher(_run_queries, SEARCH_BATCH_WINDOW_MS, SEARCH_BATCH_MAX, name="search")
+
+# Each /search keeps its ranked candidates for SEARCH_SESSION_TTL seconds so /search/page can
+# serve further pages. /search itself ranks only k+1 (the extra one says whether a next page
+# exists); the first /search/page call searches again to SEARCH_SESSION_DEPTH, and later pages
+# are slices of that list with no encode or ANN search.
+SEARCH_SESSION_DEPTH = int(os.environ.get("SEARCH_SESSION_DEPTH", "1000"))
+SEARCH_SESSION_TTL = float(os.environ.get("SEARCH_SESSION_TTL", "600"))
+SEARCH_SESSION_MAX = int(os.environ.get("SEARCH_SESSION_MAX", "1000"))
+_sessions = SearchSessions(SEARCH_SESSION_TTL, SEARCH_SESSION_MAX)
+
+def _page_response(query: str, k: int, model: Optional[str], ranked: List[tuple], session_id: Optional[str],
+                   offset: int, cached: bool = False) -> SearchResponse:
+    """First k of ``ranked`` (candidates from rank ``offset`` on), with a cursor if any remain."""
+    next_cursor = None
+    if session_id is not None and len(ranked) > k:
+        next_cursor = _sessions.cursor(session_id, offset + k)
+    return SearchResponse(query=query, k=k, model=model, hits=_build_hits(ranked[:k], {}),
+                          next_cursor=next_cursor, cached=cached)
+
+@router.get("", response_model=SearchResponse, summary="Semantic search over frames (FAISS-powered)")
+async def search(
+    q: str = Query(..., alias="text", description="Natural language query"),
+    k: int = Query(50, ge=1, le=100, description="Top-K results"),
+    dataset: Optional[str] = Query(None, description="Dataset slug filter (e.g. 'kitti')"),
+    sequence: Optional[str] = Query(None, description="Sequence name/scene filter"),
+    sensor: Optional[str] = Query(None, description="Sensor filter (e.g. 'image_02', 'CAM_FRONT')"),
+    objects: Optional[str] = Query(None, description="Comma-separated object types to filter (e.g., 'car,person')"),
+    objects_mode: Literal["any", "all"] = Query("any", description="Match frames with any or all of the objects"),
+    min_confidence: float = Query(DEFAULT_MIN_CONFIDENCE, ge=0.0, le=1.0, description="Minimum detection confidence for the object filter"),
+    model: Optional[str] = Query(None, description="Embedding model (see /search/models; default: SEARCH_DEFAULT_MODEL)"),
+):
+    """
+    Explicit or auto-detected object filter, CLIP text embedding, filtered FAISS pass
+    on the relevant shard(s), results interleaved across datasets. Runs through the
+    micro-batcher, so concurrent requests share one encode and one search.
+    When more than k candidates match, ``next_cursor`` pages through them via /search/page.
+    """
+    model = _resolve_model(model).key
+    # Load the model's index (first use only) here, so a missing index fails this request, not its batch
+    backend = await run_in_threadpool(_ensure_backend, model)
+    filters = _filter_key(q, dataset, sequence, sensor, objects, objects_mode, min_confidence)
+    ranked, cached = await _search_batcher.submit((q, k + 1, model, filters))
+    session_id = _sessions.create(q, ranked, model, source=(backend, filters)) if len(ranked) > k else None
+    return _page_response(q, k, model, ranked, session_id, 0, cached=cached)
+
+def _deepen_session(session):
+    """Re-run a session's search to SEARCH_SESSION_DEPTH on the backend its first page came from."""
+    with session.lock:
+        if session.source is None:
+            return
+        backend, filters = session.source
+        qvecs = get_text_embeddings([session.query], EMBEDDING_MODELS[session.model].encoder)
+        candidates = backend.search(qvecs, SEARCH_SESSION_DEPTH, **dict(filters))[0]
+        session.deepen(_rank(candidates, SEARCH_SESSION_DEPTH))
+
+@router.get("/page", response_model=SearchResponse, summary="Next page of a previous search")
+async def search_page(
+    cursor: str = Query(..., description="next_cursor from a previous /search or /search/page response"),
+    k: int = Query(50, ge=1, le=500, description="Page size"),
+):
+    """
+    Slices the ranked candidates of the session. The first page call fetches them
+    to SEARCH_SESSION_DEPTH (query embedding from the cache, one ANN search); later
+    calls do no encode and no search.
+    """
+    resolved = _sessions.resolve(cursor)
+    if resolved is None:
+        raise HTTPException(status_code=404, detail="Search cursor expired or unknown; run the search again")
+    session, session_id, offset = resolved
+    if session.source is not None:
+        await run_in_threadpool(_deepen_session, session)
+    ranked = session.page(offset, k + 1)  # one extra candidate tells us whether a next page exists
+    return _page_response(session.query, k, session.model, ranked, session_id, offset)
+
+
+class SimilarResponse(BaseModel):
+    frame_id: int
+    k: int
+    model: str
+    source: Literal["graph", "search"]
+    hits: List[SearchHit]
+
+@router.get("/similar", response_model=SimilarResponse, summary="Frames that look like a given frame")
+def search_similar(
+    frame_id: int = Query(..., description="Frame to use as the query"),
+    k: int = Query(24, ge=1, le=100, description="Number of similar frames"),
+    model: Optional[str] = Query(None, description="Embedding model whose index to use (default: SEARCH_DEFAULT_MODEL)"),
+):
+    """
+    "More like this": neighbors from the kNN graph precomputed by build_faiss_index.py,
+    or a live search with the frame's stored vector when the graph has no entry.
+    """
+    bundle = _ensure_index(model)
+    located = bundle.locate(frame_id)
+    if located is None:
+        raise HTTPException(status_code=404, detail=f"Frame {frame_id} is not in the search index")
+    shard, row = located
+    source, distances, rows = shard.similar(row, k)
+    ranked = [(float(d), shard, int(r)) for d, r in zip(distances, rows)]
+    return SimilarResponse(frame_id=frame_id, k=k, model=bundle.model, source=source,
+                           hits=_build_hits(ranked, {}))
+
+
+class DuplicatesResponse(BaseModel):
+    frame_id: int
+    representative_id: int
+    hits: List[SearchHit]
+
+@router.get("/duplicates", response_model=DuplicatesResponse, summary="Near-duplicate frames collapsed into a hit")
+def search_duplicates(
+    frame_id: int = Query(..., description="Any frame of the cluster, usually a search hit"),
+    model: Optional[str] = Query(None, description="Embedding model whose index to use (default: SEARCH_DEFAULT_MODEL)"),
+):
+    """
+    Expands a near-duplicate cluster from the index build (--dedup-threshold).
+    Members come back in capture order with their squared L2 distance to the
+    representative as the score; metadata is read from Postgres on demand.
+    """
+    bundle = _ensure_index(model)
+    located = bundle.locate(frame_id)
+    if located is None:
+        raise HTTPException(status_code=404, detail=f"Frame {frame_id} is not in the search index")
+    shard, row = located
+    representative_id = int(shard.store.frame_ids[row])
+    if shard.clusters is None:
+        return DuplicatesResponse(frame_id=frame_id, representative_id=representative_id,
+                                  hits=_build_hits([(0.0, shard, row)], {}))
+    members, distances = shard.clusters.cluster(row)
+    with get_conn() as conn:
+        store = build_frame_store(conn, members)
+    hits = [SearchHit(score=float(d), **_hit_fields(store, i)) for i, d in enumerate(distances)]
+    return DuplicatesResponse(frame_id=frame_id, representative_id=representative_id, hits=hits)
+
+
+def _range_lines(bundle: IndexBundle, qvec: np.ndarray, radius: float, filters: dict,
+                 limit: Optional[int]) -> Iterator[bytes]:
+    """
+    NDJSON body of /search/range: one line per matching frame, written a window of
+    rows at a time, then a trailer line with the total (and whether ``limit`` cut it).
+    """
+    count = 0
+    truncated = False
+    for shard, distances, rows in bundle.range_search(qvec, radius, **filters):
+        if limit is not None and count + len(rows) > limit:
+            distances, rows = distances[:limit - count], rows[:limit - count]
+            truncated = True
+        lines = []
+        for distance, row in zip(distances.tolist(), rows.tolist()):
+            hit = _hit_fields(shard.store, row)
+            hit["score"] = distance
+            hit["similarity"] = 1.0 - distance / 2.0
+            if shard.clusters is not None:
+                hit["duplicates"] = shard.duplicates(row)
+            lines.append(json.dumps(hit))
+        count += len(lines)
+        if lines:
+            yield ("\n".join(lines) + "\n").encode()
+        if truncated:
+            break
+    yield (json.dumps({"done": True, "count": count, "truncated": truncated, "model": bundle.model}) + "\n").encode()
+
+@router.get("/range", summary="Every frame above a similarity threshold, streamed as NDJSON")
+def search_range(
+    q: str = Query(..., alias="text", description="Natural language query"),
+    min_similarity: float = Query(..., ge=-1.0, le=1.0, description="Cosine similarity threshold (CLIP text-image scores are typically 0.2-0.35)"),
+    dataset: Optional[str] = Query(None, description="Dataset slug filter (e.g. 'kitti')"),
+    sequence: Optional[str] = Query(None, description="Sequence name/scene filter"),
+    sensor: Optional[str] = Query(None, description="Sensor filter (e.g. 'image_02', 'CAM_FRONT')"),
+    objects: Optional[str] = Query(None, description="Comma-separated object types to filter (e.g., 'car,person')"),
+    objects_mode: Literal["any", "all"] = Query("any", description="Match frames with any or all of the objects"),
+    min_confidence: float = Query(DEFAULT_MIN_CONFIDENCE, ge=0.0, le=1.0, description="Minimum detection confidence for the object filter"),
+    model: Optional[str] = Query(None, description="Embedding model whose index to use (default: SEARCH_DEFAULT_MODEL)"),
+    limit: Optional[int] = Query(None, ge=1, description="Stop after this many frames (default: no limit)"),
+):
+    """
+    Scenario mining: instead of a top k, every frame whose similarity to the query
+    is at least ``min_similarity``. Results stream as application/x-ndjson, one
+    SearchHit per line plus ``similarity``, in index order per shard rather than by
+    score, followed by ``{"done": true, "count": ...}``. The index is scanned
+    FAISS_RANGE_WINDOW rows at a time, so memory stays flat however many frames
+    match. Always served from the FAISS index, whatever SEARCH_BACKEND is.
+    """
+    bundle = _ensure_index(model)
+    # Vectors are L2-normalized: ||a - b||^2 = 2 - 2 cos(a, b)
+    radius = 2.0 - 2.0 * min_similarity
+    qvec = get_text_embeddings([q], EMBEDDING_MODELS[bundle.model].encoder)[0]
+    filters = dict(_filter_key(q, dataset, sequence, sensor, objects, objects_mode, min_confidence))
+    return StreamingResponse(_range_lines(bundle, qvec, radius, filters, limit), media_type="application/x-ndjson")
+
+
+class BatchQuery(BaseModel):
+    text: str
+    k: Optional[int] = Field(None, ge=1, le=100, description="Overrides the request-level k")
+    dataset: Optional[str] = None
+    sequence: Optional[str] = None
+    sensor: Optional[str] = None
+    objects: Optional[str] = None
+    objects_mode: Optional[Literal["any", "all"]] = None
+    min_confidence: Optional[float] = Field(None, ge=0.0, le=1.0)
+    model: Optional[str] = None
+
+class BatchSearchRequest(BaseModel):
+    queries: List[BatchQuery] = Field(..., min_length=1, max_length=1000)
+    k: int = Field(50, ge=1, le=100, description="Top-K results per query")
+    dataset: Optional[str] = Field(None, description="Shared dataset filter (per-query value wins)")
+    sequence: Optional[str] = Field(None, description="Shared sequence filter (per-query value wins)")
+    sensor: Optional[str] = Field(None, description="Shared sensor filter (per-query value wins)")
+    objects: Optional[str] = Field(None, description="Shared object filter (per-query value wins)")
+    objects_mode: Literal["any", "all"] = Field("any", description="Shared object match mode (per-query value wins)")
+    min_confidence: float = Field(DEFAULT_MIN_CONFIDENCE, ge=0.0, le=1.0, description="Shared detection confidence threshold")
+    model: Optional[str] = Field(None, description="Shared embedding model (per-query value wins; default: SEARCH_DEFAULT_MODEL)")
+
+class BatchSearchResponse(BaseModel):
+    results: List[SearchResponse]
+
+@router.post("/batch", response_model=BatchSearchResponse, summary="Semantic search for many queries in one pass")
+def search_batch(request: BatchSearchRequest):
+    """
+    Embed all queries in one batched encode per model, run one multi-row FAISS search
+    per distinct model and filter set, and decode hit metadata once for the union of results.
+    """
+    # Resolve per-query filters, falling back to the shared ones
+    queries = [
+        (
+            query.text,
+            query.k or request.k,
+            _resolve_model(query.model or request.model).key,
+            _filter_key(
+                query.text,
+                query.dataset or request.dataset,
+                query.sequence or request.sequence,
+                query.sensor or request.sensor,
+                query.objects or request.objects,
+                query.objects_mode or request.objects_mode,
+                query.min_confidence if query.min_confidence is not None else request.min_confidence,
+            ),
+        )
+        for query in request.queries
+    ]
+    results = _run_queries(queries)
+    
+    decoded = {}
+    return BatchSearchResponse(results=[
+        SearchResponse(query=text, k=k, model=model, hits=_build_hits(ranked, decoded), cached=cached)
+        for (text, k, model, _), (ranked, cached) in zip(queries, results)
+    ])
+
+
+@router.get("/models", summary="Embedding models available for search")
+def search_models():
+    """Registered models, which have an index built (or pgvector vectors) and which are loaded."""
+    indexed = set(indexed_models())
+    loaded = index_status()["loaded"]
+    return {
+        "default": DEFAULT_MODEL,
+        "models": [
+            {
+                "model": m.key,
+                "encoder": m.encoder,
+                "dims": m.dims,
+                "indexed": m.key in indexed or (SEARCH_BACKEND == "pgvector" and m.key == PGVECTOR_MODEL),
+                "loaded": m.key in loaded,
+                "backend": "pgvector" if SEARCH_BACKEND == "pgvector" and m.key == PGVECTOR_MODEL else "faiss",
+            }
+            for m in EMBEDDING_MODELS.values()
+        ],
+    }
+
+
+@router.get("/cache", summary="Search cache statistics")
+def cache_stats():
+    return {"text_embeddings": text_cache_stats(), "results": _result_cache.stats(),
+            "batching": _search_batcher.stats(), "sessions": _sessions.stats()}
+
+
+def _check_admin(token: Optional[str]):
+    if ADMIN_TOKEN and token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@router.get("/admin/index", summary="Loaded index version and reload state")
+def admin_index(x_admin_token: Optional[str] = Header(None)):
+    _check_admin(x_admin_token)
+    return index_status()
+
+@router.post("/admin/reload", summary="Hot-reload the index the manifest points at")
+def admin_reload(
+    force: bool = Query(False, description="Reload even if the manifest version is unchanged"),
+    x_admin_token: Optional[str] = Header(None),
+):
+    """
+    Loads the new index version in the background and swaps it in atomically once
+    it is ready; requests already running finish on the previous version.
+    """
+    _check_admin(x_admin_token)
+    return reload_index(force=force)
@@ -0,0 +1,96 @@
+"""
+Compare query latency of the FAISS and pgvector search backends.
+
+Runs the same text queries (embedded once, so only the search is timed) through
+both backends with and without filters, and reports p50/p95/mean latency plus
+how many of FAISS's top-k frames pgvector also returned.
+
+    python backend/scripts/benchmark_search.py --k 50 --repeat 20 --dataset kitti
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+from backend.services.embedding_models import get_embedding_model
+from backend.services.pgvector_search import PGVECTOR_MODEL, PgVectorBackend
+from backend.services.search_index import get_index
+from backend.services.text_embed import get_text_embeddings
+
+DEFAULT_QUERIES = [
+    "cars on street",
+    "pedestrian crossing the road",
+    "truck on highway",
+    "cyclist in bike lane",
+    "parked cars at night",
+    "traffic light at intersection",
+    "empty road with trees",
+    "bus at a stop",
+]
+
+
+def _frame_ids(candidates, k):
+    return [int(shard.store.frame_ids[row]) for _, shard, row in candidates[:k]]
+
+
+def run(backend, qvecs, k, repeat, filters):
+    """Latencies (ms) of one-query searches, plus the last result per query."""
+    latencies, results = [], []
+    for qvec in qvecs:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            found = backend.search(qvec[None, :], k, **filters)[0]
+            latencies.append((time.perf_counter() - started) * 1000)
+        results.append(found)
+    return np.array(latencies), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark FAISS vs pgvector search latency')
+    parser.add_argument('--k', type=int, default=50, help='Results per query (default: 50)')
+    parser.add_argument('--repeat', type=int, default=10, help='Timed runs per query (default: 10)')
+    parser.add_argument('--queries', type=str, default=None, help='File with one query per line (default: built-in set)')
+    parser.add_argument('--dataset', type=str, default=None, help='Also benchmark with this dataset filter')
+    parser.add_argument('--objects', type=str, default=None, help='Also benchmark with this object filter (e.g. car,person)')
+    parser.add_argument('--ef-search', type=int, default=100, help='pgvector hnsw.ef_search (default: 100)')
+    args = parser.parse_args()
+
+    texts = DEFAULT_QUERIES
+    if args.queries:
+        texts = [line.strip() for line in Path(args.queries).read_text().splitlines() if line.strip()]
+    # Both backends must hold the same model's vectors: the one synced into emb_vec
+    model = get_embedding_model(PGVECTOR_MODEL)
+    qvecs = get_text_embeddings(texts, model.encoder)
+
+    backends = {"faiss": get_index(model.key), "pgvector": PgVectorBackend(ef_search=args.ef_search)}
+    scenarios = {"no filter": {}}
+    if args.dataset:
+        scenarios[f"dataset={args.dataset}"] = {"dataset": args.dataset}
+    if args.objects:
+        scenarios[f"objects={args.objects}"] = {"objects": [o.strip() for o in args.objects.split(",")]}
+
+    # Warm up connections, page cache and FAISS memory maps
+    for backend in backends.values():
+        backend.search(qvecs[:1], args.k)
+
+    print(f"{len(texts)} queries x {args.repeat} runs, k={args.k}, model {model.key}\n")
+    print(f"{'scenario':<24}{'backend':<10}{'p50 ms':>9}{'p95 ms':>9}{'mean ms':>9}{'overlap':>9}")
+    for scenario, filters in scenarios.items():
+        runs = {name: run(backend, qvecs, args.k, args.repeat, filters) for name, backend in backends.items()}
+        reference = [_frame_ids(found, args.k) for found in runs["faiss"][1]]
+        for name, (latencies, results) in runs.items():
+            overlap = np.mean([
+                len(set(ref) & set(_frame_ids(found, args.k))) / len(ref) if ref else 1.0
+                for ref, found in zip(reference, results)
+            ])
+            print(f"{scenario:<24}{name:<10}{np.percentile(latencies, 50):>9.2f}"
+                  f"{np.percentile(latencies, 95):>9.2f}{latencies.mean():>9.2f}{overlap:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,34 +4,291 @@ import numpy as np
 import faiss
 import json
 import argparse
+from datetime import datetime, timezone
 
 BACKEND_ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(BACKEND_ROOT))
 
 from db.postgres import get_conn
+from services.embedding_models import EMBEDDING_MODELS, LEGACY_MODEL, LEGACY_MODEL_ID, get_embedding_model, pending_legacy_embeddings
+from services.clusters import build_cluster_table, cluster_near_duplicates, clusters_path_for
+from services.frame_store import build_frame_store, store_path_for
+from services.knn_graph import build_knn_graph, knn_graph_path_for
+from services.rerank import rerank_exact, vectors_path_for
+from services.object_index import build_object_index, object_index_path_for
+from services.index_meta import (
+    activate_index, index_key, mapping_path_for, new_version, prune_versions, save_index_meta, search_parameters,
+)
 
-def build_faiss_index(dataset_slug='kitti'):
-    """Build FAISS index from embeddings in Postgres for a specific dataset"""
+# Index types selectable with --index-factory (anything else is passed to faiss.index_factory as-is)
+INDEX_PRESETS = {
+    "flat": "{storage}",
+    "ivf-flat": "IVF{nlist},{storage}",
+    "ivf-pq": "IVF{nlist},PQ{pq_m}x{pq_bits}",
+    "hnsw": "HNSW{hnsw_m},{storage}",
+    "opq-ivf-pq": "OPQ{pq_m},IVF{nlist},PQ{pq_m}x{pq_bits}",
+}
+
+# Vector encodings for the {storage} presets (--storage): 4, 2 or 1 bytes per dimension
+STORAGE_CODES = {
+    "float32": "Flat",
+    "float16": "SQfp16",
+    "int8": "SQ8",
+}
+
+# FAISS wants ~39 training points per centroid
+MIN_POINTS_PER_CENTROID = 39
+
+
+def save_frame_store(frame_ids, index_path, clusters=None):
+    """
+    Build the column store of frame metadata and the object posting lists that
+    search memory-maps next to the index. With near-duplicate ``clusters`` a
+    representative's postings cover the detections of all its members.
+    """
+    with get_conn() as conn:
+        store = build_frame_store(conn, np.array(frame_ids, dtype=np.int32))
+        rows_for_frame_ids = clusters.rows_for_frame_ids if clusters is not None else store.rows_for_frame_ids
+        objects = build_object_index(conn, rows_for_frame_ids, len(store))
+    store_path = store_path_for(index_path)
+    store.save(store_path)
+    print(f"✅ Saved frame metadata store to: {store_path}")
+    objects_path = object_index_path_for(index_path)
+    objects.save(objects_path)
+    print(f"✅ Saved object index ({len(objects.offsets)} object types) to: {objects_path}")
+
+
+def collapse_near_duplicates(embeddings_np, frame_ids, threshold):
+    """
+    Keep one representative per run of near-identical consecutive frames in a sequence.
+    Returns (representative embeddings, representative frame ids, ClusterTable).
+    """
+    frame_ids = np.array(frame_ids, dtype=np.int32)
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id, sequence_id FROM navis.frames WHERE id = ANY(%s)", (frame_ids.tolist(),))
+        sequence_of = {r['id']: r['sequence_id'] for r in cur.fetchall()}
+    sequence_ids = np.array([sequence_of.get(fid, -1) for fid in frame_ids.tolist()], dtype=np.int64)
+    
+    representatives, cluster = cluster_near_duplicates(embeddings_np, frame_ids, sequence_ids, threshold)
+    table = build_cluster_table(embeddings_np, frame_ids, representatives, cluster)
+    sizes = table.sizes
+    print(f"✅ Collapsed {len(frame_ids)} frames into {len(representatives)} clusters "
+          f"(cosine >= {threshold}, largest {sizes.max() if len(sizes) else 0}, "
+          f"{(sizes > 1).sum()} with duplicates)")
+    return embeddings_np[representatives], frame_ids[representatives], table
+
+
+def resolve_factory(index_factory, n, nlist=None, pq_m=64, hnsw_m=32, storage="float32"):
+    """Turn a preset name (or raw factory string) into a faiss.index_factory string sized for n vectors."""
+    template = INDEX_PRESETS.get(index_factory, index_factory)
+    if storage != "float32" and "{storage}" not in template:
+        print(f"⚠️ --storage {storage} only applies to the flat, ivf-flat and hnsw presets; ignoring it")
+    if nlist is None:
+        nlist = int(4 * np.sqrt(n))
+    nlist = max(1, min(nlist, n // MIN_POINTS_PER_CENTROID))
+    # 8-bit PQ codebooks need 256 * 39 training points; fall back to 4 bits on small datasets
+    pq_bits = 8 if n >= 256 * MIN_POINTS_PER_CENTROID else 4
+    return template.format(nlist=nlist, pq_m=pq_m, pq_bits=pq_bits, hnsw_m=hnsw_m, storage=STORAGE_CODES[storage])
+
+
+def build_index(embeddings_np, factory, nprobe=16, ef_search=64, train_sample=100_000, seed=0):
+    """
+    Build and fill an L2 index from a factory string, training on a random sample.
+    Returns (index, search_params) where search_params holds nprobe/efSearch for IVF/HNSW.
+    """
+    d = embeddings_np.shape[1]  # dimension (512 for CLIP)
+    index = faiss.index_factory(d, factory, faiss.METRIC_L2)
+    
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample_size = min(train_sample, len(embeddings_np))
+        sample = embeddings_np[rng.choice(len(embeddings_np), sample_size, replace=False)]
+        print(f"Training {factory} on {sample_size} vectors...")
+        index.train(sample)
+    
+    index.add(embeddings_np)
+    
+    search_params = {}
+    try:
+        faiss.extract_index_ivf(index)
+        search_params["nprobe"] = nprobe
+    except RuntimeError:
+        pass
+    if "HNSW" in factory:
+        search_params["efSearch"] = ef_search
+    return index, search_params
+
+
+def measure_recall(index, embeddings_np, search_params, k=10, n_queries=1000, rerank_factor=0, seed=0):
+    """
+    recall@k of ``index`` against an exact IndexFlatL2, using stored vectors as queries.
+    Each query's own vector is dropped from both the exact and the index results, so the
+    trivial self-match does not count as a hit.
+    With ``rerank_factor`` the index returns k * factor candidates that are re-scored exactly.
+    """
+    rng = np.random.default_rng(seed)
+    n_queries = min(n_queries, len(embeddings_np))
+    k = min(k, len(embeddings_np) - 1)
+    if k < 1:
+        return {"k": 0, "queries": 0, "recall_at_k": 1.0, "rerank_factor": rerank_factor}
+    query_ids = rng.choice(len(embeddings_np), n_queries, replace=False)
+    queries = embeddings_np[query_ids]
+    
+    exact = faiss.IndexFlatL2(embeddings_np.shape[1])
+    exact.add(embeddings_np)
+    _, truth = exact.search(queries, k + 1)
+    if rerank_factor > 1:
+        _, candidates = index.search(queries, (k + 1) * rerank_factor, params=search_parameters(search_params))
+        _, found = rerank_exact(embeddings_np, queries, candidates, k + 1)
+    else:
+        _, found = index.search(queries, k + 1, params=search_parameters(search_params))
+    
+    def others(rows):
+        return [[j for j in row if j != q][:k] for q, row in zip(query_ids.tolist(), rows.tolist())]
+    
+    hits = sum(len(set(t) & set(f)) for t, f in zip(others(truth), others(found)))
+    return {"k": k, "queries": n_queries, "recall_at_k": hits / (n_queries * k), "rerank_factor": rerank_factor}
+
+
+def save_index(embeddings_np, frame_ids, name, model=LEGACY_MODEL, index_factory="flat", nlist=None, pq_m=64,
+               hnsw_m=32, nprobe=16, ef_search=64, train_sample=100_000, recall_k=10, recall_queries=1000,
+               storage="float32", rerank_factor=0, dedup_threshold=0.0, knn_k=32, version=None, activate=True,
+               keep_versions=3):
+    """
+    Build the index for one name (dataset slug or 'combined') of one embedding model and
+    write index, mapping, metadata, frame store and kNN graph into
+    faiss_indexes/versions/<version>/<model>/. With
+    ``activate`` the manifest is then pointed at it, which running APIs pick up via hot reload.
+    With ``rerank_factor`` the float32 vectors are kept next to the index so search can
+    re-score k * factor candidates of a quantized index exactly. With ``dedup_threshold``
+    only one frame per near-duplicate cluster is indexed and the clusters are saved alongside.
+    """
+    n_frames = len(frame_ids)
+    clusters = None
+    if dedup_threshold > 0:
+        embeddings_np, frame_ids, clusters = collapse_near_duplicates(embeddings_np, frame_ids, dedup_threshold)
+    
+    factory = resolve_factory(index_factory, len(embeddings_np), nlist=nlist, pq_m=pq_m, hnsw_m=hnsw_m,
+                              storage=storage)
+    index, search_params = build_index(
+        embeddings_np, factory, nprobe=nprobe, ef_search=ef_search, train_sample=train_sample
+    )
+    print(f"✅ Built {factory} index with {index.ntotal} vectors")
+    
+    if factory == "Flat":
+        rerank_factor = 0  # already exact
+        recall = {"k": recall_k, "queries": 0, "recall_at_k": 1.0, "rerank_factor": 0}
+    else:
+        recall = measure_recall(index, embeddings_np, search_params, k=recall_k, n_queries=recall_queries,
+                                rerank_factor=rerank_factor)
+    print(f"   recall@{recall['k']} vs exact: {recall['recall_at_k']:.4f} ({recall['queries']} queries"
+          f"{f', rerank x{rerank_factor}' if rerank_factor > 1 else ''})")
+    
+    # Save index and mapping into a fresh version directory
+    index_dir = BACKEND_ROOT / "faiss_indexes"
+    version = version or new_version()
+    version_dir = index_dir / "versions" / version / model
+    version_dir.mkdir(parents=True, exist_ok=True)
+    
+    index_path = version_dir / f"{name}.index"
+    mapping_path = mapping_path_for(index_path)
+    
+    faiss.write_index(index, str(index_path))
+    np.save(mapping_path, np.array(frame_ids, dtype=np.int32))
+    if rerank_factor > 1:
+        np.save(vectors_path_for(index_path), embeddings_np.astype(np.float32))
+    
+    meta_path = save_index_meta(index_path, {
+        "factory": factory,
+        "preset": index_factory if index_factory in INDEX_PRESETS else None,
+        "model": model,
+        "metric": "L2",
+        "dim": int(embeddings_np.shape[1]),
+        "ntotal": int(index.ntotal),
+        "dedup": {"threshold": dedup_threshold, "frames": n_frames, "clusters": len(frame_ids)} if clusters is not None else None,
+        "storage": storage if "{storage}" in INDEX_PRESETS.get(index_factory, "") else None,
+        "index_bytes": index_path.stat().st_size,
+        "rerank": {"factor": rerank_factor, "vectors": vectors_path_for(index_path).name} if rerank_factor > 1 else None,
+        "search_params": search_params,
+        "recall": recall,
+        "knn_k": knn_k,
+        "version": version,
+        "built_at": datetime.now(timezone.utc).isoformat(),
+    })
+    
+    print(f"✅ Saved FAISS index to: {index_path} ({index_path.stat().st_size / 2**20:.1f} MiB)")
+    print(f"✅ Saved frame ID mapping to: {mapping_path}")
+    print(f"✅ Saved index metadata to: {meta_path}")
+    
+    save_frame_store(frame_ids, index_path, clusters)
+    if clusters is not None:
+        clusters_path = clusters_path_for(index_path)
+        clusters.save(clusters_path)
+        print(f"✅ Saved near-duplicate clusters to: {clusters_path}")
+    
+    if knn_k > 0:
+        graph = build_knn_graph(index, embeddings_np, knn_k, params=search_parameters(search_params))
+        graph_path = knn_graph_path_for(index_path)
+        graph.save(graph_path)
+        print(f"✅ Saved {graph.k}-NN graph to: {graph_path}")
+    
+    if activate:
+        key = index_key(model, name)
+        manifest = activate_index(index_dir, key, index_path, replaces=name if model == LEGACY_MODEL else None)
+        print(f"✅ Activated {key} = {manifest['indexes'][key]} (manifest version {manifest['version']})")
+        removed = prune_versions(index_dir, keep=keep_versions)
+        if removed:
+            print(f"   Pruned old versions: {', '.join(removed)}")
+
+
+def _check_legacy(cur, model):
+    """Warn when embeddings of ``model`` still sit under the pre-registry model id (not selected by name)."""
+    if model != LEGACY_MODEL:
+        return
+    pending = pending_legacy_embeddings(cur)
+    if pending:
+        print(f"⚠️ {pending} {model} embeddings are still under navis.models id {LEGACY_MODEL_ID} and are NOT "
+              f"included; run backend/scripts/migrate_legacy_embeddings.py, then rebuild")
+
+
+def _no_embeddings(cur, model, scope):
+    """Stop the build (instead of activating an empty index) and show which models do have embeddings."""
+    cur.execute("""
+        SELECT m.id, m.name, COUNT(e.id) AS n
+        FROM navis.models m LEFT JOIN navis.embeddings e ON e.model_id = m.id
+        GROUP BY m.id, m.name ORDER BY m.id
+    """)
+    found = [tuple(row.values()) if isinstance(row, dict) else tuple(row) for row in cur.fetchall()]
+    listing = "\n".join(f"  - navis.models {i} '{name}': {n} embeddings" for i, name, n in found) or "  (no models)"
+    raise SystemExit(
+        f"❌ No {model} embeddings ('{get_embedding_model(model).db_name}') found {scope}. Embeddings per model:\n"
+        f"{listing}\nEmbed frames with --model {model}, or run backend/scripts/migrate_legacy_embeddings.py "
+        f"if they were embedded before models were selectable."
+    )
+
+
+def build_faiss_index(dataset_slug='kitti', model=LEGACY_MODEL, **index_options):
+    """Build FAISS index from one model's embeddings in Postgres for a specific dataset"""
     
     with get_conn() as conn, conn.cursor() as cur:
+        _check_legacy(cur, model)
         # Get all embeddings for this dataset
         cur.execute("""
             SELECT e.frame_id, e.emb
             FROM navis.embeddings e
+            JOIN navis.models m ON e.model_id = m.id
             JOIN navis.frames f ON e.frame_id = f.id
             JOIN navis.sequences s ON f.sequence_id = s.id
             JOIN navis.datasets d ON s.dataset_id = d.id
-            WHERE d.slug = %s
+            WHERE d.slug = %s AND m.name = %s
             ORDER BY e.frame_id
-        """, (dataset_slug,))
+        """, (dataset_slug, get_embedding_model(model).db_name))
         
         rows = cur.fetchall()
-        
-    if not rows:
-        print(f"❌ No embeddings found for dataset: {dataset_slug}")
-        return
+        if not rows:
+            _no_embeddings(cur, model, f"for dataset {dataset_slug}")
     
-    print(f"✅ Found {len(rows)} embeddings for {dataset_slug}")
+    print(f"✅ Found {len(rows)} {model} embeddings for {dataset_slug}")
     
     # Extract frame_ids and embeddings
     frame_ids = []
@@ -58,47 +315,56 @@ def build_faiss_index(dataset_slug='kitti'):
     print(f"Embeddings shape: {embeddings_np.shape}")
     
     # Build FAISS index (L2 distance, which works with normalized vectors for cosine similarity)
-    d = embeddings_np.shape[1]  # dimension (512 for CLIP)
-    index = faiss.IndexFlatL2(d)
-    index.add(embeddings_np)
-    
-    print(f"✅ Built FAISS index with {index.ntotal} vectors")
-    
-    # Save index and mapping
-    index_dir = BACKEND_ROOT / "faiss_indexes"
-    index_dir.mkdir(exist_ok=True)
-    
-    index_path = index_dir / f"{dataset_slug}.index"
-    mapping_path = index_dir / f"{dataset_slug}_mapping.npy"
+    save_index(embeddings_np, frame_ids, dataset_slug, model=model, **index_options)
+
+
+def build_all_dataset_indexes(model=LEGACY_MODEL, **index_options):
+    """Build one shard per dataset (for FAISS_INDEX_MODE=sharded); each is activated on its own"""
     
-    faiss.write_index(index, str(index_path))
-    np.save(mapping_path, np.array(frame_ids, dtype=np.int32))
+    with get_conn() as conn, conn.cursor() as cur:
+        _check_legacy(cur, model)
+        cur.execute("""
+            SELECT DISTINCT d.slug
+            FROM navis.embeddings e
+            JOIN navis.models m ON e.model_id = m.id
+            JOIN navis.frames f ON e.frame_id = f.id
+            JOIN navis.sequences s ON f.sequence_id = s.id
+            JOIN navis.datasets d ON s.dataset_id = d.id
+            WHERE m.name = %s
+            ORDER BY d.slug
+        """, (get_embedding_model(model).db_name,))
+        slugs = [row['slug'] if isinstance(row, dict) else row[0] for row in cur.fetchall()]
+        if not slugs:
+            _no_embeddings(cur, model, "in any dataset")
     
-    print(f"✅ Saved FAISS index to: {index_path}")
-    print(f"✅ Saved frame ID mapping to: {mapping_path}")
+    index_options.setdefault('version', new_version())
+    for slug in slugs:
+        print(f"\n--- Shard: {slug} ---")
+        build_faiss_index(slug, model=model, **index_options)
 
 
-def build_combined_index():
-    """Build a single FAISS index from ALL datasets"""
+def build_combined_index(model=LEGACY_MODEL, **index_options):
+    """Build a single FAISS index from one model's embeddings of ALL datasets"""
     
     with get_conn() as conn, conn.cursor() as cur:
+        _check_legacy(cur, model)
         # Get all embeddings from all datasets
         cur.execute("""
             SELECT e.frame_id, e.emb, d.slug
             FROM navis.embeddings e
+            JOIN navis.models m ON e.model_id = m.id
             JOIN navis.frames f ON e.frame_id = f.id
             JOIN navis.sequences s ON f.sequence_id = s.id
             JOIN navis.datasets d ON s.dataset_id = d.id
+            WHERE m.name = %s
             ORDER BY e.frame_id
-        """)
+        """, (get_embedding_model(model).db_name,))
         
         rows = cur.fetchall()
-        
-    if not rows:
-        print(f"❌ No embeddings found in database")
-        return
+        if not rows:
+            _no_embeddings(cur, model, "in the database")
     
-    print(f"✅ Found {len(rows)} embeddings across all datasets")
+    print(f"✅ Found {len(rows)} {model} embeddings across all datasets")
     
     # Extract frame_ids, embeddings, and track dataset distribution
     frame_ids = []
@@ -133,46 +399,76 @@ def build_combined_index():
     print(f"\nEmbeddings shape: {embeddings_np.shape}")
     
     # Build FAISS index (L2 distance, which works with normalized vectors for cosine similarity)
-    d = embeddings_np.shape[1]  # dimension (512 for CLIP)
-    index = faiss.IndexFlatL2(d)
-    index.add(embeddings_np)
-    
-    print(f"✅ Built combined FAISS index with {index.ntotal} vectors")
-    
-    # Save index and mapping
-    index_dir = BACKEND_ROOT / "faiss_indexes"
-    index_dir.mkdir(exist_ok=True)
-    
-    index_path = index_dir / "combined.index"
-    mapping_path = index_dir / "combined_mapping.npy"
-    
-    faiss.write_index(index, str(index_path))
-    np.save(mapping_path, np.array(frame_ids, dtype=np.int32))
-    
-    print(f"✅ Saved FAISS index to: {index_path}")
-    print(f"✅ Saved frame ID mapping to: {mapping_path}")
+    save_index(embeddings_np, frame_ids, "combined", model=model, **index_options)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Build FAISS index from embeddings')
     parser.add_argument('--dataset', type=str, help='Build index for specific dataset (e.g., kitti, argoverse)')
     parser.add_argument('--combined', action='store_true', help='Build combined index for all datasets')
+    parser.add_argument('--all-datasets', action='store_true', help='Build one shard per dataset (FAISS_INDEX_MODE=sharded)')
+    parser.add_argument('--model', choices=list(EMBEDDING_MODELS), default=None,
+                        help='Embedding model whose vectors are indexed (default: SEARCH_DEFAULT_MODEL)')
+    parser.add_argument('--index-factory', type=str, default='flat',
+                        help=f"Index type: one of {', '.join(INDEX_PRESETS)} or a raw faiss.index_factory string (default: flat)")
+    parser.add_argument('--storage', choices=list(STORAGE_CODES), default='float32',
+                        help='Vector encoding for flat, ivf-flat and hnsw: float32, float16 or int8 scalar quantization (default: float32)')
+    parser.add_argument('--rerank-factor', type=int, default=0,
+                        help='Keep float32 vectors on disk and re-score k*N quantized candidates exactly (0 = off)')
+    parser.add_argument('--nlist', type=int, default=None, help='IVF lists (default: 4*sqrt(N), capped by training size)')
+    parser.add_argument('--pq-m', type=int, default=64, help='PQ sub-quantizers (must divide the dimension, default: 64)')
+    parser.add_argument('--hnsw-m', type=int, default=32, help='HNSW neighbors per node (default: 32)')
+    parser.add_argument('--nprobe', type=int, default=16, help='IVF lists probed at search time (default: 16)')
+    parser.add_argument('--ef-search', type=int, default=64, help='HNSW efSearch at search time (default: 64)')
+    parser.add_argument('--train-sample', type=int, default=100_000, help='Vectors sampled for training (default: 100000)')
+    parser.add_argument('--recall-k', type=int, default=10, help='k for the recall@k measurement (default: 10)')
+    parser.add_argument('--recall-queries', type=int, default=1000, help='Queries for the recall measurement (default: 1000)')
+    parser.add_argument('--dedup-threshold', type=float, default=0.0,
+                        help='Collapse consecutive frames of a sequence with cosine similarity >= this into one indexed frame (e.g. 0.97; 0 = off)')
+    parser.add_argument('--knn-k', type=int, default=32, help='Neighbors per frame in the "more like this" graph (0 = skip, default: 32)')
+    parser.add_argument('--version', type=str, default=None, help='Version directory name (default: UTC timestamp)')
+    parser.add_argument('--no-activate', action='store_true', help='Write the version but leave manifest.json unchanged')
+    parser.add_argument('--keep-versions', type=int, default=3, help='Unreferenced versions to keep on disk (default: 3)')
     
     args = parser.parse_args()
+    index_options = dict(
+        model=get_embedding_model(args.model).key,
+        index_factory=args.index_factory,
+        nlist=args.nlist,
+        pq_m=args.pq_m,
+        hnsw_m=args.hnsw_m,
+        nprobe=args.nprobe,
+        ef_search=args.ef_search,
+        train_sample=args.train_sample,
+        recall_k=args.recall_k,
+        recall_queries=args.recall_queries,
+        storage=args.storage,
+        rerank_factor=args.rerank_factor,
+        dedup_threshold=args.dedup_threshold,
+        knn_k=args.knn_k,
+        version=args.version,
+        activate=not args.no_activate,
+        keep_versions=args.keep_versions,
+    )
     
     if args.combined:
         print("=" * 60)
         print("Building COMBINED index for ALL datasets")
         print("=" * 60)
-        build_combined_index()
+        build_combined_index(**index_options)
+    elif args.all_datasets:
+        print("=" * 60)
+        print("Building one index shard per dataset")
+        print("=" * 60)
+        build_all_dataset_indexes(**index_options)
     elif args.dataset:
         print("=" * 60)
         print(f"Building index for dataset: {args.dataset}")
         print("=" * 60)
-        build_faiss_index(args.dataset)
+        build_faiss_index(args.dataset, **index_options)
     else:
         # Default: build combined index
         print("=" * 60)
         print("No arguments provided - building COMBINED index for ALL datasets")
         print("=" * 60)
-        build_combined_index()
\ No newline at end of file
+        build_combined_index(**index_options)
@@ -6,7 +6,7 @@ import sys, os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))  # add /backend to sys.path
 
 from db.postgres import get_conn
-from services.drive import resolve_path, download_bytes
+from services.drive import drive_file_sql, resolve_path, download_bytes
 
 from ultralytics import YOLO
 from urllib.parse import urlparse
@@ -66,13 +66,15 @@ def process_frames(limit=None):
     """Process all frames without detections"""
     # Get list of frames to process
     with get_conn() as conn:
+        parts = drive_file_sql(conn)
         with conn.cursor(row_factory=dict_row) as cur:
             # Find frames without detections - ONLY from gdrive provider
             query = """
-                SELECT f.id, f.media_key, d.media_base_uri
+                SELECT f.id, f.media_key, d.media_base_uri, {file_id} AS file_id
                 FROM navis.frames f
                 JOIN navis.sequences s ON f.sequence_id = s.id
                 JOIN navis.datasets d ON s.dataset_id = d.id
+                {drive_files_join}
                 WHERE NOT EXISTS (
                     SELECT 1 FROM navis.frame_objects fo 
                     WHERE fo.frame_id = f.id
@@ -80,6 +82,7 @@ def process_frames(limit=None):
                 AND d.provider = 'gdrive' AND d.name IN ('KITTI', 'Argoverse') AND s.scene_token != '2011_09_26_drive_0001_sync'
                 ORDER BY f.id
             """
+            query = query.format(**parts)
             if limit:
                 query += f" LIMIT {limit}"
             
@@ -100,7 +103,8 @@ def process_frames(limit=None):
             parsed = urlparse(media_base_uri)
             root_id = parsed.netloc
             
-            file_id = resolve_path(root_id, media_key)
+            # File id recorded at ingest; walk the path only for keys without one
+            file_id = row['file_id'] or resolve_path(root_id, media_key)
             if not file_id:
                 print(f"  ❌ Could not resolve path")
                 continue
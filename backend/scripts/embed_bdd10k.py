@@ -1,33 +1,44 @@
 import sys
+import argparse
 from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
 from db.postgres import get_conn
 from sentence_transformers import SentenceTransformer
-from services.drive import resolve_path, download_bytes
+from services.drive import drive_file_sql, resolve_path, download_bytes
+from services.embedding_models import EMBEDDING_MODELS, get_embedding_model, get_or_create_model_id
 from PIL import Image
 import io
 import numpy as np
 
+parser = argparse.ArgumentParser(description="Embed BDD10K frames that have no embedding for a model yet.")
+parser.add_argument("--model", choices=list(EMBEDDING_MODELS), default=None,
+                    help="Embedding model (default: SEARCH_DEFAULT_MODEL)")
+args = parser.parse_args()
+
 # Load model
-model = SentenceTransformer('clip-ViT-B-32')
-MODEL_ID = 4  # Use existing model_id
+MODEL = get_embedding_model(args.model)
+model = SentenceTransformer(MODEL.encoder)
 
-# Get BDD10K frames without embeddings
+# Get BDD10K frames without embeddings for this model
 conn = get_conn()
+parts = drive_file_sql(conn)
 cur = conn.cursor()
+MODEL_ID = get_or_create_model_id(cur, MODEL)
+conn.commit()
 
 cur.execute("""
-    SELECT f.id, f.media_key, d.media_base_uri
+    SELECT f.id, f.media_key, d.media_base_uri, {file_id} AS file_id
     FROM navis.frames f
     JOIN navis.sequences s ON f.sequence_id = s.id
     JOIN navis.datasets d ON s.dataset_id = d.id
+    {drive_files_join}
     WHERE d.name = 'BDD10K'
-    AND NOT EXISTS (SELECT 1 FROM navis.embeddings e WHERE e.frame_id = f.id)
-""")
+    AND NOT EXISTS (SELECT 1 FROM navis.embeddings e WHERE e.frame_id = f.id AND e.model_id = %s)
+""".format(**parts), (MODEL_ID,))
 
 frames = cur.fetchall()
-print(f"Found {len(frames)} BDD10K frames to embed\n")
+print(f"Found {len(frames)} BDD10K frames to embed with {MODEL.key}\n")
 
 for i, row in enumerate(frames):
     try:
@@ -44,8 +55,8 @@ for i, row in enumerate(frames):
         # Extract root folder ID from gdrive://...
         root_id = base_uri.replace('gdrive://', '')
         
-        # Resolve path and download
-        file_id = resolve_path(root_id, media_key)
+        # Stored file id (recorded at ingest), else resolve the path, then download
+        file_id = row['file_id'] or resolve_path(root_id, media_key)
         if not file_id:
             print(f"[{i+1}/{len(frames)}] ❌ Could not resolve: {media_key}")
             continue
@@ -78,4 +89,4 @@ for i, row in enumerate(frames):
 
 cur.close()
 conn.close()
-print(f"\n✅ Done! Run build_faiss_index.py to update search index")
\ No newline at end of file
+print(f"\n✅ Done! Run build_faiss_index.py --model {MODEL.key} to update search index")
\ No newline at end of file
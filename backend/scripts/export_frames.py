@@ -0,0 +1,81 @@
+"""
+Export the frames of a text query or filter set to NDJSON or Parquet.
+
+Same selection as GET /export/frames, written to disk chunk by chunk (Parquet:
+one row group per chunk) so multi-million-row exports never sit in memory.
+
+    # Everything at or above a similarity threshold, as Parquet
+    python backend/scripts/export_frames.py --text "pedestrian at night" --min-similarity 0.27 --out night.parquet
+
+    # Every KITTI frame with a detected truck, as NDJSON on stdout
+    python backend/scripts/export_frames.py --dataset kitti --objects truck --out -
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+from backend.services.embedding_models import EMBEDDING_MODELS
+from backend.services.export import EXPORT_CHUNK_ROWS, filter_chunks, ndjson_lines, query_chunks, write_parquet
+from backend.services.object_index import DEFAULT_MIN_CONFIDENCE
+from backend.services.search_index import get_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export frames of a query or filter set to NDJSON or Parquet')
+    parser.add_argument('--text', type=str, default=None, help='Query text (omit to export every frame matching the filters)')
+    parser.add_argument('--min-similarity', type=float, default=None, help='With --text: cosine similarity threshold')
+    parser.add_argument('--k', type=int, default=None, help='With --text: export the top-k frames instead of a threshold')
+    parser.add_argument('--model', choices=list(EMBEDDING_MODELS), default=None,
+                        help='Embedding model whose index to query (default: SEARCH_DEFAULT_MODEL)')
+    parser.add_argument('--dataset', type=str, default=None, help='Dataset slug filter')
+    parser.add_argument('--sequence', type=str, default=None, help='Sequence name/scene filter')
+    parser.add_argument('--sensor', type=str, default=None, help='Sensor filter')
+    parser.add_argument('--objects', type=str, default=None, help='Comma-separated object types (e.g. car,person)')
+    parser.add_argument('--objects-mode', choices=['any', 'all'], default='any', help='Match any or all objects (default: any)')
+    parser.add_argument('--min-confidence', type=float, default=DEFAULT_MIN_CONFIDENCE,
+                        help=f'Minimum detection confidence for --objects (default: {DEFAULT_MIN_CONFIDENCE})')
+    parser.add_argument('--limit', type=int, default=None, help='Stop after this many frames')
+    parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_ROWS,
+                        help=f'Rows per chunk / Parquet row group (default: {EXPORT_CHUNK_ROWS})')
+    parser.add_argument('--format', choices=['ndjson', 'parquet'], default=None,
+                        help='Output format (default: from the --out extension, else ndjson)')
+    parser.add_argument('--out', type=str, required=True, help="Output file, or '-' for NDJSON on stdout")
+    args = parser.parse_args()
+
+    fmt = args.format or ('parquet' if args.out.endswith('.parquet') else 'ndjson')
+    if fmt == 'parquet' and args.out == '-':
+        parser.error('Parquet cannot be written to stdout')
+    if args.text is not None and (args.min_similarity is None) == (args.k is None):
+        parser.error('--text needs exactly one of --min-similarity or --k')
+
+    objects = [o.strip() for o in args.objects.split(',') if o.strip()] if args.objects else None
+    filters = dict(dataset=args.dataset, sequence=args.sequence, sensor=args.sensor, objects=objects,
+                   objects_mode=args.objects_mode, min_confidence=args.min_confidence)
+    if args.text is None:
+        chunks = filter_chunks(chunk_size=args.chunk_size, limit=args.limit, **filters)
+    else:
+        chunks = query_chunks(get_index(args.model), args.text, min_similarity=args.min_similarity, k=args.k,
+                              chunk_size=args.chunk_size, limit=args.limit, **filters)
+
+    started = time.time()
+    if fmt == 'parquet':
+        count = write_parquet(chunks, Path(args.out))
+    else:
+        count = 0
+        out = sys.stdout.buffer if args.out == '-' else open(args.out, 'wb')
+        try:
+            for records in chunks:
+                out.writelines(ndjson_lines([records]))
+                count += len(records)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+    print(f"✅ Exported {count} frames to {args.out} ({fmt}) in {time.time() - started:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
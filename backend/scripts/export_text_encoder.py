@@ -0,0 +1,175 @@
+"""
+Export the CLIP text tower used for search queries to ONNX (TEXT_ENCODER=onnx).
+
+Only the text transformer + projection of a CLIP model (--model, default
+SEARCH_DEFAULT_MODEL) are exported, so the API
+can encode queries with onnxruntime without importing torch. With --quantize the
+weights are int8 dynamic-quantized. The export is verified against the PyTorch
+SentenceTransformer path and refused if any query's cosine similarity falls below
+--tolerance. It is built in a staging directory and swapped into place only once it
+passes, so a failed re-export leaves the current encoder untouched.
+
+    python backend/scripts/export_text_encoder.py --quantize
+    python backend/scripts/export_text_encoder.py --model clip-vit-l-14
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT))
+
+from services.embedding_models import EMBEDDING_MODELS, get_embedding_model
+from services.text_embed import OnnxTextEncoder, onnx_dir_for
+
+VERIFY_QUERIES = [
+    "cars on street",
+    "pedestrian crossing the road at night",
+    "truck merging onto the highway",
+    "cyclist",
+    "a red car parked next to a tree in the rain",
+    "traffic light",
+    "empty road",
+    "bus stop with people waiting on a sunny afternoon in the city center",
+]
+
+MAX_LENGTH = 77  # CLIP context length
+
+
+def export(model_name, out_dir, opset=14):
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    clip = st_model[0].model.eval()
+    tokenizer = st_model[0].processor.tokenizer
+
+    class TextTower(torch.nn.Module):
+        def __init__(self, clip):
+            super().__init__()
+            self.clip = clip
+
+        def forward(self, input_ids, attention_mask):
+            return self.clip.get_text_features(input_ids=input_ids, attention_mask=attention_mask)
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    onnx_path = out_dir / "text_encoder.onnx"
+    sample = tokenizer(["a photo of a car"], padding=True, return_tensors="pt")
+    torch.onnx.export(
+        TextTower(clip),
+        (sample["input_ids"], sample["attention_mask"]),
+        str(onnx_path),
+        input_names=["input_ids", "attention_mask"],
+        output_names=["text_embeds"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "text_embeds": {0: "batch"},
+        },
+        opset_version=opset,
+        do_constant_folding=True,
+    )
+    tokenizer.save_pretrained(str(out_dir))
+    print(f"✅ Exported text tower to: {onnx_path} ({onnx_path.stat().st_size / 2**20:.1f} MiB)")
+    return st_model, onnx_path
+
+
+def quantize(onnx_path):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    int8_path = onnx_path.with_name("text_encoder.int8.onnx")
+    quantize_dynamic(str(onnx_path), str(int8_path), weight_type=QuantType.QInt8)
+    print(f"✅ Quantized to int8: {int8_path} ({int8_path.stat().st_size / 2**20:.1f} MiB)")
+    return int8_path
+
+
+def verify(st_model, encoder, queries, tolerance, repeat=20):
+    """Cosine similarity of ONNX vs PyTorch embeddings per query, plus single-query latency of both."""
+    reference = st_model.encode(queries, convert_to_numpy=True)
+    exported = encoder.encode(queries)
+    reference /= np.linalg.norm(reference, axis=1, keepdims=True)
+    exported /= np.linalg.norm(exported, axis=1, keepdims=True)
+    cosine = (reference * exported).sum(axis=1)
+
+    def latency(fn):
+        fn([queries[0]])
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fn([queries[0]])
+        return (time.perf_counter() - started) / repeat * 1000
+
+    result = {
+        "tolerance": tolerance,
+        "min_cosine": float(cosine.min()),
+        "mean_cosine": float(cosine.mean()),
+        "queries": len(queries),
+        "torch_ms": latency(lambda t: st_model.encode(t, convert_to_numpy=True)),
+        "onnx_ms": latency(encoder.encode),
+    }
+    for text, c in zip(queries, cosine):
+        print(f"   {c:.5f}  {text}")
+    print(f"   min cosine {result['min_cosine']:.5f} (tolerance {tolerance}), "
+          f"latency torch {result['torch_ms']:.1f} ms vs onnx {result['onnx_ms']:.1f} ms")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export the CLIP text encoder to ONNX and verify it')
+    parser.add_argument('--model', choices=list(EMBEDDING_MODELS), default=None, help='Embedding model (default: SEARCH_DEFAULT_MODEL)')
+    parser.add_argument('--out', type=str, default=None, help='Export directory (default: TEXT_ENCODER_ONNX_ROOT/<encoder>-text)')
+    parser.add_argument('--quantize', action='store_true', help='Serve int8 dynamic-quantized weights')
+    parser.add_argument('--tolerance', type=float, default=None,
+                        help='Minimum cosine similarity to the PyTorch embeddings (default: 0.999, or 0.99 with --quantize)')
+    parser.add_argument('--threads', type=int, default=0, help='onnxruntime intra-op threads for verification (default: auto)')
+    parser.add_argument('--opset', type=int, default=14, help='ONNX opset (default: 14)')
+    parser.add_argument('--queries', type=str, default=None, help='File with one verification query per line')
+    args = parser.parse_args()
+
+    model = get_embedding_model(args.model)
+    out_dir = Path(args.out) if args.out else onnx_dir_for(model.encoder)
+    tolerance = args.tolerance if args.tolerance is not None else (0.99 if args.quantize else 0.999)
+    queries = VERIFY_QUERIES
+    if args.queries:
+        queries = [line.strip() for line in Path(args.queries).read_text().splitlines() if line.strip()]
+
+    # Export and verify in a staging directory next to out_dir; the working export in out_dir
+    # is replaced only once the new one passes, so a failed re-export leaves it serving
+    out_dir.parent.mkdir(parents=True, exist_ok=True)
+    staging = out_dir.with_name(f".{out_dir.name}.{os.getpid()}.tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    try:
+        st_model, onnx_path = export(model.encoder, staging, opset=args.opset)
+        model_path = quantize(onnx_path) if args.quantize else onnx_path
+
+        meta = {
+            "model": model.encoder,
+            "file": model_path.name,
+            "quantized": args.quantize,
+            "max_length": MAX_LENGTH,
+            "opset": args.opset,
+        }
+        (staging / "meta.json").write_text(json.dumps(meta, indent=2))
+
+        print("Verifying against the PyTorch encoder...")
+        result = verify(st_model, OnnxTextEncoder(staging, threads=args.threads), queries, tolerance)
+        meta["verify"] = result
+        if result["min_cosine"] < tolerance:
+            print(f"❌ ONNX embeddings differ from PyTorch beyond tolerance; export not activated"
+                  + (f" ({out_dir} left as it was)" if out_dir.exists() else ""))
+            sys.exit(1)
+        (staging / "meta.json").write_text(json.dumps(meta, indent=2))
+
+        previous = out_dir.with_name(f".{out_dir.name}.{os.getpid()}.old")
+        if out_dir.exists():
+            os.replace(out_dir, previous)
+        os.replace(staging, out_dir)
+        shutil.rmtree(previous, ignore_errors=True)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    print(f"✅ Saved {out_dir / 'meta.json'}; start the API with TEXT_ENCODER=onnx")
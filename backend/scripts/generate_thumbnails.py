@@ -0,0 +1,112 @@
+"""
+Pre-generate the resized variants /media/thumb and /media/preview serve, for every
+indexed (embedded) frame, so the first search grid after an ingest is served from
+the variant cache instead of downloading and resizing on request.
+
+Each original is downloaded once and decoded once for all widths; frames whose
+variants are all cached already are skipped, so the script can be re-run after
+every ingest.
+
+    python backend/scripts/generate_thumbnails.py --dataset kitti --widths 256,1024
+"""
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))  # add /backend to sys.path
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from psycopg.rows import dict_row
+
+from db.postgres import get_conn
+from services.drive import download_bytes, drive_file_sql, resolve_path
+from services.thumbnails import FORMATS, THUMB_WIDTHS, missing_widths, snap_width, store_variants
+
+FRAMES_SQL = """
+    SELECT DISTINCT ON (f.media_key) f.media_key, d.media_base_uri, {file_id} AS file_id
+    FROM navis.frames f
+    JOIN navis.sequences s ON f.sequence_id = s.id
+    JOIN navis.datasets d ON s.dataset_id = d.id
+    {drive_files_join}
+    WHERE d.provider = 'gdrive'
+      AND EXISTS (SELECT 1 FROM navis.embeddings e WHERE e.frame_id = f.id)
+      {dataset_filter}
+    ORDER BY f.media_key
+"""
+
+
+def indexed_frames(dataset=None, limit=None):
+    params = {"dataset": dataset}
+    with get_conn() as conn:
+        sql = FRAMES_SQL.format(dataset_filter="AND d.slug = %(dataset)s" if dataset else "", **drive_file_sql(conn))
+        if limit:
+            sql += " LIMIT %(limit)s"
+            params["limit"] = limit
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-generate thumbnail/preview variants of indexed frames')
+    parser.add_argument('--dataset', type=str, default=None, help='Dataset slug (default: all gdrive datasets)')
+    parser.add_argument('--widths', type=str, default=','.join(str(w) for w in THUMB_WIDTHS),
+                        help=f'Comma-separated widths, snapped to THUMB_WIDTHS (default: {THUMB_WIDTHS})')
+    parser.add_argument('--format', choices=list(FORMATS), default='webp', help='Output format (default: webp)')
+    parser.add_argument('--limit', type=int, default=None, help='Process at most this many frames')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4,
+                        help='Resize threads (downloads stay serial; default: CPU count)')
+    args = parser.parse_args()
+
+    widths = sorted({snap_width(int(w)) for w in args.widths.split(',') if w.strip()})
+    frames = indexed_frames(args.dataset, args.limit)
+    print(f"Found {len(frames)} indexed frames; widths {widths}, format {args.format}")
+
+    started = time.time()
+    skipped = failed = written = 0
+    pending = []
+
+    def drain():
+        nonlocal written, failed
+        for key, future in pending:
+            try:
+                written += future.result()
+            except Exception as e:
+                print(f"  ❌ {key}: {e}")
+                failed += 1
+        pending.clear()
+
+    # Downloads run here (the Drive client is not thread-safe); decoding and encoding in the pool
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for i, row in enumerate(frames):
+            media_key = row['media_key']
+            todo = missing_widths(media_key, widths, args.format)
+            if not todo:
+                skipped += 1
+                continue
+            try:
+                file_id = row['file_id'] or resolve_path(urlparse(row['media_base_uri']).netloc, media_key)
+                if not file_id:
+                    print(f"  ❌ Could not resolve {media_key}")
+                    failed += 1
+                    continue
+                data = download_bytes(file_id)
+            except Exception as e:
+                print(f"  ❌ {media_key}: {e}")
+                failed += 1
+                continue
+            pending.append((media_key, pool.submit(store_variants, media_key, data, todo, args.format)))
+
+            # Bounded backlog: at most a few originals per worker held in memory
+            if len(pending) >= args.workers * 4:
+                drain()
+                print(f"[{i+1}/{len(frames)}] {written} variants written, {skipped} frames already cached")
+        drain()
+
+    print(f"✅ Wrote {written} variants in {time.time() - started:.1f}s "
+          f"({skipped} frames already cached, {failed} failed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@ import sys, os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))  # add /backend to sys.path
 
 from db.postgres import get_conn
-from services.drive import _drive, _list_children
+from services.drive import list_children, record_drive_files
 
 
 ARGOVERSE_GDRIVE_FOLDER_ID = "1RQvwxeWESbtd3pO0hyUi1dzMeVI3Fnbr"
@@ -17,12 +17,12 @@ def list_folder_recursive(folder_id: str, current_path: str = "") -> list:
         current_path: Current relative path (used for recursion)
     
     Returns:
-        List of dicts with 'name', 'path', and 'id' for each file
+        List of dicts with 'name', 'path', 'id', 'size', 'md5' and 'modified_time' for each file
     """
     results = []
     
     try:
-        children = _list_children(folder_id)
+        children = list_children(folder_id)
         
         for item in children:
             item_name = item['name']
@@ -40,7 +40,10 @@ def list_folder_recursive(folder_id: str, current_path: str = "") -> list:
                 results.append({
                     'name': item_name,
                     'path': item_path,
-                    'id': item_id
+                    'id': item_id,
+                    'size': item.get('size'),
+                    'md5': item.get('md5Checksum'),
+                    'modified_time': item.get('modifiedTime')
                 })
         
     except Exception as e:
@@ -183,6 +186,11 @@ def ingest_argoverse_from_gdrive_auto():
         total_frames += rows_inserted
         print(f"✓ {scene_id[:20]:20s} / {camera:20s} → {rows_inserted:4d} frames")
 
+    # 5) Remember each frame's Drive file id so readers skip the per-folder path walk
+    ingested = {f['media_key'] for frames in sequences_data.values() for f in frames}
+    recorded = record_drive_files(cur, dataset_id, [f for f in all_files if f['path'] in ingested])
+    print(f"✓ Recorded {recorded} Drive file ids")
+
     conn.commit()
     cur.close()
     conn.close()
@@ -191,6 +199,7 @@ def ingest_argoverse_from_gdrive_auto():
     print(f"✅ Argoverse ingestion completed!")
     print(f"   Total sequences: {len(sequences_data)}")
     print(f"   Total frames: {total_frames}")
+    print(f"   Drive file ids: {recorded}")
     print(f"{'='*60}\n")
 
 
@@ -2,7 +2,7 @@ import sys, os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from db.postgres import get_conn
-from services.drive import list_files
+from services.drive import list_children, record_drive_files
 
 
 BDD10K_GDRIVE_FOLDER_ID = "1YnqzayO06QBSShBnOf4UufjHXm8Hi9tP"  # 10k folder
@@ -13,7 +13,7 @@ def list_folder_recursive(folder_id: str, current_path: str = "") -> list:
     results = []
     
     try:
-        children = list_files(folder_id)
+        children = list_children(folder_id)
         
         for item in children:
             item_name = item['name']
@@ -31,7 +31,10 @@ def list_folder_recursive(folder_id: str, current_path: str = "") -> list:
                 results.append({
                     'name': item_name,
                     'path': item_path,
-                    'id': item_id
+                    'id': item_id,
+                    'size': item.get('size'),
+                    'md5': item.get('md5Checksum'),
+                    'modified_time': item.get('modifiedTime')
                 })
         
     except Exception as e:
@@ -139,6 +142,11 @@ def ingest_bdd10k_from_gdrive():
         total_frames += rows_inserted
         print(f"✓ {split_name:10s} → {rows_inserted:5d} frames")
 
+    # 5) Remember each frame's Drive file id so readers skip the per-folder path walk
+    ingested = {f['media_key'] for frames in splits.values() for f in frames}
+    recorded = record_drive_files(cur, dataset_id, [f for f in all_files if f['path'] in ingested])
+    print(f"✓ Recorded {recorded} Drive file ids")
+
     conn.commit()
     cur.close()
     conn.close()
@@ -147,6 +155,7 @@ def ingest_bdd10k_from_gdrive():
     print(f"✅ BDD10K ingestion completed!")
     print(f"   Total splits: {len(splits)}")
     print(f"   Total frames: {total_frames}")
+    print(f"   Drive file ids: {recorded}")
     print(f"{'='*60}\n")
 
 
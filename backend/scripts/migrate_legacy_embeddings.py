@@ -0,0 +1,52 @@
+"""
+Relabel embeddings written before models were selectable.
+
+embed_bdd10k.py used to write every embedding to navis.models row LEGACY_MODEL_ID
+(default 4), whatever that row was called. This gives those embeddings the name of
+LEGACY_MODEL (openai/clip-vit-b-32): the legacy row is renamed when no row has that
+name yet, otherwise its embeddings move to the named row (frames embedded under both
+keep the named row's vector). Run once before the first build of that model; safe to
+re-run.
+
+    python backend/scripts/migrate_legacy_embeddings.py --dry-run
+    python backend/scripts/migrate_legacy_embeddings.py
+"""
+import sys
+import argparse
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT))
+
+from db.postgres import get_conn
+from services.embedding_models import (
+    LEGACY_MODEL, LEGACY_MODEL_ID, migrate_legacy_embeddings, pending_legacy_embeddings,
+)
+
+# Arbitrary key so concurrent runs wait for each other instead of both relabelling
+LOCK_KEY = 0x6E617669
+
+
+def main():
+    parser = argparse.ArgumentParser(description=f"Relabel navis.models {LEGACY_MODEL_ID} embeddings as {LEGACY_MODEL}")
+    parser.add_argument("--dry-run", action="store_true", help="Only report how many embeddings would be relabelled")
+    args = parser.parse_args()
+
+    with get_conn() as conn, conn.cursor() as cur:
+        if args.dry_run:
+            pending = pending_legacy_embeddings(cur)
+            print(f"{pending} embeddings of navis.models {LEGACY_MODEL_ID} would be relabelled as {LEGACY_MODEL}")
+            return
+
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (LOCK_KEY,))
+        moved = migrate_legacy_embeddings(cur)
+        conn.commit()
+
+    if moved:
+        print(f"✅ Relabelled {moved} embeddings; rebuild the {LEGACY_MODEL} index to include them")
+    else:
+        print("✅ Nothing to migrate")
+
+
+if __name__ == "__main__":
+    main()
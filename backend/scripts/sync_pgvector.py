@@ -0,0 +1,121 @@
+"""
+Prepare navis.embeddings for the pgvector search backend (SEARCH_BACKEND=pgvector).
+
+Adds an `emb_vec vector(<dims>)` column next to the JSON `emb`, backfills it in
+batches, installs a trigger that keeps it in sync on insert/update, and builds
+the HNSW index the search query uses. Safe to re-run.
+
+Only one embedding model (--model, default SEARCH_DEFAULT_MODEL; serve it with the
+same PGVECTOR_MODEL) is copied into emb_vec: rows of other models keep it NULL.
+Switching models clears the column and, if the dimension changes, retypes it.
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT))
+
+from db.postgres import get_conn
+from services.embedding_models import EMBEDDING_MODELS, get_embedding_model, get_or_create_model_id
+
+SETUP_SQL = """
+    CREATE EXTENSION IF NOT EXISTS vector;
+
+    ALTER TABLE navis.embeddings ADD COLUMN IF NOT EXISTS emb_vec vector({dims});
+
+    CREATE OR REPLACE FUNCTION navis.embeddings_sync_emb_vec() RETURNS trigger AS $$
+    BEGIN
+        NEW.emb_vec := CASE WHEN NEW.model_id = {model_id} THEN NEW.emb::text::vector END;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS embeddings_sync_emb_vec ON navis.embeddings;
+    CREATE TRIGGER embeddings_sync_emb_vec
+        BEFORE INSERT OR UPDATE OF emb, model_id ON navis.embeddings
+        FOR EACH ROW EXECUTE FUNCTION navis.embeddings_sync_emb_vec();
+
+    -- Used by the first-frame-per-media_key filter
+    CREATE INDEX IF NOT EXISTS frames_media_key_id_idx ON navis.frames (media_key, id);
+    CREATE INDEX IF NOT EXISTS frame_objects_frame_id_idx ON navis.frame_objects (frame_id, object_type);
+"""
+
+# pgvector stores the dimension as the column's type modifier
+COLUMN_DIMS_SQL = """
+    SELECT atttypmod FROM pg_attribute
+    WHERE attrelid = 'navis.embeddings'::regclass AND attname = 'emb_vec' AND NOT attisdropped
+"""
+
+BACKFILL_SQL = """
+    UPDATE navis.embeddings SET emb_vec = emb::text::vector
+    WHERE id IN (SELECT id FROM navis.embeddings WHERE model_id = %s AND emb_vec IS NULL LIMIT %s)
+"""
+
+
+def setup(model):
+    """Create or retype emb_vec for ``model`` and return its navis.models id."""
+    with get_conn() as conn, conn.cursor() as cur:
+        model_id = get_or_create_model_id(cur, model)
+        cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        cur.execute(COLUMN_DIMS_SQL)
+        row = cur.fetchone()
+        dims = (row["atttypmod"] if isinstance(row, dict) else row[0]) if row else None
+        if dims is not None and dims != model.dims:
+            print(f"⚠️ emb_vec holds vector({dims}); retyping to vector({model.dims}) and dropping its HNSW index")
+            cur.execute("DROP INDEX IF EXISTS navis.embeddings_emb_vec_hnsw_idx")
+            cur.execute(f"ALTER TABLE navis.embeddings ALTER COLUMN emb_vec TYPE vector({int(model.dims)}) USING NULL")
+        cur.execute(SETUP_SQL.format(dims=int(model.dims), model_id=int(model_id)))
+        # Vectors of a previously synced model would otherwise stay searchable
+        cur.execute("UPDATE navis.embeddings SET emb_vec = NULL WHERE model_id <> %s AND emb_vec IS NOT NULL",
+                    (model_id,))
+        if cur.rowcount > 0:
+            print(f"   cleared emb_vec of {cur.rowcount} embeddings of other models")
+        conn.commit()
+    print(f"✅ emb_vec vector({model.dims}) column and sync trigger in place for {model.key}")
+    return model_id
+
+
+def backfill(model_id, batch_size=5000):
+    total = 0
+    started = time.time()
+    with get_conn() as conn, conn.cursor() as cur:
+        while True:
+            cur.execute(BACKFILL_SQL, (model_id, batch_size))
+            conn.commit()
+            if cur.rowcount <= 0:
+                break
+            total += cur.rowcount
+            print(f"   backfilled {total} embeddings...")
+    print(f"✅ Backfilled {total} embeddings in {time.time() - started:.1f}s")
+
+
+def build_hnsw_index(m=16, ef_construction=64, rebuild=False):
+    with get_conn() as conn, conn.cursor() as cur:
+        if rebuild:
+            cur.execute("DROP INDEX IF EXISTS navis.embeddings_emb_vec_hnsw_idx")
+        started = time.time()
+        cur.execute(f"""
+            CREATE INDEX IF NOT EXISTS embeddings_emb_vec_hnsw_idx
+            ON navis.embeddings USING hnsw (emb_vec vector_l2_ops)
+            WITH (m = {int(m)}, ef_construction = {int(ef_construction)})
+        """)
+        cur.execute("ANALYZE navis.embeddings")
+        conn.commit()
+    print(f"✅ HNSW index (m={m}, ef_construction={ef_construction}) ready in {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Sync JSON embeddings into a pgvector column with an HNSW index')
+    parser.add_argument('--model', choices=list(EMBEDDING_MODELS), default=None,
+                        help='Embedding model to copy into emb_vec (default: SEARCH_DEFAULT_MODEL)')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Rows per backfill UPDATE (default: 5000)')
+    parser.add_argument('--m', type=int, default=16, help='HNSW neighbors per node (default: 16)')
+    parser.add_argument('--ef-construction', type=int, default=64, help='HNSW build candidate list (default: 64)')
+    parser.add_argument('--rebuild-index', action='store_true', help='Drop and rebuild the HNSW index')
+    args = parser.parse_args()
+
+    model_id = setup(get_embedding_model(args.model))
+    backfill(model_id, batch_size=args.batch_size)
+    build_hnsw_index(m=args.m, ef_construction=args.ef_construction, rebuild=args.rebuild_index)
@@ -0,0 +1,85 @@
+from __future__ import annotations
+from typing import Any, Callable, List, Optional, Set
+import asyncio
+import time
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent requests into batches.
+
+    ``submit(item)`` parks the caller on a future; items arriving within
+    ``window_ms`` of the first one (or until ``max_batch`` are queued) are handed
+    to ``fn(items)`` as one list in a worker thread, and each caller gets back its
+    own element of the returned list. If ``fn`` raises, every caller in that batch
+    sees the exception; if the batch task is cancelled, so are their futures.
+    """
+
+    def __init__(self, fn: Callable[[List[Any]], List[Any]], window_ms: float, max_batch: int, name: str = "batch"):
+        self.fn = fn
+        self.window = max(window_ms, 0.0) / 1000.0
+        self.max_batch = max(max_batch, 1)
+        self.name = name
+        self._pending: List[tuple] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # The event loop only keeps weak references to tasks: hold running batches until done
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+        self.largest = 0
+        self.busy_seconds = 0.0
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch or self.window == 0:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[tuple]):
+        items = [item for item, _ in batch]
+        started = time.perf_counter()
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(None, self.fn, items)
+            for (_, future), result in zip(batch, results):
+                if not future.done():  # the caller may have disconnected
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            # Cancellation or any other BaseException: never leave a caller waiting
+            for _, future in batch:
+                if not future.done():
+                    future.cancel()
+            self.batches += 1
+            self.items += len(batch)
+            self.largest = max(self.largest, len(batch))
+            self.busy_seconds += time.perf_counter() - started
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "window_ms": self.window * 1000.0,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch": self.items / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest,
+            "pending": len(self._pending),
+            "busy_seconds": round(self.busy_seconds, 3),
+        }
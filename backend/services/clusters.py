@@ -0,0 +1,114 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+
+
+def clusters_path_for(index_path: Path) -> Path:
+    """Near-duplicate cluster table that sits next to an index (combined.index -> combined_clusters/)."""
+    return index_path.with_name(f"{index_path.stem}_clusters")
+
+
+def cluster_near_duplicates(embeddings: np.ndarray, frame_ids: np.ndarray, sequence_ids: np.ndarray,
+                            threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Group runs of near-identical consecutive frames. Within each sequence, frames
+    are walked in frame-id (capture) order; a frame joins the current cluster while
+    its cosine similarity to the cluster's first frame stays >= ``threshold``,
+    otherwise it starts a new cluster. Comparing against the first frame rather than
+    the previous one stops slow camera motion from chaining a whole drive together.
+
+    Returns (representatives, cluster) as positions into the inputs: the first frame
+    of every cluster, and for every frame the index of its cluster in representatives.
+    """
+    n = len(frame_ids)
+    order = np.lexsort((frame_ids, sequence_ids))
+    cluster = np.empty(n, dtype=np.int64)
+    representatives = []
+    rep, rep_seq = -1, None
+    for i in order.tolist():
+        if rep < 0 or sequence_ids[i] != rep_seq or float(embeddings[i] @ embeddings[rep]) < threshold:
+            rep, rep_seq = i, sequence_ids[i]
+            representatives.append(i)
+        cluster[i] = len(representatives) - 1
+
+    # Keep representatives in input order so the index stays in frame-id order
+    representatives = np.array(representatives, dtype=np.int64)
+    by_input = np.argsort(representatives, kind="stable")
+    renumber = np.empty_like(by_input)
+    renumber[by_input] = np.arange(len(by_input))
+    return representatives[by_input], renumber[cluster]
+
+
+class ClusterTable:
+    """
+    Near-duplicate membership, aligned with the FAISS mapping: the members of the
+    representative at FAISS position ``row`` are ``members[offsets[row]:offsets[row + 1]]``
+    (frame ids, representative first), with ``distances`` holding each member's squared
+    L2 distance to the representative (float16).
+    """
+
+    def __init__(self, offsets: np.ndarray, members: np.ndarray, distances: np.ndarray):
+        self.offsets = offsets
+        self.members = members
+        self.distances = distances
+        self._member_order = None
+        self._sorted_members = None
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def sizes(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def size(self, row: int) -> int:
+        return int(self.offsets[row + 1] - self.offsets[row])
+
+    def cluster(self, row: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(member frame ids, squared distances to the representative) of the cluster at ``row``."""
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return np.asarray(self.members[start:end]), np.asarray(self.distances[start:end], dtype=np.float32)
+
+    def rows_for_frame_ids(self, frame_ids: np.ndarray) -> np.ndarray:
+        """FAISS position of the representative of each frame's cluster (-1 if not a member)."""
+        frame_ids = np.asarray(frame_ids)
+        if len(self.members) == 0:
+            return np.full(len(frame_ids), -1, dtype=np.int64)
+        if self._member_order is None:
+            self._member_order = np.argsort(self.members, kind="stable")
+            self._sorted_members = np.asarray(self.members)[self._member_order]
+        pos = np.minimum(np.searchsorted(self._sorted_members, frame_ids), len(self.members) - 1)
+        found = self._sorted_members[pos] == frame_ids
+        rows = np.searchsorted(self.offsets, self._member_order[pos], side="right") - 1
+        return np.where(found, rows, -1)
+
+    def save(self, path: Path) -> None:
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "offsets.npy", self.offsets)
+        np.save(path / "members.npy", self.members)
+        np.save(path / "distances.npy", self.distances)
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> "ClusterTable":
+        mode = "r" if mmap else None
+        return cls(
+            np.load(path / "offsets.npy", mmap_mode=mode),
+            np.load(path / "members.npy", mmap_mode=mode),
+            np.load(path / "distances.npy", mmap_mode=mode),
+        )
+
+
+def build_cluster_table(embeddings: np.ndarray, frame_ids: np.ndarray,
+                        representatives: np.ndarray, cluster: np.ndarray) -> ClusterTable:
+    """ClusterTable for the output of cluster_near_duplicates (representatives become FAISS rows 0..n-1)."""
+    frame_ids = np.asarray(frame_ids, dtype=np.int32)
+    is_rep = np.zeros(len(frame_ids), dtype=bool)
+    is_rep[representatives] = True
+    # Group by cluster, representative first, then members in frame-id order
+    order = np.lexsort((frame_ids, ~is_rep, cluster))
+    diff = embeddings[order] - embeddings[representatives[cluster[order]]]
+    offsets = np.zeros(len(representatives) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cluster, minlength=len(representatives)), out=offsets[1:])
+    return ClusterTable(offsets, frame_ids[order], np.einsum("ij,ij->i", diff, diff).astype(np.float16))
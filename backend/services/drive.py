@@ -1,24 +1,32 @@
 from __future__ import annotations
 from pathlib import Path, PurePosixPath
+from collections import OrderedDict
+from concurrent.futures import Future
 from functools import lru_cache
 from typing import Optional, List, Dict
 import os
+import threading
 import time
 import io
 import base64
 import tempfile
-import hashlib
 import httplib2
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
 from googleapiclient.errors import HttpError
 
+# Relative so the same module serves `services.drive` (scripts) and `backend.services.drive` (API)
+from .media_cache import MediaCache
+
 SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
 
-# Cache directory for downloaded files
-CACHE_DIR = Path("/tmp/drive_cache")
-CACHE_DIR.mkdir(exist_ok=True)
+# Downloaded files are cached on disk up to DRIVE_CACHE_MAX_MB, evicting least recently
+# (lru) or least frequently (lfu) used files first
+CACHE_DIR = Path(os.environ.get("DRIVE_CACHE_DIR", "/tmp/drive_cache"))
+DRIVE_CACHE_MAX_MB = float(os.environ.get("DRIVE_CACHE_MAX_MB", "10240"))
+DRIVE_CACHE_POLICY = os.environ.get("DRIVE_CACHE_POLICY", "lru")
+media_cache = MediaCache(CACHE_DIR, int(DRIVE_CACHE_MAX_MB * 1024 * 1024), DRIVE_CACHE_POLICY)
 
 # Handle credentials from environment variable (base64 encoded) or file
 _env_key_json = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS_JSON")
@@ -55,50 +63,254 @@ def _get_service():
     )
     return build("drive", "v3", credentials=creds)
 
+def _list_all(q: str, fields: str) -> List[Dict]:
+    """Every file matching a Drive query, following nextPageToken past the 1000-per-page limit."""
+    service = _get_service()
+    files = []
+    page_token = None
+    while True:
+        results = service.files().list(
+            q=q,
+            fields=f"nextPageToken, {fields}",
+            pageSize=1000,
+            pageToken=page_token,
+        ).execute()
+        files.extend(results.get("files", []))
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            return files
+
 def list_files(folder_id: str, query: Optional[str] = None) -> List[Dict]:
     """List files in a Google Drive folder."""
-    service = _get_service()
-    
     q = f"'{folder_id}' in parents and trashed=false"
     if query:
         q += f" and {query}"
-    
-    results = service.files().list(
-        q=q,
-        fields="files(id, name, mimeType, parents)",
-        pageSize=1000
-    ).execute()
-    
-    return results.get("files", [])
+    return _list_all(q, "files(id, name, mimeType, parents)")
+
+def list_children(folder_id: str) -> List[Dict]:
+    """
+    Every child of a folder, with the size / md5 / modified time that
+    record_drive_files stores.
+    """
+    return _list_all(f"'{folder_id}' in parents and trashed=false",
+                     "files(id, name, mimeType, size, md5Checksum, modifiedTime)")
+
+# --- Folder listing cache -------------------------------------------------------
+#
+# resolve_path walks a path one folder at a time. Each folder is listed once (all
+# pages) and kept as {child name: child id}, so resolving thousands of sibling frames
+# costs one listing instead of one name query per frame and path component.
+
+# Folders kept (LRU) and how long a listing is trusted; files added to Drive within the TTL are not seen
+DRIVE_LISTING_CACHE_SIZE = int(os.environ.get("DRIVE_LISTING_CACHE_SIZE", "4096"))
+DRIVE_LISTING_CACHE_TTL = float(os.environ.get("DRIVE_LISTING_CACHE_TTL", "600"))
+
 
-def resolve_path(root_folder_id: str, path: str) -> Optional[str]:
+class FolderListingCache:
+    """
+    LRU + TTL cache of folder listings (folder id -> {name: id}). Concurrent misses
+    for the same folder are single-flight: the first caller lists the folder and the
+    others wait for its result instead of calling the Drive API themselves.
+    """
+
+    def __init__(self, max_items: int, ttl: float, fetch=list_children):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._fetch = fetch
+        self._lru: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_items > 0 and self.ttl > 0
+
+    def get(self, folder_id: str) -> Dict[str, str]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._lru.get(folder_id)
+            if entry is not None and entry[0] > now:
+                self._lru.move_to_end(folder_id)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._lru[folder_id]
+            flight = self._inflight.get(folder_id)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[folder_id] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return flight.result()
+
+        try:
+            children = {}
+            for item in self._fetch(folder_id):
+                # Drive allows duplicate names; keep the first like the old name query did
+                children.setdefault(item["name"], item["id"])
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[folder_id]
+            flight.set_exception(e)
+            raise
+        with self._lock:
+            if self.enabled:
+                self._lru[folder_id] = (time.monotonic() + self.ttl, children)
+                while len(self._lru) > self.max_items:
+                    self._lru.popitem(last=False)
+                    self.evictions += 1
+            del self._inflight[folder_id]
+        flight.set_result(children)
+        return children
+
+    def invalidate(self, folder_id: Optional[str] = None):
+        with self._lock:
+            if folder_id is None:
+                self._lru.clear()
+            else:
+                self._lru.pop(folder_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "folders": len(self._lru),
+                "max_folders": self.max_items,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+            }
+
+
+folder_listings = FolderListingCache(DRIVE_LISTING_CACHE_SIZE, DRIVE_LISTING_CACHE_TTL)
+
+# --- Persisted file ids ---------------------------------------------------------
+#
+# The gdrive ingest scripts record the Drive file id of every media_key they insert,
+# so readers resolve a frame with one indexed lookup (LEFT JOIN navis.drive_files on
+# dataset_id + media_key) instead of one files().list call per path component.
+# resolve_path() stays as the fallback for keys that were never recorded.
+
+DRIVE_FILES_SQL = """
+    CREATE TABLE IF NOT EXISTS navis.drive_files (
+        dataset_id INTEGER NOT NULL REFERENCES navis.datasets(id),
+        media_key TEXT NOT NULL,
+        file_id TEXT NOT NULL,
+        size BIGINT,
+        md5 TEXT,
+        modified_time TIMESTAMPTZ,
+        PRIMARY KEY (dataset_id, media_key)
+    )
+"""
+
+DRIVE_FILES_JOIN = "LEFT JOIN navis.drive_files df ON df.dataset_id = d.id AND df.media_key = f.media_key"
+
+UPSERT_DRIVE_FILE_SQL = """
+    INSERT INTO navis.drive_files (dataset_id, media_key, file_id, size, md5, modified_time)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON CONFLICT (dataset_id, media_key) DO UPDATE
+        SET file_id = EXCLUDED.file_id,
+            size = COALESCE(EXCLUDED.size, navis.drive_files.size),
+            md5 = COALESCE(EXCLUDED.md5, navis.drive_files.md5),
+            modified_time = COALESCE(EXCLUDED.modified_time, navis.drive_files.modified_time)
+"""
+
+
+_drive_files_ready = False
+_drive_files_tried = False
+
+
+def ensure_drive_files(conn) -> bool:
+    """
+    Create navis.drive_files if the database predates it (restored from a backup, or no
+    gdrive ingest since). Tried once per process, before the first frame query that
+    reads file ids; commits ``conn``. Returns whether the table exists.
+    """
+    global _drive_files_ready, _drive_files_tried
+    if _drive_files_tried:
+        return _drive_files_ready
+    _drive_files_tried = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute(DRIVE_FILES_SQL)
+        conn.commit()
+        _drive_files_ready = True
+    except Exception as e:
+        conn.rollback()
+        print(f"[WARNING] Could not create navis.drive_files, reading media by path only: {e}")
+    return _drive_files_ready
+
+
+def drive_file_sql(conn) -> Dict[str, str]:
+    """
+    SQL fragments for a frame query (aliases f, d) that reads the stored file id:
+    ``{file_id}`` as a select expression and ``{drive_files_join}`` after the joins.
+    If navis.drive_files cannot be created, file_id is NULL and callers walk the path.
+    """
+    if ensure_drive_files(conn):
+        return {"file_id": "df.file_id", "drive_files_join": DRIVE_FILES_JOIN}
+    return {"file_id": "NULL::text", "drive_files_join": ""}
+
+
+def record_drive_files(cur, dataset_id: int, files: List[Dict]) -> int:
+    """
+    Store the Drive file of each media_key. ``files`` are dicts with 'path' (the
+    media_key), 'id' and optionally 'size', 'md5' and 'modified_time' as listed
+    by list_children. Creates navis.drive_files on first use.
+    """
+    cur.execute(DRIVE_FILES_SQL)
+    rows = [
+        (dataset_id, f["path"], f["id"], int(f["size"]) if f.get("size") else None,
+         f.get("md5"), f.get("modified_time"))
+        for f in files
+    ]
+    cur.executemany(UPSERT_DRIVE_FILE_SQL, rows)
+    return len(rows)
+
+
+def remember_file_id(cur, dataset_id: int, media_key: str, file_id: str) -> None:
+    """Write a file id found by walking the path back, so the next request is a lookup."""
+    if not _drive_files_ready:
+        cur.execute(DRIVE_FILES_SQL)
+    cur.execute(UPSERT_DRIVE_FILE_SQL, (dataset_id, media_key, file_id, None, None, None))
+
+def resolve_path(root_folder_id: str, path: str, refresh: bool = False) -> Optional[str]:
     """
     Resolve a path like 'Residential/2011_09_26/...' to a file ID.
     Returns the file ID or None if not found.
+    Each folder on the way is listed once and cached (folder_listings), but prefer
+    the file id stored in navis.drive_files and use this only when it is missing.
+    ``refresh`` drops the cached listings along the path first (e.g. after a file
+    id from them turned out to be gone).
     """
     parts = PurePosixPath(path).parts
     current_id = root_folder_id
     
     for part in parts:
-        files = list_files(current_id, query=f"name='{part}'")
-        if not files:
+        if refresh:
+            folder_listings.invalidate(current_id)
+        current_id = folder_listings.get(current_id).get(part)
+        if current_id is None:
             return None
-        current_id = files[0]["id"]
     
     return current_id
 
 def download_bytes(file_id: str, max_retries=5):
     """
     Download file from Google Drive with caching and retry logic.
-    Option 2: Local file caching - reduces API calls dramatically
+    Files are kept in the size-bounded disk cache (media_cache), which reduces API calls dramatically
     """
-    # Check cache first (Option 2)
-    cache_key = hashlib.md5(file_id.encode()).hexdigest()
-    cache_path = CACHE_DIR / f"{cache_key}.bin"
-    
-    if cache_path.exists():
+    data = media_cache.get(file_id)
+    if data is not None:
         print(f"[CACHE HIT] {file_id}")
-        return cache_path.read_bytes()
+        return data
     
     print(f"[CACHE MISS] Downloading {file_id}")
     service = _get_service()
@@ -116,9 +328,8 @@ def download_bytes(file_id: str, max_retries=5):
             buffer.seek(0)
             data = buffer.read()
             
-            # Save to cache (Option 2)
             try:
-                cache_path.write_bytes(data)
+                media_cache.put(file_id, data)
                 print(f"[CACHED] {file_id}")
             except Exception as cache_error:
                 print(f"[CACHE WARNING] Failed to cache {file_id}: {cache_error}")
@@ -126,7 +337,9 @@ def download_bytes(file_id: str, max_retries=5):
             return data
             
         except Exception as e:
-            if attempt < max_retries - 1:
+            # A missing file will not appear on retry (callers fall back to walking the path)
+            missing = isinstance(e, HttpError) and e.resp.status == 404
+            if attempt < max_retries - 1 and not missing:
                 wait_time = (2 ** attempt) * 1.0
                 print(f"[RETRY] Attempt {attempt + 1}/{max_retries}, waiting {wait_time}s...")
                 time.sleep(wait_time)
@@ -0,0 +1,124 @@
+from __future__ import annotations
+from typing import Dict, NamedTuple, Optional
+import os
+
+
+class EmbeddingModel(NamedTuple):
+    """
+    One image/text embedding model. ``key`` names it in the API (?model=), on the index
+    build command line and in the index manifest; ``db_name`` is its navis.models row and
+    ``encoder`` the sentence-transformers model that produces both image and text vectors.
+    """
+    key: str
+    db_name: str
+    encoder: str
+    dims: int
+
+
+EMBEDDING_MODELS: Dict[str, EmbeddingModel] = {m.key: m for m in [
+    EmbeddingModel("clip-vit-b-32", "openai/clip-vit-b-32", "clip-ViT-B-32", 512),
+    EmbeddingModel("clip-vit-b-16", "openai/clip-vit-b-16", "clip-ViT-B-16", 512),
+    EmbeddingModel("clip-vit-l-14", "openai/clip-vit-l-14", "clip-ViT-L-14", 768),
+]}
+
+# Indexes built before models were selectable (unprefixed manifest entries, flat layout) hold this model
+LEGACY_MODEL = "clip-vit-b-32"
+
+# Model used when a request, worker or build does not name one
+DEFAULT_MODEL = os.environ.get("SEARCH_DEFAULT_MODEL", LEGACY_MODEL)
+
+# navis.models row that scripts/embed_bdd10k.py wrote to (hard-coded model_id 4) before models
+# were selectable. Whatever it is named, its embeddings are LEGACY_MODEL's.
+LEGACY_MODEL_ID = int(os.environ.get("LEGACY_MODEL_ID", "4"))
+
+
+def get_embedding_model(key: Optional[str] = None) -> EmbeddingModel:
+    """Registered model by key (DEFAULT_MODEL when None); ValueError for unknown keys."""
+    key = key or DEFAULT_MODEL
+    try:
+        return EMBEDDING_MODELS[key]
+    except KeyError:
+        raise ValueError(f"Unknown embedding model '{key}' (known: {', '.join(EMBEDDING_MODELS)})")
+
+
+def _first(row):
+    return next(iter(row.values())) if isinstance(row, dict) else row[0]
+
+
+def _legacy_source(cur) -> Optional[tuple]:
+    """
+    (legacy row name, id of the row named like LEGACY_MODEL or None) when the
+    LEGACY_MODEL_ID row still holds LEGACY_MODEL embeddings under another name; else None.
+    """
+    legacy = EMBEDDING_MODELS[LEGACY_MODEL]
+    cur.execute("SELECT name FROM navis.models WHERE id=%s", (LEGACY_MODEL_ID,))
+    row = cur.fetchone()
+    if row is None or _first(row) == legacy.db_name:
+        return None
+    name = _first(row)
+    if name in {m.db_name for m in EMBEDDING_MODELS.values()}:
+        return None  # the row really is another registered model
+    cur.execute("SELECT id FROM navis.models WHERE name=%s", (legacy.db_name,))
+    row = cur.fetchone()
+    return name, (_first(row) if row is not None else None)
+
+
+def pending_legacy_embeddings(cur) -> int:
+    """Embeddings migrate_legacy_embeddings would relabel (0 when there is nothing to do). Read-only."""
+    source = _legacy_source(cur)
+    if source is None:
+        return 0
+    target = source[1]
+    if target is None:
+        cur.execute("SELECT COUNT(*) FROM navis.embeddings WHERE model_id=%s", (LEGACY_MODEL_ID,))
+    else:
+        cur.execute("""
+            SELECT COUNT(*) FROM navis.embeddings e
+            WHERE e.model_id = %s
+              AND NOT EXISTS (SELECT 1 FROM navis.embeddings x WHERE x.frame_id = e.frame_id AND x.model_id = %s)
+        """, (LEGACY_MODEL_ID, target))
+    return _first(cur.fetchone())
+
+
+def migrate_legacy_embeddings(cur) -> int:
+    """
+    Give LEGACY_MODEL's name to the embeddings of the LEGACY_MODEL_ID row. With no row
+    of that name yet the legacy row is renamed; otherwise its embeddings move to the
+    named row (frames embedded under both keep their existing named-row vector). Returns
+    the number of embeddings relabelled; 0 once done. Run by
+    scripts/migrate_legacy_embeddings.py, which holds the lock and commits.
+    """
+    source = _legacy_source(cur)
+    if source is None:
+        return 0
+    name, target = source
+    legacy = EMBEDDING_MODELS[LEGACY_MODEL]
+    if target is None:
+        cur.execute("UPDATE navis.models SET name=%s WHERE id=%s", (legacy.db_name, LEGACY_MODEL_ID))
+        cur.execute("SELECT COUNT(*) FROM navis.embeddings WHERE model_id=%s", (LEGACY_MODEL_ID,))
+        moved = _first(cur.fetchone())
+        print(f"⚠️ Renamed navis.models {LEGACY_MODEL_ID} '{name}' to '{legacy.db_name}' ({moved} embeddings)")
+        return moved
+
+    cur.execute("""
+        UPDATE navis.embeddings e SET model_id = %s
+        WHERE e.model_id = %s
+          AND NOT EXISTS (SELECT 1 FROM navis.embeddings x WHERE x.frame_id = e.frame_id AND x.model_id = %s)
+    """, (target, LEGACY_MODEL_ID, target))
+    moved = max(cur.rowcount, 0)
+    if moved > 0:
+        print(f"⚠️ Moved {moved} embeddings of navis.models {LEGACY_MODEL_ID} '{name}' to '{legacy.db_name}' ({target})")
+    return moved
+
+
+def get_or_create_model_id(cur, model: EmbeddingModel) -> int:
+    """navis.models id of ``model``, inserting the row on first use."""
+    cur.execute("SELECT id FROM navis.models WHERE name=%s", (model.db_name,))
+    row = cur.fetchone()
+    if row is None:
+        cur.execute(
+            "INSERT INTO navis.models(name, dims) VALUES (%s,%s) RETURNING id",
+            (model.db_name, model.dims),
+        )
+        row = cur.fetchone()
+    return _first(row)
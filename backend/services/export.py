@@ -0,0 +1,229 @@
+"""
+Bulk export of frames for training pipelines: a text query (threshold or top-k
+search on the FAISS index) or a plain filter set (every matching frame in
+Postgres), as chunks of flat records with the frame's detections attached.
+
+Records are produced ``chunk_size`` at a time and never collected: filter
+exports read through a server-side cursor, query exports walk the index a
+window at a time (IndexBundle.range_search). Writers turn the chunks into
+NDJSON bytes (HTTP) or Parquet row groups (disk).
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+import json
+import os
+
+import numpy as np
+
+from backend.db.postgres import get_conn
+from backend.services.embedding_models import EMBEDDING_MODELS
+from backend.services.object_index import DEFAULT_MIN_CONFIDENCE
+from backend.services.search_index import IndexBundle
+from backend.services.text_embed import get_text_embeddings
+
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", "5000"))
+# Top-k exports hold k candidates before writing; larger exports should use a similarity threshold
+EXPORT_MAX_K = int(os.environ.get("EXPORT_MAX_K", "100000"))
+
+FIELDS = ("frame_id", "score", "similarity", "dataset", "sequence", "sensor",
+          "media_key", "sample_token", "detections")
+
+DETECTION_JSON = """json_build_object(
+    'object_type', o.object_type, 'confidence', o.confidence,
+    'bbox', json_build_array(o.x1, o.y1, o.x2, o.y2)
+) ORDER BY o.confidence DESC NULLS LAST"""
+
+DETECTIONS_SQL = f"""
+    SELECT o.frame_id, json_agg({DETECTION_JSON}) AS detections
+    FROM navis.frame_objects o
+    WHERE o.frame_id = ANY(%s)
+    GROUP BY o.frame_id
+"""
+
+FRAMES_SQL = f"""
+    SELECT f.id AS frame_id, d.slug AS dataset, s.scene_token AS sequence, s.sensor,
+           f.media_key, f.sample_token, det.detections
+    FROM navis.frames f
+    JOIN navis.sequences s ON f.sequence_id = s.id
+    JOIN navis.datasets d ON s.dataset_id = d.id
+    LEFT JOIN LATERAL (
+        SELECT json_agg({DETECTION_JSON}) AS detections
+        FROM navis.frame_objects o WHERE o.frame_id = f.id
+    ) det ON true
+    WHERE {{where}}
+    ORDER BY f.id
+"""
+
+
+def _where(dataset: Optional[str] = None, sequence: Optional[str] = None, sensor: Optional[str] = None,
+           objects: Optional[Iterable[str]] = None, objects_mode: str = "any",
+           min_confidence: float = DEFAULT_MIN_CONFIDENCE) -> tuple:
+    """SQL WHERE clause and params for FrameFilters.mask()-style filters."""
+    clauses = ["true"]
+    params = {}
+    if dataset:
+        clauses.append("d.slug = %(dataset)s")
+        params["dataset"] = dataset
+    if sequence:
+        clauses.append("s.scene_token = %(sequence)s")
+        params["sequence"] = sequence
+    if sensor:
+        clauses.append("s.sensor = %(sensor)s")
+        params["sensor"] = sensor
+    objects = sorted(set(objects or ()))
+    if objects:
+        params.update(objects=objects, min_confidence=min_confidence, n_objects=len(objects))
+        if objects_mode == "all":
+            clauses.append("""(
+                SELECT COUNT(DISTINCT o.object_type) FROM navis.frame_objects o
+                WHERE o.frame_id = f.id AND o.object_type = ANY(%(objects)s) AND o.confidence > %(min_confidence)s
+            ) = %(n_objects)s""")
+        else:
+            clauses.append("""EXISTS (
+                SELECT 1 FROM navis.frame_objects o
+                WHERE o.frame_id = f.id AND o.object_type = ANY(%(objects)s) AND o.confidence > %(min_confidence)s
+            )""")
+    return " AND ".join(clauses), params
+
+
+def filter_chunks(chunk_size: int = EXPORT_CHUNK_ROWS, limit: Optional[int] = None,
+                  **filters) -> Iterator[List[dict]]:
+    """Every frame in Postgres matching ``filters``, in frame id order, without a score."""
+    where, params = _where(**filters)
+    sql = FRAMES_SQL.format(where=where)
+    if limit is not None:
+        sql += " LIMIT %(limit)s"
+        params["limit"] = int(limit)
+    with get_conn() as conn:
+        # Named cursor = server-side: rows arrive chunk_size at a time, not all at once
+        with conn.cursor(name="navis_export") as cur:
+            cur.itersize = chunk_size
+            cur.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [{name: row.get(name) for name in FIELDS} | {"detections": row["detections"] or []}
+                       for row in rows]
+
+
+def _store_records(shard, distances: np.ndarray, rows: np.ndarray) -> List[dict]:
+    store = shard.store
+    records = []
+    for distance, row in zip(distances.tolist(), rows.tolist()):
+        code = int(store["dataset"][row])
+        records.append({
+            "frame_id": int(store.frame_ids[row]),
+            "score": distance,
+            "similarity": 1.0 - distance / 2.0,
+            "dataset": store.vocabs["slug"][code],
+            "sequence": store.vocabs["sequence"][int(store["sequence"][row])],
+            "sensor": store.vocabs["sensor"][int(store["sensor"][row])],
+            "media_key": store.string("media_key", row),
+            "sample_token": store.string("sample_token", row) or None,
+            "detections": [],
+        })
+    return records
+
+
+def _attach_detections(cur, records: List[dict]) -> List[dict]:
+    cur.execute(DETECTIONS_SQL, ([r["frame_id"] for r in records],))
+    detections = {row["frame_id"]: row["detections"] for row in cur.fetchall()}
+    for record in records:
+        record["detections"] = detections.get(record["frame_id"], [])
+    return records
+
+
+def query_chunks(bundle: IndexBundle, text: str, min_similarity: Optional[float] = None,
+                 k: Optional[int] = None, chunk_size: int = EXPORT_CHUNK_ROWS,
+                 limit: Optional[int] = None, **filters) -> Iterator[List[dict]]:
+    """
+    Frames matching ``text`` on ``bundle``'s index: every frame with cosine similarity
+    of at least ``min_similarity`` (index order per shard), or the top ``k`` by score.
+    Detections are read from Postgres once per chunk.
+    """
+    qvec = get_text_embeddings([text], EMBEDDING_MODELS[bundle.model].encoder)[0]
+    if k is not None:
+        candidates = bundle.search(qvec[None, :], min(k, EXPORT_MAX_K), **filters)[0][:k]
+        found = ((shard, np.array([d], dtype=np.float32), np.array([row]))
+                 for d, shard, row in candidates)
+    elif min_similarity is not None:
+        # Vectors are L2-normalized: ||a - b||^2 = 2 - 2 cos(a, b)
+        found = bundle.range_search(qvec, 2.0 - 2.0 * min_similarity, **filters)
+    else:
+        raise ValueError("A query export needs min_similarity or k")
+
+    written = 0
+    pending: List[dict] = []
+    with get_conn() as conn, conn.cursor() as cur:
+        for shard, distances, rows in found:
+            for start in range(0, len(rows), chunk_size):
+                part = slice(start, start + chunk_size)
+                pending.extend(_store_records(shard, distances[part], rows[part]))
+                if limit is not None and written + len(pending) >= limit:
+                    yield _attach_detections(cur, pending[:limit - written])
+                    return
+                if len(pending) >= chunk_size:
+                    written += len(pending)
+                    yield _attach_detections(cur, pending)
+                    pending = []
+        if pending:
+            yield _attach_detections(cur, pending)
+
+
+def ndjson_lines(chunks: Iterable[List[dict]], trailer: Optional[dict] = None) -> Iterator[bytes]:
+    """One JSON object per record, one yielded block per chunk, then an optional trailer line."""
+    count = 0
+    for records in chunks:
+        count += len(records)
+        yield "".join(json.dumps(r) + "\n" for r in records).encode()
+    if trailer is not None:
+        yield (json.dumps({**trailer, "done": True, "count": count}) + "\n").encode()
+
+
+def parquet_schema():
+    import pyarrow as pa
+
+    detection = pa.struct([
+        ("object_type", pa.string()),
+        ("confidence", pa.float32()),
+        ("bbox", pa.list_(pa.float32())),
+    ])
+    return pa.schema([
+        ("frame_id", pa.int64()),
+        ("score", pa.float32()),
+        ("similarity", pa.float32()),
+        ("dataset", pa.string()),
+        ("sequence", pa.string()),
+        ("sensor", pa.string()),
+        ("media_key", pa.string()),
+        ("sample_token", pa.string()),
+        ("detections", pa.list_(detection)),
+    ])
+
+
+def write_parquet(chunks: Iterable[List[dict]], path: Path) -> int:
+    """
+    Write chunks as Parquet row groups to ``path`` (via a temp file, so readers never
+    see a partial export) and return the row count. Needs pyarrow (in requirements.txt).
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow: pip install -r requirements.txt")
+
+    schema = parquet_schema()
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    count = 0
+    try:
+        with pq.ParquetWriter(tmp, schema) as writer:
+            for records in chunks:
+                writer.write_table(pa.Table.from_pylist(records, schema=schema))
+                count += len(records)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return count
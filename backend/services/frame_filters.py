@@ -0,0 +1,104 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+from backend.db.postgres import get_conn
+from backend.services.frame_store import FrameStore
+from backend.services.index_meta import search_parameters
+from backend.services.object_index import (
+    DEFAULT_MIN_CONFIDENCE, ObjectIndex, build_object_index, object_index_path_for,
+)
+
+# Sequences that are never returned by search (kept out of every bitset)
+EXCLUDED_SEQUENCES = {"2011_09_26_drive_0001_sync"}
+
+
+class FrameFilters:
+    """
+    In-memory filter bitsets aligned row-for-row with the FAISS frame-id mapping.
+
+    Dataset, sequence and sensor come from the dictionary-encoded columns of the
+    FrameStore; object filters are evaluated on the ObjectIndex posting lists.
+    ``mask()`` combines them into the set of positions a query may return.
+    """
+
+    def __init__(self, store: FrameStore, objects: ObjectIndex):
+        self.store = store
+        self.ntotal = len(store)
+        self.objects = objects
+
+        # Base mask: first frame per media_key, minus excluded sequences
+        base = np.asarray(store["canonical"]).astype(bool)
+        for name in EXCLUDED_SEQUENCES:
+            code = store.code("sequence", name)
+            if code is not None:
+                base &= store["sequence"] != code
+        self.base = base
+
+    def _column_mask(self, column: str, value: str) -> np.ndarray:
+        code = self.store.code(column, value)
+        if code is None:
+            return np.zeros(self.ntotal, dtype=bool)
+        return self.store[column] == code
+
+    def mask(
+        self,
+        dataset: Optional[str] = None,
+        sequence: Optional[str] = None,
+        sensor: Optional[str] = None,
+        objects: Optional[Iterable[str]] = None,
+        objects_mode: str = "any",
+        min_confidence: float = DEFAULT_MIN_CONFIDENCE,
+    ) -> np.ndarray:
+        """
+        Boolean mask of searchable rows. Dataset, sequence and sensor are ANDed;
+        object types are ORed (``objects_mode="any"``) or ANDed (``"all"``), counting
+        only detections above ``min_confidence``.
+        """
+        mask = self.base.copy()
+        if dataset:
+            mask &= self._column_mask("dataset", dataset)
+        if sequence:
+            mask &= self._column_mask("sequence", sequence)
+        if sensor:
+            mask &= self._column_mask("sensor", sensor)
+        if objects:
+            mask &= self.objects.mask(objects, mode=objects_mode, min_confidence=min_confidence)
+        return mask
+
+    def dataset_count(self, mask: np.ndarray) -> int:
+        """Number of distinct datasets among the selected rows."""
+        return int(np.unique(self.store["dataset"][mask]).size)
+
+
+def selector_params(mask: np.ndarray, search_params: Optional[dict] = None):
+    """
+    Wrap a boolean row mask as FAISS search parameters with an ID selector,
+    carrying the index's search-time settings (nprobe / efSearch).
+    The packed bitmap is attached to the params so it outlives the search call.
+    """
+    import faiss
+
+    bitmap = np.packbits(mask, bitorder="little")
+    params = search_parameters(search_params, sel=faiss.IDSelectorBitmap(bitmap))
+    params._navis_bitmap = bitmap
+    return params
+
+
+def load_frame_filters(store: FrameStore, index_path: Path) -> FrameFilters:
+    """Build filter bitsets for an index: columns from the store, objects from the posting lists next to it."""
+    objects_path = object_index_path_for(index_path)
+    objects = None
+    if objects_path.exists():
+        objects = ObjectIndex.load(objects_path)
+        if objects.ntotal != len(store):
+            print(f"⚠️ Object index at {objects_path} does not match the mapping, rebuilding")
+            objects = None
+    else:
+        print(f"⚠️ No object index at {objects_path}, building from Postgres")
+    if objects is None:
+        with get_conn() as conn:
+            objects = build_object_index(conn, store.rows_for_frame_ids, len(store))
+    return FrameFilters(store, objects)
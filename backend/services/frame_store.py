@@ -0,0 +1,179 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import json
+
+import numpy as np
+
+# Per-dataset attributes, stored as vocabularies indexed by the dataset code
+DATASET_FIELDS = ("slug", "name", "media_base_uri")
+# High-cardinality string columns, stored Arrow-style as offsets + utf-8 bytes
+STRING_COLUMNS = ("media_key", "sample_token")
+
+
+def store_path_for(index_path: Path) -> Path:
+    """Column store directory that sits next to an index file (combined.index -> combined_store/)."""
+    return index_path.with_name(f"{index_path.stem}_store")
+
+
+def _encode_strings(values: List[Optional[str]]):
+    """Pack strings into (int64 offsets, uint8 data); None is stored as an empty string."""
+    encoded = [(v or "").encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return offsets, data
+
+
+class FrameStore:
+    """
+    Compact column store of frame metadata, aligned row-for-row with a FAISS
+    frame-id mapping. Row ``i`` describes the vector at FAISS position ``i``.
+
+    Columns are plain NumPy arrays (memory-mapped when loaded from disk):
+      - ``frame_id``: int32
+      - ``dataset`` / ``sequence`` / ``sensor``: int32 codes into ``vocabs``
+      - ``canonical``: uint8, 1 for the first frame id of each media_key
+      - ``media_key`` / ``sample_token``: ``<name>_offsets`` + ``<name>_data``
+    Dataset codes also index ``vocabs['slug' | 'name' | 'media_base_uri']``.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], vocabs: Dict[str, list]):
+        self.columns = columns
+        self.vocabs = vocabs
+        self._codes = {
+            name: {v: i for i, v in enumerate(vocabs[name])}
+            for name in ("sequence", "sensor")
+        }
+        self._codes["dataset"] = {v: i for i, v in enumerate(vocabs["slug"])}
+        self._sorted = None
+
+    def __len__(self) -> int:
+        return len(self.columns["frame_id"])
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    @property
+    def frame_ids(self) -> np.ndarray:
+        return self.columns["frame_id"]
+
+    def code(self, column: str, value: Optional[str]) -> Optional[int]:
+        """Code of ``value`` in a categorical column, or None if it never occurs."""
+        return self._codes[column].get(value)
+
+    def string(self, column: str, row: int) -> str:
+        offsets = self.columns[f"{column}_offsets"]
+        data = self.columns[f"{column}_data"]
+        return bytes(data[offsets[row]:offsets[row + 1]]).decode("utf-8")
+
+    def strings(self, column: str, rows: Iterable[int]) -> List[str]:
+        return [self.string(column, int(r)) for r in rows]
+
+    def rows_for_frame_ids(self, frame_ids: np.ndarray) -> np.ndarray:
+        """FAISS positions for the given frame ids (-1 where a frame is not in the store)."""
+        if self._sorted is None:
+            order = np.argsort(self.frame_ids, kind="stable")
+            self._sorted = (order, np.asarray(self.frame_ids)[order])
+        order, sorted_ids = self._sorted
+        frame_ids = np.asarray(frame_ids, dtype=np.int64)
+        if len(sorted_ids) == 0:
+            return np.full(frame_ids.shape, -1, dtype=np.int64)
+        pos = np.clip(np.searchsorted(sorted_ids, frame_ids), 0, len(sorted_ids) - 1)
+        return np.where(sorted_ids[pos] == frame_ids, order[pos], -1)
+
+    def save(self, path: Path) -> None:
+        path.mkdir(parents=True, exist_ok=True)
+        for name, arr in self.columns.items():
+            np.save(path / f"{name}.npy", arr)
+        (path / "vocabs.json").write_text(json.dumps(self.vocabs))
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> "FrameStore":
+        vocabs = json.loads((path / "vocabs.json").read_text())
+        mode = "r" if mmap else None
+        columns = {p.stem: np.load(p, mmap_mode=mode) for p in sorted(path.glob("*.npy"))}
+        return cls(columns, vocabs)
+
+
+def build_frame_store(conn, frame_ids: np.ndarray) -> FrameStore:
+    """Build a FrameStore for ``frame_ids`` (in FAISS order) from navis.frames/sequences/datasets."""
+    frame_ids = np.asarray(frame_ids, dtype=np.int32)
+
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT f.id AS frame_id, f.media_key, f.sample_token,
+                   d.slug, d.name, d.media_base_uri,
+                   s.scene_token, s.sensor
+            FROM navis.frames f
+            JOIN navis.sequences s ON s.id = f.sequence_id
+            JOIN navis.datasets d  ON d.id = s.dataset_id
+            WHERE f.id = ANY(%s)
+        """, (frame_ids.tolist(),))
+        rows = {r["frame_id"]: r for r in cur.fetchall()}
+
+    return frame_store_from_rows(frame_ids, rows)
+
+
+def frame_store_from_rows(frame_ids: np.ndarray, rows: Dict[int, dict]) -> FrameStore:
+    """
+    FrameStore for ``frame_ids`` from already-fetched rows keyed by frame id (columns
+    frame_id, media_key, sample_token, slug, name, media_base_uri, scene_token, sensor).
+    """
+    frame_ids = np.asarray(frame_ids, dtype=np.int32)
+    n = len(frame_ids)
+
+    vocabs: Dict[str, list] = {name: [] for name in DATASET_FIELDS + ("sequence", "sensor")}
+    dataset_info: Dict[Optional[str], tuple] = {}
+    lookup: Dict[str, dict] = {"slug": {}, "sequence": {}, "sensor": {}}
+
+    def code_for(column: str, value):
+        table = lookup[column]
+        if value not in table:
+            table[value] = len(table)
+            vocabs[column].append(value)
+        return table[value]
+
+    dataset = np.empty(n, dtype=np.int32)
+    sequence = np.empty(n, dtype=np.int32)
+    sensor = np.empty(n, dtype=np.int32)
+    canonical = np.zeros(n, dtype=np.uint8)
+    media_keys: List[Optional[str]] = [None] * n
+    sample_tokens: List[Optional[str]] = [None] * n
+
+    for i, fid in enumerate(frame_ids.tolist()):
+        r = rows.get(fid)
+        if r is None:
+            dataset[i] = code_for("slug", None)
+            sequence[i] = code_for("sequence", None)
+            sensor[i] = code_for("sensor", None)
+            continue
+        dataset[i] = code_for("slug", r["slug"])
+        dataset_info[r["slug"]] = (r["name"], r["media_base_uri"])
+        sequence[i] = code_for("sequence", r["scene_token"])
+        sensor[i] = code_for("sensor", r["sensor"])
+        media_keys[i] = r["media_key"]
+        sample_tokens[i] = r["sample_token"]
+
+    vocabs["name"] = [dataset_info.get(slug, (None, None))[0] for slug in vocabs["slug"]]
+    vocabs["media_base_uri"] = [dataset_info.get(slug, (None, None))[1] for slug in vocabs["slug"]]
+
+    # Same rule the search SQL used: DISTINCT ON (media_key) ORDER BY media_key, id
+    first_row: Dict[str, int] = {}
+    for i in np.argsort(frame_ids, kind="stable").tolist():
+        key = media_keys[i]
+        if key is not None and key not in first_row:
+            first_row[key] = i
+    canonical[list(first_row.values())] = 1
+
+    columns = {
+        "frame_id": frame_ids,
+        "dataset": dataset,
+        "sequence": sequence,
+        "sensor": sensor,
+        "canonical": canonical,
+    }
+    for name, values in zip(STRING_COLUMNS, (media_keys, sample_tokens)):
+        columns[f"{name}_offsets"], columns[f"{name}_data"] = _encode_strings(values)
+
+    return FrameStore(columns, vocabs)
@@ -0,0 +1,120 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Optional
+from datetime import datetime, timezone
+import json
+import os
+import shutil
+
+
+def meta_path_for(index_path: Path) -> Path:
+    """Metadata file written next to an index (combined.index -> combined.meta.json)."""
+    return index_path.with_name(f"{index_path.stem}.meta.json")
+
+
+def load_index_meta(index_path: Path) -> dict:
+    """Index metadata, or {} for indexes built before metadata was recorded (exact Flat)."""
+    path = meta_path_for(index_path)
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def save_index_meta(index_path: Path, meta: dict) -> Path:
+    path = meta_path_for(index_path)
+    path.write_text(json.dumps(meta, indent=2))
+    return path
+
+
+def search_parameters(search_params: Optional[dict] = None, sel=None):
+    """
+    FAISS SearchParameters of the type the index expects: IVF indexes reject
+    plain SearchParameters and HNSW ignores efSearch unless given its own type.
+    ``search_params`` is the ``search_params`` dict from the index metadata.
+    """
+    import faiss
+
+    search_params = search_params or {}
+    kwargs = {"sel": sel} if sel is not None else {}
+    if "nprobe" in search_params:
+        return faiss.SearchParametersIVF(nprobe=int(search_params["nprobe"]), **kwargs)
+    if "efSearch" in search_params:
+        return faiss.SearchParametersHNSW(efSearch=int(search_params["efSearch"]), **kwargs)
+    return faiss.SearchParameters(**kwargs)
+
+
+# --- Versioned index directory ---------------------------------------------
+#
+# faiss_indexes/
+#   manifest.json                         {"version": ..., "indexes": {"<model>/combined": "versions/<v>/<model>/combined.index"}}
+#   versions/<v>/<model>/combined.index   + combined_mapping.npy, combined.meta.json, combined_store/
+#
+# Builders write a new version directory and then swap manifest.json atomically;
+# the API serves whatever the manifest points at (and reloads when it changes).
+# Entries without a "<model>/" prefix predate per-model indexes.
+
+MANIFEST_NAME = "manifest.json"
+
+
+def index_key(model: str, name: str) -> str:
+    """Manifest entry of index ``name`` (dataset slug or 'combined') built with embedding ``model``."""
+    return f"{model}/{name}"
+
+
+def split_index_key(key: str, legacy_model: str) -> tuple:
+    """(model, name) of a manifest entry; unprefixed entries belong to ``legacy_model``."""
+    model, sep, name = key.rpartition("/")
+    return (model, name) if sep else (legacy_model, key)
+
+
+def mapping_path_for(index_path: Path) -> Path:
+    """Frame-id mapping written next to an index (combined.index -> combined_mapping.npy)."""
+    return index_path.with_name(f"{index_path.stem}_mapping.npy")
+
+
+def new_version() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+
+
+def read_manifest(index_dir: Path) -> Optional[dict]:
+    path = index_dir / MANIFEST_NAME
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def write_manifest(index_dir: Path, manifest: dict) -> None:
+    """Write manifest.json via temp file + rename so readers never see a partial file."""
+    tmp = index_dir / f".{MANIFEST_NAME}.{os.getpid()}.tmp"
+    tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp, index_dir / MANIFEST_NAME)
+
+
+def activate_index(index_dir: Path, name: str, index_path: Path, replaces: Optional[str] = None) -> dict:
+    """
+    Point manifest entry ``name`` (see index_key) at ``index_path`` and bump the manifest
+    version. ``replaces`` names an older entry it supersedes, which is dropped.
+    """
+    manifest = read_manifest(index_dir) or {"indexes": {}}
+    manifest["indexes"][name] = str(index_path.relative_to(index_dir))
+    if replaces and replaces != name:
+        manifest["indexes"].pop(replaces, None)
+    manifest["version"] = new_version()
+    write_manifest(index_dir, manifest)
+    return manifest
+
+
+def prune_versions(index_dir: Path, keep: int = 3) -> list:
+    """Delete version directories the manifest no longer references, keeping the newest ``keep``."""
+    versions_dir = index_dir / "versions"
+    if not versions_dir.exists():
+        return []
+    manifest = read_manifest(index_dir) or {"indexes": {}}
+    in_use = {Path(p).parts[1] for p in manifest["indexes"].values() if Path(p).parts[:1] == ("versions",)}
+    candidates = sorted((d for d in versions_dir.iterdir() if d.is_dir()), reverse=True)
+    removed = []
+    for d in candidates[keep:]:
+        if d.name not in in_use:
+            shutil.rmtree(d)
+            removed.append(d.name)
+    return removed
@@ -0,0 +1,72 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+
+
+def knn_graph_path_for(index_path: Path) -> Path:
+    """kNN graph directory that sits next to an index (combined.index -> combined_knn/)."""
+    return index_path.with_name(f"{index_path.stem}_knn")
+
+
+class KnnGraph:
+    """
+    Precomputed nearest neighbors of every indexed frame, by FAISS position.
+
+    ``neighbors`` is int32 (ntotal, K) with -1 padding, ``distances`` the matching
+    float16 squared L2 distances, both in ascending distance order and without the
+    frame itself.
+    """
+
+    def __init__(self, neighbors: np.ndarray, distances: np.ndarray):
+        self.neighbors = neighbors
+        self.distances = distances
+
+    def __len__(self) -> int:
+        return len(self.neighbors)
+
+    @property
+    def k(self) -> int:
+        return self.neighbors.shape[1]
+
+    def lookup(self, row: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(distances, rows) of the stored neighbors of ``row``."""
+        rows = np.asarray(self.neighbors[row])
+        valid = rows >= 0
+        return np.asarray(self.distances[row], dtype=np.float32)[valid], rows[valid]
+
+    def save(self, path: Path) -> None:
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "neighbors.npy", self.neighbors)
+        np.save(path / "distances.npy", self.distances)
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> "KnnGraph":
+        mode = "r" if mmap else None
+        return cls(np.load(path / "neighbors.npy", mmap_mode=mode), np.load(path / "distances.npy", mmap_mode=mode))
+
+
+def build_knn_graph(index, vectors: np.ndarray, k: int, params=None, batch_size: int = 4096) -> KnnGraph:
+    """
+    Query ``index`` with each of its own vectors (k + 1 neighbors, in batches) and
+    drop the self match. ``params`` are the index's FAISS SearchParameters.
+    """
+    n = len(vectors)
+    k = min(k, max(n - 1, 0))
+    neighbors = np.full((n, k), -1, dtype=np.int32)
+    distances = np.zeros((n, k), dtype=np.float16)
+    if k == 0:
+        return KnnGraph(neighbors, distances)
+
+    for start in range(0, n, batch_size):
+        batch = np.ascontiguousarray(vectors[start:start + batch_size], dtype=np.float32)
+        D, I = index.search(batch, k + 1, params=params)
+        own = np.arange(start, start + len(batch))[:, None]
+        keep = I != own
+        # Approximate indexes can miss the frame itself; then drop the farthest result instead
+        keep[keep.all(axis=1), -1] = False
+        order = np.argsort(~keep, axis=1, kind="stable")[:, :k]
+        neighbors[start:start + len(batch)] = np.take_along_axis(I, order, axis=1)
+        distances[start:start + len(batch)] = np.take_along_axis(D, order, axis=1)
+    return KnnGraph(neighbors, distances)
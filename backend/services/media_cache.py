@@ -0,0 +1,294 @@
+"""
+Size-bounded on-disk cache for downloaded media (Drive files).
+
+Layout: ``<root>/<k[:2]>/<k[2:4]>/<k>.bin`` with ``k`` the md5 of the cache key, so
+no directory grows past a few hundred entries. Writes go to a temp file in the
+same directory and are renamed into place, so readers see a whole file or none.
+
+An in-memory index (size, last access, hit count per entry) tracks the bytes in
+use. Once they pass the budget, entries are evicted least recently used (or least
+frequently used) down to ``low_watermark`` of the budget. The index is rebuilt by
+scanning the directory on first use and again before each eviction, so several
+processes can share one cache directory: each eviction pass sees the files the
+others wrote.
+
+MemoryCache is the in-process hot tier the /media route keeps in front of it.
+
+Stdlib only: imported by services/drive.py and services/thumbnails.py from both the API and the scripts.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+import hashlib
+import os
+import threading
+import time
+
+POLICIES = ("lru", "lfu")
+# Temp files older than this belong to a writer that crashed mid-write
+STALE_TMP_SECONDS = 3600
+
+
+class MediaCache:
+    """Byte-budgeted content cache keyed by name (e.g. a Drive file id); see the module docstring."""
+
+    def __init__(self, root: Path, max_bytes: int, policy: str = "lru", low_watermark: float = 0.9):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown cache policy {policy!r} (expected one of {', '.join(POLICIES)})")
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.low_watermark = low_watermark
+        # key -> [size, last access (epoch seconds), hits]
+        self._entries: Dict[str, list] = {}
+        self._bytes = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key_for(name: str) -> str:
+        return hashlib.md5(name.encode()).hexdigest()
+
+    def path_for(self, key: str) -> Path:
+        return self.root / key[:2] / key[2:4] / f"{key}.bin"
+
+    # --- index -------------------------------------------------------------
+
+    def _scan(self) -> Dict[str, list]:
+        """Entries currently on disk; flat ``<key>.bin`` files of the old layout are moved into place."""
+        found = {}
+        self.root.mkdir(parents=True, exist_ok=True)
+        for entry in os.scandir(self.root):
+            if entry.is_file() and entry.name.endswith(".bin"):
+                key = entry.name[:-4]
+                target = self.path_for(key)
+                try:
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    os.replace(entry.path, target)
+                except OSError:
+                    continue
+        for level1 in os.scandir(self.root):
+            if not level1.is_dir():
+                continue
+            for level2 in os.scandir(level1.path):
+                if not level2.is_dir():
+                    continue
+                for entry in os.scandir(level2.path):
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    if entry.name.endswith(".bin"):
+                        found[entry.name[:-4]] = [st.st_size, st.st_mtime, 0]
+                    elif entry.name.endswith(".tmp") and st.st_mtime < time.time() - STALE_TMP_SECONDS:
+                        # Left behind by a writer that died before the rename
+                        Path(entry.path).unlink(missing_ok=True)
+        return found
+
+    def _merge_scan(self):
+        """Refresh the index from disk, keeping the access stats this process has recorded."""
+        started = time.time()
+        found = self._scan()
+        with self._lock:
+            for key, entry in found.items():
+                known = self._entries.get(key)
+                if known is not None:
+                    entry[1], entry[2] = known[1], known[2]
+            for key, known in self._entries.items():
+                # Written while the scan was running
+                if key not in found and known[1] >= started:
+                    found[key] = known
+            self._entries = found
+            self._bytes = sum(e[0] for e in found.values())
+            self._loaded = True
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            with self._evict_lock:
+                if not self._loaded:
+                    self._merge_scan()
+
+    # --- reads and writes --------------------------------------------------
+
+    def get(self, name: str) -> Optional[bytes]:
+        if not self.enabled:
+            return None
+        self._ensure_loaded()
+        key = self.key_for(name)
+        try:
+            data = self.path_for(key).read_bytes()
+        except FileNotFoundError:
+            with self._lock:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self._bytes -= entry[0]
+                self.misses += 1
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                # Written by another process since our last scan
+                entry = self._entries[key] = [len(data), 0.0, 0]
+                self._bytes += len(data)
+            entry[1] = time.time()
+            entry[2] += 1
+            self.hits += 1
+        return data
+
+    def contains(self, name: str) -> bool:
+        """Whether ``name`` is on disk (no read, no access stats)."""
+        return self.enabled and self.path_for(self.key_for(name)).exists()
+
+    def put(self, name: str, data: bytes) -> None:
+        if not self.enabled or len(data) > self.max_bytes:
+            return
+        self._ensure_loaded()
+        key = self.key_for(name)
+        path = self.path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+        with self._lock:
+            old = self._entries.get(key)
+            if old is not None:
+                self._bytes -= old[0]
+            self._entries[key] = [len(data), time.time(), old[2] if old else 0]
+            self._bytes += len(data)
+            self.writes += 1
+            over = self._bytes > self.max_bytes
+        if over:
+            self.evict()
+
+    def evict(self) -> int:
+        """Delete entries until the cache is under ``low_watermark`` of its budget; returns bytes freed."""
+        if not self._evict_lock.acquire(blocking=False):
+            return 0  # another thread is already evicting
+        try:
+            self._merge_scan()
+            target = int(self.max_bytes * self.low_watermark)
+            with self._lock:
+                if self._bytes <= self.max_bytes:
+                    return 0
+                if self.policy == "lfu":
+                    order = sorted(self._entries.items(), key=lambda kv: (kv[1][2], kv[1][1]))
+                else:
+                    order = sorted(self._entries.items(), key=lambda kv: kv[1][1])
+                victims: List[tuple] = []
+                remaining = self._bytes
+                for key, entry in order:
+                    if remaining <= target:
+                        break
+                    victims.append((key, entry[0]))
+                    remaining -= entry[0]
+                for key, _ in victims:
+                    del self._entries[key]
+                self._bytes = remaining
+            freed = 0
+            for key, size in victims:
+                try:
+                    self.path_for(key).unlink()
+                    freed += size
+                except FileNotFoundError:
+                    pass
+            with self._lock:
+                self.evictions += len(victims)
+                self.evicted_bytes += freed
+            return freed
+        finally:
+            self._evict_lock.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "root": str(self.root),
+                "policy": self.policy,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "evicted_bytes": self.evicted_bytes,
+            }
+
+
+class MemoryCache:
+    """
+    In-process LRU of media payloads bounded by their total size in bytes (the hot
+    tier in front of MediaCache). Payloads over ``max_item_bytes`` are not kept, so
+    one large file cannot flush the popular small ones.
+    """
+
+    def __init__(self, max_bytes: int, max_item_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes if max_item_bytes is not None else max_bytes
+        self._lru: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: str):
+        """Stored value, or None."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._lru.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value, size: int) -> None:
+        """Keep ``value`` under ``key``, accounted as ``size`` bytes."""
+        if not self.enabled or size > self.max_item_bytes:
+            return
+        with self._lock:
+            old = self._lru.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._lru[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._lru.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._lru),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "max_item_bytes": self.max_item_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,122 @@
+from __future__ import annotations
+from functools import reduce
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import json
+
+import numpy as np
+
+# Detections at or below this confidence do not count unless a query asks for a lower threshold
+DEFAULT_MIN_CONFIDENCE = 0.5
+
+
+def object_index_path_for(index_path: Path) -> Path:
+    """Posting lists directory that sits next to an index (combined.index -> combined_objects/)."""
+    return index_path.with_name(f"{index_path.stem}_objects")
+
+
+class ObjectIndex:
+    """
+    Inverted index over detected objects, aligned with a FAISS frame-id mapping.
+
+    For each object type the postings are the sorted FAISS positions of frames
+    containing it, with the best detection confidence per frame. All lists are
+    concatenated CSR-style into ``rows`` (int32) and ``confidence`` (float32);
+    ``offsets[type] = (start, end)`` slices them.
+    """
+
+    def __init__(self, offsets: Dict[str, List[int]], rows: np.ndarray, confidence: np.ndarray, ntotal: int):
+        self.offsets = offsets
+        self.rows = rows
+        self.confidence = confidence
+        self.ntotal = ntotal
+
+    @property
+    def object_types(self) -> List[str]:
+        return sorted(self.offsets)
+
+    def postings(self, object_type: str, min_confidence: float = DEFAULT_MIN_CONFIDENCE) -> np.ndarray:
+        """Sorted positions of frames with ``object_type`` detected above ``min_confidence``."""
+        span = self.offsets.get(object_type)
+        if span is None:
+            return np.empty(0, dtype=np.int32)
+        start, end = span
+        rows = self.rows[start:end]
+        return np.asarray(rows[self.confidence[start:end] > min_confidence])
+
+    def match(self, objects: Iterable[str], mode: str = "any",
+              min_confidence: float = DEFAULT_MIN_CONFIDENCE) -> np.ndarray:
+        """Sorted positions matching any (union) or all (intersection) of the object types."""
+        lists = [self.postings(obj, min_confidence) for obj in objects]
+        if not lists:
+            return np.empty(0, dtype=np.int32)
+        if mode == "all":
+            return reduce(lambda a, b: np.intersect1d(a, b, assume_unique=True), lists)
+        return reduce(np.union1d, lists)
+
+    def mask(self, objects: Iterable[str], mode: str = "any",
+             min_confidence: float = DEFAULT_MIN_CONFIDENCE) -> np.ndarray:
+        mask = np.zeros(self.ntotal, dtype=bool)
+        mask[self.match(objects, mode, min_confidence)] = True
+        return mask
+
+    def save(self, path: Path) -> None:
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "rows.npy", self.rows)
+        np.save(path / "confidence.npy", self.confidence)
+        (path / "offsets.json").write_text(json.dumps({"ntotal": self.ntotal, "offsets": self.offsets}))
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> "ObjectIndex":
+        header = json.loads((path / "offsets.json").read_text())
+        mode = "r" if mmap else None
+        rows = np.load(path / "rows.npy", mmap_mode=mode)
+        confidence = np.load(path / "confidence.npy", mmap_mode=mode)
+        return cls(header["offsets"], rows, confidence, header["ntotal"])
+
+
+def build_object_index(conn, rows_for_frame_ids, ntotal: int, min_confidence: Optional[float] = None) -> ObjectIndex:
+    """
+    Build posting lists from navis.frame_objects. ``rows_for_frame_ids`` maps frame
+    ids to FAISS positions (-1 if not indexed), e.g. FrameStore.rows_for_frame_ids or
+    ClusterTable.rows_for_frame_ids (a row then matches if any cluster member does).
+    Detections at or below ``min_confidence`` are dropped to keep the lists small.
+    """
+    with conn.cursor() as cur:
+        sql = """
+            SELECT object_type, frame_id, MAX(confidence) AS confidence
+            FROM navis.frame_objects
+        """
+        params = ()
+        if min_confidence is not None:
+            sql += " WHERE confidence > %s"
+            params = (min_confidence,)
+        sql += " GROUP BY object_type, frame_id"
+        cur.execute(sql, params)
+        detections = cur.fetchall()
+
+    by_type: Dict[str, list] = {}
+    for r in detections:
+        by_type.setdefault(r["object_type"], []).append((r["frame_id"], r["confidence"] or 0.0))
+
+    offsets: Dict[str, List[int]] = {}
+    all_rows, all_conf = [], []
+    start = 0
+    for object_type in sorted(by_type):
+        frame_ids, confidence = zip(*by_type[object_type])
+        rows = np.asarray(rows_for_frame_ids(np.array(frame_ids)))
+        confidence = np.array(confidence, dtype=np.float32)
+        keep = rows >= 0
+        rows, confidence = rows[keep], confidence[keep]
+        # Several frames can map to one row (near-duplicate clusters): keep the best detection
+        order = np.lexsort((-confidence, rows))
+        rows, confidence = rows[order], confidence[order]
+        first = np.r_[True, rows[1:] != rows[:-1]] if len(rows) else np.zeros(0, dtype=bool)
+        all_rows.append(rows[first].astype(np.int32))
+        all_conf.append(confidence[first])
+        offsets[object_type] = [start, start + int(first.sum())]
+        start += int(first.sum())
+
+    rows = np.concatenate(all_rows) if all_rows else np.empty(0, dtype=np.int32)
+    confidence = np.concatenate(all_conf) if all_conf else np.empty(0, dtype=np.float32)
+    return ObjectIndex(offsets, rows, confidence, ntotal)
@@ -0,0 +1,171 @@
+from __future__ import annotations
+from typing import Iterable, List, Optional
+import itertools
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+
+from backend.db.postgres import get_conn
+from backend.services.embedding_models import get_embedding_model
+from backend.services.frame_filters import EXCLUDED_SEQUENCES
+from backend.services.frame_store import FrameStore, frame_store_from_rows
+from backend.services.object_index import DEFAULT_MIN_CONFIDENCE
+
+# hnsw.ef_search for each query (raised to k when a query asks for more, pgvector caps it at 1000)
+PGVECTOR_EF_SEARCH = int(os.environ.get("PGVECTOR_EF_SEARCH", "100"))
+# pgvector >= 0.8 keeps scanning the HNSW graph until LIMIT rows pass the WHERE clause.
+# Set to "" for older pgvector, which filters only the first ef_search candidates.
+PGVECTOR_ITERATIVE_SCAN = os.environ.get("PGVECTOR_ITERATIVE_SCAN", "relaxed_order")
+PGVECTOR_POOL_SIZE = int(os.environ.get("PGVECTOR_POOL_SIZE", "4"))
+# The one embedding model whose vectors scripts/sync_pgvector.py copied into emb_vec
+# (default: SEARCH_DEFAULT_MODEL); other models are served from their FAISS indexes.
+PGVECTOR_MODEL = get_embedding_model(os.environ.get("PGVECTOR_MODEL")).key
+
+SEARCH_SQL = """
+    SELECT f.id AS frame_id, f.media_key, f.sample_token,
+           d.slug, d.name, d.media_base_uri,
+           s.scene_token, s.sensor,
+           e.emb_vec <-> %(qvec)s::vector AS distance
+    FROM navis.embeddings e
+    JOIN navis.frames f    ON f.id = e.frame_id
+    JOIN navis.sequences s ON s.id = f.sequence_id
+    JOIN navis.datasets d  ON d.id = s.dataset_id
+    WHERE {where}
+    ORDER BY e.emb_vec <-> %(qvec)s::vector
+    LIMIT %(k)s
+"""
+
+_result_ids = itertools.count()
+
+
+class PgResults:
+    """
+    The rows one pgvector query returned, decoded into a FrameStore. Has the
+    ``name`` and ``store`` a Shard has, so candidates (distance, results, row)
+    go through the same hit building, interleaving and pagination.
+    """
+
+    def __init__(self, store: FrameStore):
+        self.name = f"pgvector-{next(_result_ids)}"
+        self.store = store
+
+
+def _where(dataset: Optional[str] = None, sequence: Optional[str] = None, sensor: Optional[str] = None,
+           objects: Optional[Iterable[str]] = None, objects_mode: str = "any",
+           min_confidence: float = DEFAULT_MIN_CONFIDENCE) -> tuple:
+    """WHERE clause + params with the same semantics as FrameFilters.mask()."""
+    clauses = [
+        "e.emb_vec IS NOT NULL",
+        "s.scene_token <> ALL(%(excluded)s)",
+        # First indexed frame per media_key (FrameStore's canonical flag)
+        """NOT EXISTS (
+            SELECT 1 FROM navis.frames f2
+            JOIN navis.embeddings e2 ON e2.frame_id = f2.id AND e2.model_id = e.model_id
+            WHERE f2.media_key = f.media_key AND f2.id < f.id
+        )""",
+    ]
+    params = {"excluded": sorted(EXCLUDED_SEQUENCES)}
+    if dataset:
+        clauses.append("d.slug = %(dataset)s")
+        params["dataset"] = dataset
+    if sequence:
+        clauses.append("s.scene_token = %(sequence)s")
+        params["sequence"] = sequence
+    if sensor:
+        clauses.append("s.sensor = %(sensor)s")
+        params["sensor"] = sensor
+    objects = sorted(set(objects or ()))
+    if objects:
+        params.update(objects=objects, min_confidence=min_confidence)
+        if objects_mode == "all":
+            clauses.append("""(
+                SELECT COUNT(DISTINCT o.object_type) FROM navis.frame_objects o
+                WHERE o.frame_id = f.id AND o.object_type = ANY(%(objects)s) AND o.confidence > %(min_confidence)s
+            ) = %(n_objects)s""")
+            params["n_objects"] = len(objects)
+        else:
+            clauses.append("""EXISTS (
+                SELECT 1 FROM navis.frame_objects o
+                WHERE o.frame_id = f.id AND o.object_type = ANY(%(objects)s) AND o.confidence > %(min_confidence)s
+            )""")
+    return " AND ".join(clauses), params
+
+
+class PgVectorBackend:
+    """
+    Text search against ``navis.embeddings.emb_vec`` (one model's vectors with an HNSW
+    index, see scripts/sync_pgvector.py). Filters run inside the same SQL statement, so
+    each query fetches exactly k rows. ``search()`` matches IndexBundle.search().
+    """
+
+    version = "pgvector"
+    model = PGVECTOR_MODEL
+
+    def __init__(self, ef_search: int = PGVECTOR_EF_SEARCH, iterative_scan: str = PGVECTOR_ITERATIVE_SCAN,
+                 pool_size: int = PGVECTOR_POOL_SIZE):
+        self.ef_search = ef_search
+        self.iterative_scan = iterative_scan
+        self._pool: "queue.LifoQueue" = queue.LifoQueue(maxsize=pool_size)
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return get_conn()
+
+    def _release(self, conn):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def search(self, qvecs: np.ndarray, k: int, **filters) -> List[List[tuple]]:
+        """Per query row, up to k candidates as (squared L2 distance, PgResults, row)."""
+        where, params = _where(**filters)
+        sql = SEARCH_SQL.format(where=where)
+        conn = self._acquire()
+        try:
+            results = []
+            with conn.cursor() as cur:
+                cur.execute("SELECT set_config('hnsw.ef_search', %s, true)",
+                            (str(min(max(self.ef_search, k), 1000)),))
+                if self.iterative_scan:
+                    cur.execute("SELECT set_config('hnsw.iterative_scan', %s, true)", (self.iterative_scan,))
+                for qvec in qvecs:
+                    cur.execute(sql, {**params, "qvec": json.dumps(np.asarray(qvec).tolist()), "k": k})
+                    rows = cur.fetchall()
+                    # relaxed_order may return rows slightly out of order
+                    rows.sort(key=lambda r: r["distance"])
+                    frame_ids = np.array([r["frame_id"] for r in rows], dtype=np.int32)
+                    hits = PgResults(frame_store_from_rows(frame_ids, {r["frame_id"]: r for r in rows}))
+                    results.append([(float(r["distance"]) ** 2, hits, i) for i, r in enumerate(rows)])
+            conn.rollback()  # read-only; ends the transaction the set_config calls were scoped to
+        except Exception:
+            conn.close()
+            raise
+        self._release(conn)
+        return results
+
+    def describe(self) -> dict:
+        return {
+            "version": self.version,
+            "mode": "pgvector",
+            "model": self.model,
+            "ef_search": self.ef_search,
+            "iterative_scan": self.iterative_scan or None,
+        }
+
+
+_backend: Optional[PgVectorBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_pgvector_backend() -> PgVectorBackend:
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = PgVectorBackend()
+        return _backend
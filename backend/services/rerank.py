@@ -0,0 +1,34 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+
+
+def vectors_path_for(index_path: Path) -> Path:
+    """Full-precision vectors kept next to a quantized index (combined.index -> combined_vectors.npy)."""
+    return index_path.with_name(f"{index_path.stem}_vectors.npy")
+
+
+def rerank_exact(vectors: np.ndarray, qvecs: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Re-score candidate ``rows`` (FAISS positions, -1 padded) of each query with exact
+    squared L2 against the float32 ``vectors`` (typically memory-mapped, so only the
+    candidates' pages are read) and keep the best k. Returns (distances, rows) like
+    index.search().
+    """
+    k = min(k, rows.shape[1])
+    out_d = np.full((len(qvecs), k), np.inf, dtype=np.float32)
+    out_i = np.full((len(qvecs), k), -1, dtype=np.int64)
+    for q, (qvec, cand) in enumerate(zip(qvecs, rows)):
+        cand = cand[cand >= 0]
+        if cand.size == 0:
+            continue
+        # Sorted, de-duplicated reads are kinder to a memory map than random order
+        uniq, inverse = np.unique(cand, return_inverse=True)
+        diff = np.asarray(vectors[uniq], dtype=np.float32)[inverse] - qvec
+        dist = np.einsum("ij,ij->i", diff, diff)
+        order = np.argsort(dist, kind="stable")[:k]
+        out_d[q, :len(order)] = dist[order]
+        out_i[q, :len(order)] = cand[order]
+    return out_d, out_i
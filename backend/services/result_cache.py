@@ -0,0 +1,174 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import List, Optional
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from backend.services.text_embed import normalize_query
+
+# Ranked results per (embedding model, index version, normalized query, filters, depth)
+SEARCH_RESULT_CACHE_SIZE = int(os.environ.get("SEARCH_RESULT_CACHE_SIZE", "1024"))
+SEARCH_RESULT_CACHE_TTL = float(os.environ.get("SEARCH_RESULT_CACHE_TTL", "300"))
+# Optional shared tier so several API workers reuse each other's results (e.g. redis://localhost:6379/0)
+SEARCH_RESULT_CACHE_URL = os.environ.get("SEARCH_RESULT_CACHE_URL")
+
+
+def _encode(ranked: List[tuple]) -> bytes:
+    """(distance, shard, row) candidates -> JSON header line + float32 / int32 / uint8 arrays."""
+    names = []
+    for _, shard, _ in ranked:
+        if shard.name not in names:
+            names.append(shard.name)
+    header = json.dumps({"shards": names, "n": len(ranked)}).encode()
+    distances = np.array([d for d, _, _ in ranked], dtype=np.float32)
+    rows = np.array([r for _, _, r in ranked], dtype=np.int32)
+    shard_idx = np.array([names.index(s.name) for _, s, _ in ranked], dtype=np.uint8)
+    return header + b"\n" + distances.tobytes() + rows.tobytes() + shard_idx.tobytes()
+
+
+def _decode(payload: bytes, bundle) -> Optional[List[tuple]]:
+    """Inverse of _encode against ``bundle``'s shards; None if a shard is no longer loaded."""
+    header, _, body = payload.partition(b"\n")
+    header = json.loads(header)
+    n = header["n"]
+    try:
+        shards = [bundle.shards[name] for name in header["shards"]]
+    except KeyError:
+        return None
+    distances = np.frombuffer(body, dtype=np.float32, count=n)
+    rows = np.frombuffer(body, dtype=np.int32, count=n, offset=4 * n)
+    shard_idx = np.frombuffer(body, dtype=np.uint8, count=n, offset=8 * n)
+    return [(float(d), shards[s], int(r)) for d, s, r in zip(distances, shard_idx, rows)]
+
+
+class ResultCache:
+    """
+    LRU + TTL cache of ranked search candidates, optionally backed by a shared
+    Redis tier. Keys include the bundle's model and version, so after a hot reload old
+    entries are never read again (local ones are dropped, shared ones expire). Only backends whose candidates point
+    into named shards (IndexBundle) are cached.
+    """
+
+    def __init__(self, max_items: int, ttl: float, url: Optional[str] = None):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.url = url
+        self._lru: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._shared = None
+        self._versions = {}
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_items > 0 and self.ttl > 0
+
+    def _client(self):
+        if self._shared is None and self.url:
+            try:
+                import redis
+            except ImportError:
+                print(f"[CACHE WARNING] SEARCH_RESULT_CACHE_URL is set but the redis package is not installed "
+                      f"(pip install -r requirements.txt); using the in-process cache only")
+                self._shared = False
+                return None
+            try:
+                self._shared = redis.Redis.from_url(self.url, socket_timeout=0.05)
+            except Exception as e:
+                print(f"[CACHE WARNING] Shared result cache unavailable at {self.url}: {e}")
+                self._shared = False
+        return self._shared or None
+
+    @staticmethod
+    def key(model: str, version: str, text: str, depth: int, filters: tuple) -> str:
+        raw = json.dumps([model, version, normalize_query(text), depth, filters], default=list)
+        return "navis:search:" + hashlib.sha1(raw.encode()).hexdigest()
+
+    def get(self, bundle, text: str, depth: int, filters: tuple) -> Optional[List[tuple]]:
+        if not self.enabled or not hasattr(bundle, "shards"):
+            return None
+        key = self.key(bundle.model, bundle.version, text, depth, filters)
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(bundle.model, bundle.version)
+            entry = self._lru.get(key)
+            if entry is not None and entry[0] > now:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._lru[key]
+
+        client = self._client()
+        if client is not None:
+            try:
+                payload = client.get(key)
+            except Exception as e:
+                print(f"[CACHE WARNING] Shared result cache read failed: {e}")
+                payload = None
+            ranked = _decode(payload, bundle) if payload else None
+            if ranked is not None:
+                with self._lock:
+                    self._remember(key, bundle.model, ranked, now)
+                    self.hits += 1
+                    self.shared_hits += 1
+                return ranked
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, bundle, text: str, depth: int, filters: tuple, ranked: List[tuple]):
+        if not self.enabled or not hasattr(bundle, "shards"):
+            return
+        key = self.key(bundle.model, bundle.version, text, depth, filters)
+        with self._lock:
+            self._check_version(bundle.model, bundle.version)
+            self._remember(key, bundle.model, ranked, time.monotonic())
+        client = self._client()
+        if client is not None:
+            try:
+                client.setex(key, int(max(self.ttl, 1)), _encode(ranked))
+            except Exception as e:
+                print(f"[CACHE WARNING] Shared result cache write failed: {e}")
+
+    def _check_version(self, model: str, version: str):
+        """Drop local entries of a model's previous bundle so they do not keep its shards in memory."""
+        if self._versions.get(model, version) != version:
+            for key in [key for key, entry in self._lru.items() if entry[2] == model]:
+                del self._lru[key]
+        self._versions[model] = version
+
+    def _remember(self, key: str, model: str, ranked: List[tuple], now: float):
+        self._lru[key] = (now + self.ttl, ranked, model)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_items:
+            self._lru.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._lru),
+                "max_entries": self.max_items,
+                "ttl_seconds": self.ttl,
+                "shared": bool(self.url),
+            }
+
+
+_cache = ResultCache(SEARCH_RESULT_CACHE_SIZE, SEARCH_RESULT_CACHE_TTL, SEARCH_RESULT_CACHE_URL)
+
+
+def get_result_cache() -> ResultCache:
+    return _cache
@@ -0,0 +1,505 @@
+from __future__ import annotations
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+import heapq
+import os
+import threading
+import time
+import traceback
+
+import numpy as np
+# DON'T import faiss here - import it inside the function
+
+from backend.db.postgres import get_conn
+from backend.services.frame_filters import FrameFilters, load_frame_filters, selector_params
+from backend.services.frame_store import FrameStore, build_frame_store, store_path_for
+from backend.services.clusters import ClusterTable, clusters_path_for
+from backend.services.knn_graph import KnnGraph, knn_graph_path_for
+from backend.services.rerank import rerank_exact, vectors_path_for
+from backend.services.embedding_models import LEGACY_MODEL, get_embedding_model
+from backend.services.index_meta import (
+    load_index_meta, mapping_path_for, read_manifest, search_parameters, split_index_key,
+)
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+FAISS_INDEX_DIR = Path(os.environ.get("FAISS_INDEX_DIR", str(BACKEND_ROOT / "faiss_indexes")))
+FAISS_INDEX_NAME = "combined"
+
+# "combined": serve the single combined index. "sharded": serve one index per dataset from the
+# manifest, searching only the matching shard for dataset= queries and fanning out otherwise.
+FAISS_INDEX_MODE = os.environ.get("FAISS_INDEX_MODE", "combined")
+FAISS_SHARD_WORKERS = int(os.environ.get("FAISS_SHARD_WORKERS", str(min(8, os.cpu_count() or 1))))
+
+# Overrides the rerank factor recorded at build time for quantized indexes (0 = no float32 re-ranking)
+FAISS_RERANK_FACTOR = os.environ.get("FAISS_RERANK_FACTOR")
+
+# Rows per range-search pass: bounds the memory of one pass however many frames match
+FAISS_RANGE_WINDOW = int(os.environ.get("FAISS_RANGE_WINDOW", "262144"))
+
+# Poll manifest.json every N seconds and hot-reload when it changes (0 = only via the admin endpoint)
+FAISS_WATCH_INTERVAL = float(os.environ.get("FAISS_WATCH_INTERVAL", "0"))
+
+
+class Shard:
+    """
+    One loaded index file: the FAISS index, its frame-id mapping, build metadata,
+    the frame store and filter bitsets. Shards are immutable once loaded.
+    """
+
+    def __init__(self, name: str, index_path: Path, index, mapping: np.ndarray,
+                 meta: dict, store: FrameStore, filters: FrameFilters, knn: Optional[KnnGraph] = None,
+                 vectors: Optional[np.ndarray] = None, rerank_factor: int = 0,
+                 clusters: Optional[ClusterTable] = None):
+        self.name = name
+        self.index_path = index_path
+        self.index = index
+        self.mapping = mapping
+        self.meta = meta
+        self.store = store
+        self.filters = filters
+        self.knn = knn
+        self.vectors = vectors
+        self.rerank_factor = rerank_factor if vectors is not None else 0
+        self.clusters = clusters
+        self.loaded_at = time.time()
+        self._direct_map_lock = threading.Lock()
+
+    @property
+    def search_params(self) -> dict:
+        return self.meta.get("search_params", {})
+
+    def warm(self):
+        """Run one throwaway query so first real requests don't pay for page faults."""
+        if self.index.ntotal == 0:
+            return
+        probe = np.zeros((1, self.index.d), dtype=np.float32)
+        self.index.search(probe, 1, params=search_parameters(self.search_params))
+
+    def search(self, qvecs: np.ndarray, mask: np.ndarray, k: int):
+        """
+        Filtered multi-row search. Fetches k per selected dataset so the dataset
+        round-robin can still fill k. Quantized indexes with float32 vectors on disk
+        fetch rerank_factor times as many candidates and re-score them exactly.
+        Returns (distances, rows) or None if nothing matches.
+        """
+        selected = int(mask.sum())
+        if selected == 0 or len(qvecs) == 0:
+            return None
+        search_k = min(k * self.filters.dataset_count(mask), selected)
+        params = selector_params(mask, self.search_params)
+        if self.rerank_factor > 1:
+            _, candidates = self.index.search(qvecs, min(search_k * self.rerank_factor, selected), params=params)
+            return rerank_exact(self.vectors, qvecs, candidates, search_k)
+        return self.index.search(qvecs, search_k, params=params)
+
+    def reconstruct(self, row: int) -> np.ndarray:
+        """Stored vector of a FAISS position (IVF indexes get a direct map on first use)."""
+        if self.vectors is not None:
+            return np.asarray(self.vectors[row], dtype=np.float32)
+        try:
+            return self.index.reconstruct(row)
+        except RuntimeError:
+            import faiss
+            with self._direct_map_lock:
+                faiss.extract_index_ivf(self.index).make_direct_map()
+            return self.index.reconstruct(row)
+
+    def similar(self, row: int, k: int) -> tuple:
+        """
+        The k frames nearest to the frame at ``row`` (itself and non-searchable frames
+        excluded) as (source, distances, rows). Served from the kNN graph when it holds
+        enough neighbors, otherwise by searching with the frame's reconstructed vector.
+        """
+        if self.knn is not None and row < len(self.knn):
+            distances, rows = self.knn.lookup(row)
+            keep = self.filters.base[rows]
+            if keep.sum() >= k or keep.size < self.knn.k:
+                return "graph", distances[keep][:k], rows[keep][:k]
+
+        mask = self.filters.base.copy()
+        mask[row] = False
+        selected = int(mask.sum())
+        if selected == 0:
+            return "search", np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        qvec = self.reconstruct(row).reshape(1, -1).astype(np.float32)
+        params = selector_params(mask, self.search_params)
+        if self.rerank_factor > 1:
+            _, candidates = self.index.search(qvec, min(k * self.rerank_factor, selected), params=params)
+            distances, rows = rerank_exact(self.vectors, qvec, candidates, k)
+        else:
+            distances, rows = self.index.search(qvec, min(k, selected), params=params)
+        valid = rows[0] >= 0
+        return "search", distances[0][valid], rows[0][valid]
+
+    def float_vectors(self) -> Optional[np.ndarray]:
+        """(ntotal, d) float32 vectors without a copy: the rerank file or a (HNSW over) flat index's storage."""
+        if self.vectors is not None:
+            return self.vectors
+        import faiss
+        index = faiss.downcast_index(self.index)
+        if isinstance(index, faiss.IndexHNSW):
+            index = faiss.downcast_index(index.storage)
+        if isinstance(index, faiss.IndexFlat):
+            return faiss.rev_swig_ptr(index.get_xb(), index.ntotal * index.d).reshape(index.ntotal, index.d)
+        return None
+
+    def range_search(self, qvec: np.ndarray, radius: float, mask: np.ndarray,
+                     window: int = 262144) -> Iterator[tuple]:
+        """
+        Every selected row within squared L2 ``radius`` of ``qvec``, yielded as
+        (distances, rows) chunks in row order, one chunk per ``window`` rows so memory
+        stays bounded however many frames match. Exact against float32 vectors when
+        they are at hand; otherwise FAISS range_search restricted to the window (as
+        approximate as the index: IVF only scans nprobe lists), or k-NN searches with
+        growing k for index types that lack range search.
+        """
+        qvec = np.asarray(qvec, dtype=np.float32).reshape(1, -1)
+        vectors = self.float_vectors()
+        n = len(mask)
+        for start in range(0, n, window):
+            end = min(start + window, n)
+            if vectors is not None:
+                found = _exact_range(vectors, qvec[0], radius, start + np.flatnonzero(mask[start:end]))
+            else:
+                sub = np.zeros(n, dtype=bool)
+                sub[start:end] = mask[start:end]
+                found = self._ann_range(qvec, radius, sub)
+            if found is not None and len(found[1]):
+                order = np.argsort(found[1], kind="stable")
+                yield found[0][order], found[1][order]
+
+    def _ann_range(self, qvec: np.ndarray, radius: float, mask: np.ndarray) -> Optional[tuple]:
+        selected = int(mask.sum())
+        if selected == 0:
+            return None
+        params = selector_params(mask, self.search_params)
+        try:
+            lims, distances, rows = self.index.range_search(qvec, radius, params=params)
+            return distances[lims[0]:lims[1]], rows[lims[0]:lims[1]]
+        except RuntimeError:
+            pass
+        # Iterative deepening: grow k until the k-th neighbor falls outside the radius
+        k = min(1024, selected)
+        while True:
+            distances, rows = self.index.search(qvec, k, params=params)
+            inside = (rows[0] >= 0) & (distances[0] <= radius)
+            if not inside.all() or k >= selected:
+                return distances[0][inside], rows[0][inside]
+            k = min(k * 4, selected)
+
+    def duplicates(self, row: int) -> int:
+        """Number of near-duplicate frames collapsed into the frame at ``row``."""
+        return self.clusters.size(row) - 1 if self.clusters is not None else 0
+
+    def describe(self) -> dict:
+        return {
+            "index_path": str(self.index_path),
+            "ntotal": int(self.index.ntotal),
+            "factory": self.meta.get("factory", "Flat"),
+            "storage": self.meta.get("storage"),
+            "index_bytes": self.meta.get("index_bytes"),
+            "rerank_factor": self.rerank_factor,
+            "search_params": self.search_params,
+            "recall": self.meta.get("recall"),
+            "knn_k": self.knn.k if self.knn is not None else None,
+            "dedup": self.meta.get("dedup"),
+            "loaded_at": self.loaded_at,
+        }
+
+
+class IndexBundle:
+    """
+    The set of shards one manifest version serves for one embedding model: either
+    the single combined index or one shard per dataset. A reload builds a new bundle
+    and swaps it in, so a request that grabbed the old bundle finishes on it.
+    """
+
+    def __init__(self, version: str, shards: Dict[str, Shard], model: str = LEGACY_MODEL):
+        self.version = version
+        self.shards = shards
+        self.model = model
+        self.loaded_at = time.time()
+
+    @property
+    def ntotal(self) -> int:
+        return sum(int(shard.index.ntotal) for shard in self.shards.values())
+
+    def shards_for(self, dataset: Optional[str] = None) -> List[Shard]:
+        """Only the dataset's own shard when it has one, otherwise every shard."""
+        if dataset and dataset in self.shards:
+            return [self.shards[dataset]]
+        return list(self.shards.values())
+
+    def search(self, qvecs: np.ndarray, k: int, **filters) -> List[List[tuple]]:
+        """
+        Filtered search across the relevant shards (in parallel when there are
+        several). ``filters`` are FrameFilters.mask() arguments. Returns, per query
+        row, candidates as (distance, shard, row) merged into ascending distance order.
+        """
+        shards = self.shards_for(filters.get("dataset"))
+
+        def run(shard: Shard):
+            mask = shard.filters.mask(**filters)
+            return shard, shard.search(qvecs, mask, k)
+
+        if len(shards) == 1:
+            results = [run(shards[0])]
+        else:
+            results = list(_shard_pool.map(run, shards))
+
+        merged = []
+        for q in range(len(qvecs)):
+            per_shard = []
+            for shard, found in results:
+                if found is None:
+                    continue
+                distances, rows = found
+                valid = rows[q] >= 0
+                per_shard.append([(float(d), shard, int(r)) for d, r in zip(distances[q][valid], rows[q][valid])])
+            merged.append(list(heapq.merge(*per_shard, key=lambda c: c[0])))
+        return merged
+
+    def range_search(self, qvec: np.ndarray, radius: float, **filters) -> Iterator[tuple]:
+        """
+        Shard by shard, (shard, distances, rows) chunks of every frame matching
+        ``filters`` within squared L2 ``radius`` of ``qvec`` (see Shard.range_search).
+        """
+        for shard in self.shards_for(filters.get("dataset")):
+            mask = shard.filters.mask(**filters)
+            for distances, rows in shard.range_search(qvec, radius, mask, window=FAISS_RANGE_WINDOW):
+                yield shard, distances, rows
+
+    def locate(self, frame_id: int) -> Optional[tuple]:
+        """
+        (shard, row) holding ``frame_id``, or None if it is not indexed. A frame that was
+        collapsed into a near-duplicate cluster resolves to its representative's row.
+        """
+        for shard in self.shards.values():
+            row = int(shard.store.rows_for_frame_ids(np.array([frame_id]))[0])
+            if row < 0 and shard.clusters is not None:
+                row = int(shard.clusters.rows_for_frame_ids(np.array([frame_id]))[0])
+            if row >= 0:
+                return shard, row
+        return None
+
+    def describe(self) -> dict:
+        return {
+            "version": self.version,
+            "model": self.model,
+            "mode": FAISS_INDEX_MODE,
+            "ntotal": self.ntotal,
+            "shards": {name: shard.describe() for name, shard in self.shards.items()},
+            "loaded_at": self.loaded_at,
+        }
+
+
+def _exact_range(vectors: np.ndarray, qvec: np.ndarray, radius: float, rows: np.ndarray,
+                 chunk: int = 8192) -> tuple:
+    """(distances, rows) of ``rows`` within squared L2 ``radius``, read ``chunk`` vectors at a time."""
+    out_d, out_i = [], []
+    for start in range(0, len(rows), chunk):
+        part = rows[start:start + chunk]
+        diff = np.asarray(vectors[part], dtype=np.float32) - qvec
+        dist = np.einsum("ij,ij->i", diff, diff)
+        inside = dist <= radius
+        out_d.append(dist[inside])
+        out_i.append(part[inside])
+    if not out_d:
+        return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+    return np.concatenate(out_d), np.concatenate(out_i)
+
+
+def _load_frame_store(index_path: Path, frame_id_mapping: np.ndarray) -> FrameStore:
+    """Memory-map the column store built next to the index, or rebuild it from Postgres."""
+    store_path = store_path_for(index_path)
+    if store_path.exists():
+        store = FrameStore.load(store_path)
+        if np.array_equal(store.frame_ids, frame_id_mapping):
+            return store
+        print(f"⚠️ Frame store at {store_path} does not match the mapping, rebuilding")
+    else:
+        print(f"⚠️ No frame store at {store_path}, building from Postgres")
+    with get_conn() as conn:
+        return build_frame_store(conn, frame_id_mapping)
+
+
+def _load_rerank_vectors(index_path: Path, meta: dict, ntotal: int) -> tuple:
+    """(memory-mapped float32 vectors, rerank factor) for quantized indexes built with --rerank-factor."""
+    rerank = meta.get("rerank") or {}
+    factor = int(FAISS_RERANK_FACTOR) if FAISS_RERANK_FACTOR is not None else int(rerank.get("factor", 0))
+    path = vectors_path_for(index_path)
+    if factor <= 1 or not path.exists():
+        return None, 0
+    vectors = np.load(path, mmap_mode="r")
+    if len(vectors) != ntotal:
+        print(f"⚠️ Rerank vectors at {path} do not match the index, searching without re-ranking")
+        return None, 0
+    return vectors, factor
+
+
+def _model_entries(manifest: Optional[dict], model: str) -> Dict[str, str]:
+    """{shard name: relative index path} of ``model``'s manifest entries for the serving mode."""
+    shards, legacy = {}, {}
+    for key, path in (manifest or {}).get("indexes", {}).items():
+        entry_model, name = split_index_key(key, LEGACY_MODEL)
+        if entry_model != model or (name == FAISS_INDEX_NAME) == (FAISS_INDEX_MODE == "sharded"):
+            continue
+        # Model-prefixed entries win over unprefixed ones from before per-model indexes
+        (shards if "/" in key else legacy)[name] = path
+    return {**legacy, **shards}
+
+
+def _resolve_current(model: str) -> tuple:
+    """(version, {shard name: index path}) the manifest points at for ``model``, or the legacy flat layout."""
+    manifest = read_manifest(FAISS_INDEX_DIR)
+    shards = _model_entries(manifest, model)
+    if shards:
+        return manifest["version"], {name: FAISS_INDEX_DIR / path for name, path in shards.items()}
+    if model != LEGACY_MODEL:
+        raise RuntimeError(f"No {FAISS_INDEX_MODE} FAISS index built for model {model}; "
+                           f"run build_faiss_index.py --model {model}")
+    return "legacy", {FAISS_INDEX_NAME: FAISS_INDEX_DIR / f"{FAISS_INDEX_NAME}.index"}
+
+
+def indexed_models() -> List[str]:
+    """Models the manifest (or the legacy flat layout) has an index for in the serving mode."""
+    manifest = read_manifest(FAISS_INDEX_DIR)
+    models = {split_index_key(key, LEGACY_MODEL)[0] for key in (manifest or {}).get("indexes", {})}
+    found = [model for model in sorted(models) if _model_entries(manifest, model)]
+    if LEGACY_MODEL not in found and (FAISS_INDEX_DIR / f"{FAISS_INDEX_NAME}.index").exists():
+        found.append(LEGACY_MODEL)
+    return found
+
+
+def load_faiss_index(name: str, index_path: Path) -> Shard:
+    """Load FAISS index, frame ID mapping, index metadata, metadata store, filter bitsets, kNN graph and clusters"""
+    if not index_path.exists():
+        raise RuntimeError(f"FAISS index not found at {index_path}")
+
+    import faiss  # Import here instead of top of file
+    index = faiss.read_index(str(index_path))
+    mapping = np.load(str(mapping_path_for(index_path)))
+    meta = load_index_meta(index_path)
+    store = _load_frame_store(index_path, mapping)
+    filters = load_frame_filters(store, index_path)
+    knn_path = knn_graph_path_for(index_path)
+    knn = KnnGraph.load(knn_path) if knn_path.exists() else None
+    if knn is not None and len(knn) != index.ntotal:
+        print(f"⚠️ kNN graph at {knn_path} does not match the index, ignoring it")
+        knn = None
+    vectors, rerank_factor = _load_rerank_vectors(index_path, meta, index.ntotal)
+    clusters_path = clusters_path_for(index_path)
+    clusters = ClusterTable.load(clusters_path) if clusters_path.exists() else None
+    if clusters is not None and len(clusters) != index.ntotal:
+        print(f"⚠️ Cluster table at {clusters_path} does not match the index, ignoring it")
+        clusters = None
+    shard = Shard(name, index_path, index, mapping, meta, store, filters, knn, vectors, rerank_factor, clusters)
+    shard.warm()
+    print(f"✅ Loaded FAISS index {name} ({'/'.join(index_path.parts[-3:-1])}) with {index.ntotal} vectors "
+          f"({meta.get('factory', 'Flat')}, search params {meta.get('search_params', {})}"
+          f"{f', rerank x{rerank_factor}' if vectors is not None else ''})")
+    return shard
+
+
+def load_bundle(version: str, paths: Dict[str, Path], previous: Optional[IndexBundle] = None,
+                model: str = LEGACY_MODEL) -> IndexBundle:
+    """
+    Load every shard of a manifest version. Shards whose index file is unchanged
+    are reused from ``previous``, so rebuilding one dataset reloads only that shard.
+    """
+    shards = {}
+    for name, index_path in sorted(paths.items()):
+        old = previous.shards.get(name) if previous is not None else None
+        if old is not None and old.index_path == index_path:
+            shards[name] = old
+        else:
+            shards[name] = load_faiss_index(name, index_path)
+    return IndexBundle(version, shards, model=model)
+
+
+# Current bundle per embedding model, each loaded on first use. Readers take a reference once
+# per request; swaps are a single dict assignment.
+_bundles: Dict[str, IndexBundle] = {}
+_load_locks: Dict[str, threading.Lock] = {}
+_reload_lock = threading.Lock()
+_reload_state = {"status": "idle", "version": None, "models": [], "error": None, "started_at": None,
+                 "finished_at": None}
+_watcher: Optional[threading.Thread] = None
+_shard_pool = ThreadPoolExecutor(max_workers=FAISS_SHARD_WORKERS, thread_name_prefix="faiss-shard")
+
+
+def get_index(model: Optional[str] = None) -> IndexBundle:
+    """Current index bundle of ``model`` (default: SEARCH_DEFAULT_MODEL), loading it on first use."""
+    model = get_embedding_model(model).key
+    bundle = _bundles.get(model)
+    if bundle is not None:
+        return bundle
+    # One lock per model, so loading a large model does not hold up requests for another
+    with _load_locks.setdefault(model, threading.Lock()):
+        if model not in _bundles:
+            _bundles[model] = load_bundle(*_resolve_current(model), model=model)
+            _start_watcher()
+        return _bundles[model]
+
+
+def _reload(targets: Dict[str, tuple]):
+    try:
+        for model, (version, paths) in targets.items():
+            bundle = load_bundle(version, paths, previous=_bundles.get(model), model=model)
+            _bundles[model] = bundle  # atomic swap; in-flight requests keep the old reference
+        _reload_state.update(status="idle", error=None)
+    except Exception as e:
+        traceback.print_exc()
+        _reload_state.update(status="failed", error=str(e))
+    finally:
+        _reload_state["finished_at"] = time.time()
+        _reload_lock.release()
+
+
+def reload_index(force: bool = False) -> dict:
+    """
+    Load the version the manifest points at for every loaded model (the default
+    model if none is loaded yet) in a background thread and swap each in when
+    ready. Shards whose files did not change are reused. Returns the reload state immediately.
+    """
+    models = list(_bundles) or [get_embedding_model().key]
+    targets = {model: _resolve_current(model) for model in models}
+    version = next(iter(targets.values()))[0]
+    stale = {
+        model: target for model, target in targets.items()
+        if force or model not in _bundles or _bundles[model].version != target[0]
+    }
+    if not stale:
+        return {**_reload_state, "status": "current", "version": version}
+
+    if not _reload_lock.acquire(blocking=False):
+        return dict(_reload_state)
+    _reload_state.update(status="loading", version=version, models=list(stale), error=None,
+                         started_at=time.time(), finished_at=None)
+    threading.Thread(target=_reload, args=(stale,), name="faiss-reload", daemon=True).start()
+    return dict(_reload_state)
+
+
+def _watch():
+    while True:
+        time.sleep(FAISS_WATCH_INTERVAL)
+        try:
+            reload_index()
+        except Exception as e:
+            print(f"⚠️ Index watcher error: {e}")
+
+
+def _start_watcher():
+    global _watcher
+    if FAISS_WATCH_INTERVAL > 0 and _watcher is None:
+        _watcher = threading.Thread(target=_watch, name="faiss-watch", daemon=True)
+        _watcher.start()
+
+
+def index_status() -> dict:
+    return {
+        "loaded": {model: bundle.describe() for model, bundle in list(_bundles.items())},
+        "reload": dict(_reload_state),
+        "watch_interval": FAISS_WATCH_INTERVAL,
+    }
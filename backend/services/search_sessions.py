@@ -0,0 +1,123 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import secrets
+import threading
+import time
+
+import numpy as np
+
+
+class SearchSession:
+    """
+    The ranked candidate list of one search, stored compactly: per position the
+    distance, the FAISS row and an index into ``shards``. Holding the shard
+    objects keeps a session readable after the index is hot-reloaded.
+
+    /search only ranks the candidates its first page needs; ``source`` (the search
+    backend and filter key it ran on) lets the first /search/page fetch deeper from
+    that same backend. It is None once the session is complete.
+    """
+
+    def __init__(self, query: str, ranked: List[tuple], model: Optional[str] = None,
+                 source: Optional[tuple] = None):
+        self.query = query
+        self.model = model
+        self.source = source
+        self.lock = threading.Lock()
+        self._shard_ids = {}
+        self.shards = []
+        self._store(ranked)
+
+    def _store(self, ranked: List[tuple]):
+        for _, shard, _ in ranked:
+            if shard.name not in self._shard_ids:
+                self._shard_ids[shard.name] = len(self.shards)
+                self.shards.append(shard)
+        self.distances = np.array([d for d, _, _ in ranked], dtype=np.float32)
+        self.rows = np.array([r for _, _, r in ranked], dtype=np.int32)
+        self.shard_idx = np.array([self._shard_ids[s.name] for _, s, _ in ranked], dtype=np.uint8)
+
+    def deepen(self, ranked: List[tuple]):
+        """
+        Replace the candidates with a deeper ranking of the same search. The ranks
+        already stored stay in place (cursors handed out point into them); the
+        deeper candidates not among them follow.
+        """
+        kept = self.page(0, len(self))
+        seen = {(shard.name, row) for _, shard, row in kept}
+        self._store(kept + [c for c in ranked if (c[1].name, c[2]) not in seen])
+        self.source = None
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def page(self, offset: int, k: int) -> List[tuple]:
+        """(distance, shard, row) candidates at ranks offset .. offset+k."""
+        end = min(offset + k, len(self.rows))
+        return [
+            (float(self.distances[i]), self.shards[self.shard_idx[i]], int(self.rows[i]))
+            for i in range(offset, end)
+        ]
+
+
+class SearchSessions:
+    """
+    TTL + LRU cache of search sessions keyed by a random id. Cursors are
+    "<session id>.<offset>"; clients treat them as opaque.
+    """
+
+    def __init__(self, ttl: float, max_sessions: int):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Tuple[float, SearchSession]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, query: str, ranked: List[tuple], model: Optional[str] = None,
+               source: Optional[tuple] = None) -> str:
+        session_id = secrets.token_urlsafe(12)
+        session = SearchSession(query, ranked, model, source)
+        with self._lock:
+            self._expire()
+            self._sessions[session_id] = (time.monotonic() + self.ttl, session)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session_id
+
+    def resolve(self, cursor: str) -> Optional[Tuple[SearchSession, str, int]]:
+        """(session, session id, offset) for a cursor, or None if unknown, malformed or expired."""
+        session_id, _, offset = cursor.rpartition(".")
+        if not session_id or not offset.isdigit():
+            return None
+        with self._lock:
+            self._expire()
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            # Each page read extends the session's lifetime
+            self._sessions[session_id] = (time.monotonic() + self.ttl, entry[1])
+            self._sessions.move_to_end(session_id)
+        return entry[1], session_id, int(offset)
+
+    @staticmethod
+    def cursor(session_id: str, offset: int) -> str:
+        return f"{session_id}.{offset}"
+
+    def _expire(self):
+        # Every access moves a session to the end with a fresh deadline, so deadlines are in order
+        now = time.monotonic()
+        while self._sessions:
+            sid, (expires, _) = next(iter(self._sessions.items()))
+            if expires > now:
+                break
+            del self._sessions[sid]
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._expire()
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "ttl_seconds": self.ttl,
+                "candidates": sum(len(s) for _, s in self._sessions.values()),
+            }
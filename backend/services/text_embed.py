@@ -1,29 +1,311 @@
 from __future__ import annotations
-from sentence_transformers import SentenceTransformer
 import numpy as np
 from functools import lru_cache
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+import atexit
+import os
+import sqlite3
+import threading
 
-@lru_cache(maxsize=1)
-def _get_model():
+MODEL_NAME = 'clip-ViT-B-32'
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+
+# "torch": full SentenceTransformer model. "onnx": only the CLIP text tower, exported by
+# scripts/export_text_encoder.py and run with onnxruntime (no torch import at serve time).
+TEXT_ENCODER = os.environ.get("TEXT_ENCODER", "torch")
+# Exports live in <root>/<encoder>-text/, one per embedding model
+TEXT_ENCODER_ONNX_ROOT = Path(os.environ.get("TEXT_ENCODER_ONNX_ROOT", str(BACKEND_ROOT / "models")))
+# onnxruntime intra-op threads (0 = onnxruntime default, one per physical core)
+TEXT_ENCODER_THREADS = int(os.environ.get("TEXT_ENCODER_THREADS", "0"))
+
+# Two-tier query embedding cache: in-process LRU backed by SQLite on disk
+TEXT_CACHE_SIZE = int(os.environ.get("TEXT_EMBED_CACHE_SIZE", "4096"))
+TEXT_CACHE_PATH = Path(os.environ.get("TEXT_EMBED_CACHE_PATH", "/tmp/navis_cache/text_embeddings.sqlite3"))
+# Hits are counted in memory and added to the SQLite rows every this many cache hits
+TEXT_CACHE_HIT_FLUSH = 64
+
+
+def onnx_dir_for(model_name: str) -> Path:
+    """Export directory of ``model_name``'s text tower (clip-ViT-B-32 -> models/clip-ViT-B-32-text)."""
+    return TEXT_ENCODER_ONNX_ROOT / f"{model_name}-text"
+
+
+def normalize_query(text: str) -> str:
+    """Cache key for a query. CLIP's tokenizer lowercases, so case does not change the embedding."""
+    return " ".join(text.lower().split())
+
+
+class EmbeddingCache:
+    """
+    Bounded LRU of float32 query vectors in front of a persistent SQLite table.
+    Entries are keyed on (model, normalized query). Every hit (memory or disk)
+    counts towards the row's ``hits``; on first use the most-hit disk entries are
+    pulled into memory so restarts come up warm with the popular queries.
+    """
+
+    def __init__(self, path: Path, max_items: int):
+        self.path = path
+        self.max_items = max_items
+        self._lru: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        # (model, query) -> hits not yet written to SQLite
+        self._pending_hits: dict = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        if self._db is None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                db = sqlite3.connect(str(self.path), check_same_thread=False, timeout=5.0)
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute("""
+                    CREATE TABLE IF NOT EXISTS text_embeddings (
+                        model TEXT NOT NULL,
+                        query TEXT NOT NULL,
+                        vector BLOB NOT NULL,
+                        hits INTEGER NOT NULL DEFAULT 0,
+                        PRIMARY KEY (model, query)
+                    )
+                """)
+                db.commit()
+                self._db = db
+                self._warm()
+            except (sqlite3.Error, OSError) as e:
+                print(f"[CACHE WARNING] Text embedding disk cache unavailable at {self.path}: {e}")
+                self._db = False
+        return self._db or None
+
+    def _warm(self):
+        rows = self._db.execute(
+            "SELECT model, query, vector FROM text_embeddings ORDER BY hits DESC LIMIT ?",
+            (self.max_items,),
+        ).fetchall()
+        # Least-hit first so the most popular queries end up most recently used
+        for model, query, blob in reversed(rows):
+            self._remember((model, query), np.frombuffer(blob, dtype=np.float32))
+
+    def _remember(self, key: tuple, vec: np.ndarray):
+        self._lru[key] = vec
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_items:
+            self._lru.popitem(last=False)
+
+    def _count_hit(self, key: tuple):
+        self._pending_hits[key] = self._pending_hits.get(key, 0) + 1
+        if sum(self._pending_hits.values()) >= TEXT_CACHE_HIT_FLUSH:
+            self._flush_hits()
+
+    def _flush_hits(self):
+        """Add the hits counted since the last flush to the SQLite rows (caller holds the lock)."""
+        if not self._pending_hits or not self._db:
+            return
+        try:
+            self._db.executemany(
+                "UPDATE text_embeddings SET hits = hits + ? WHERE model = ? AND query = ?",
+                [(n, model, query) for (model, query), n in self._pending_hits.items()],
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"[CACHE WARNING] Text embedding hit counts not saved: {e}")
+        self._pending_hits.clear()
+
+    def flush(self):
+        with self._lock:
+            self._flush_hits()
+
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        key = (model, normalize_query(text))
+        with self._lock:
+            db = self._conn()
+            vec = self._lru.get(key)
+            if vec is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                self._count_hit(key)
+                return vec
+
+            if db is not None:
+                try:
+                    row = db.execute(
+                        "SELECT vector FROM text_embeddings WHERE model = ? AND query = ?", key
+                    ).fetchone()
+                    if row:
+                        vec = np.frombuffer(row[0], dtype=np.float32)
+                        self._remember(key, vec)
+                        self.hits += 1
+                        self.disk_hits += 1
+                        self._count_hit(key)
+                        return vec
+                except sqlite3.Error as e:
+                    print(f"[CACHE WARNING] Text embedding disk read failed: {e}")
+
+            self.misses += 1
+            return None
+
+    def put(self, model: str, text: str, vec: np.ndarray):
+        key = (model, normalize_query(text))
+        vec = np.ascontiguousarray(vec, dtype=np.float32)
+        with self._lock:
+            self._remember(key, vec)
+            db = self._conn()
+            if db is None:
+                return
+            try:
+                # Replacing a vector keeps the row's hit count
+                db.execute(
+                    """INSERT INTO text_embeddings (model, query, vector, hits) VALUES (?, ?, ?, 0)
+                       ON CONFLICT (model, query) DO UPDATE SET vector = excluded.vector""",
+                    (key[0], key[1], vec.tobytes()),
+                )
+                db.commit()
+            except sqlite3.Error as e:
+                print(f"[CACHE WARNING] Text embedding disk write failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._lru),
+                "max_memory_entries": self.max_items,
+                "path": str(self.path),
+            }
+
+
+_cache = EmbeddingCache(TEXT_CACHE_PATH, TEXT_CACHE_SIZE)
+atexit.register(_cache.flush)
+
+
+@lru_cache(maxsize=None)
+def _get_model(model_name: str = MODEL_NAME):
+    """
+    Load a CLIP model using sentence-transformers (lightweight).
+    Defaults to 'clip-ViT-B-32' which is compatible with OpenAI CLIP embeddings.
+    Cached so each model loads only once, on first use.
     """
-    Load CLIP model using sentence-transformers (lightweight).
-    Uses 'clip-ViT-B-32' which is compatible with OpenAI CLIP embeddings.
-    Cached to load only once.
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+
+class OnnxTextEncoder:
     """
-    return SentenceTransformer('clip-ViT-B-32')
+    CLIP text tower exported to ONNX: tokenizer from the export directory plus an
+    onnxruntime session tuned for low-latency CPU inference. ``encode`` returns the
+    unnormalized text features, like SentenceTransformer.encode.
+    """
+
+    def __init__(self, export_dir: Path, threads: int = 0):
+        import json
+        import onnxruntime as ort
+        from transformers import CLIPTokenizerFast
+
+        meta = json.loads((export_dir / "meta.json").read_text())
+        self.meta = meta
+        self.max_length = int(meta.get("max_length", 77))
+        self.tokenizer = CLIPTokenizerFast.from_pretrained(str(export_dir))
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.inter_op_num_threads = 1
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            str(export_dir / meta["file"]), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+
+    def encode(self, texts: list) -> np.ndarray:
+        tokens = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np")
+        (features,) = self.session.run(None, {
+            "input_ids": tokens["input_ids"].astype(np.int64),
+            "attention_mask": tokens["attention_mask"].astype(np.int64),
+        })
+        return features
+
+
+@lru_cache(maxsize=None)
+def _get_onnx_encoder(model_name: str = MODEL_NAME) -> OnnxTextEncoder:
+    export_dir = onnx_dir_for(model_name)
+    if not (export_dir / "meta.json").exists():
+        raise RuntimeError(
+            f"No ONNX text encoder at {export_dir}; run backend/scripts/export_text_encoder.py"
+        )
+    return OnnxTextEncoder(export_dir, threads=TEXT_ENCODER_THREADS)
+
+
+def _encode(texts: list, model_name: str = MODEL_NAME) -> np.ndarray:
+    """Raw (unnormalized) CLIP text features for ``texts`` from the configured backend."""
+    if TEXT_ENCODER == "onnx":
+        return _get_onnx_encoder(model_name).encode(texts)
+    return _get_model(model_name).encode(texts, convert_to_numpy=True)
 
-def get_text_embedding(text: str) -> list[float]:
+
+def warm_up_text_encoder(model_name: str = MODEL_NAME):
+    """Load the configured encoder and run a throwaway batch through it, bypassing the caches."""
+    _encode(["a car driving down a street", "warm up"], model_name)
+
+
+def _cache_model(model_name: str) -> str:
+    """Embedding cache namespace: quantized exports get their own entries."""
+    if TEXT_ENCODER == "onnx" and _get_onnx_encoder(model_name).meta.get("quantized"):
+        return f"{model_name}+onnx-int8"
+    return model_name
+
+def get_text_embedding(text: str, model_name: str = MODEL_NAME) -> list[float]:
     """
     Encode text with CLIP and L2-normalize so it is cosine-compatible
     with image embeddings we stored.
-    Returns a Python list[float] (length 512) for psycopg2 vector casting.
+    Repeat queries are served from the embedding cache without running the model.
+    Returns a Python list[float] (length 512 for CLIP ViT-B) for psycopg2 vector casting.
     """
-    model = _get_model()
-    
+    cache_name = _cache_model(model_name)
+    cached = _cache.get(cache_name, text)
+    if cached is not None:
+        return cached.tolist()
+
     # Encode text to embedding
-    embedding = model.encode(text, convert_to_numpy=True)
-    
+    embedding = _encode([text], model_name)[0]
+
     # L2 normalize
     embedding = embedding / np.linalg.norm(embedding)
-    
+
+    _cache.put(cache_name, text, embedding)
     return embedding.tolist()
+
+def get_text_embeddings(texts: list[str], model_name: str = MODEL_NAME) -> np.ndarray:
+    """
+    Batched get_text_embedding: cached queries are looked up, the rest are
+    encoded in a single model.encode call. Returns float32 (len(texts), dims).
+    """
+    cache_name = _cache_model(model_name)
+    vectors: list = [_cache.get(cache_name, t) for t in texts]
+    missing = {}
+    for i, (t, vec) in enumerate(zip(texts, vectors)):
+        if vec is None:
+            missing.setdefault(normalize_query(t), []).append(i)
+
+    if missing:
+        to_encode = [texts[idxs[0]] for idxs in missing.values()]
+        embeddings = _encode(to_encode, model_name)
+        embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        for text, idxs, embedding in zip(to_encode, missing.values(), embeddings):
+            _cache.put(cache_name, text, embedding)
+            for i in idxs:
+                vectors[i] = embedding
+
+    if not vectors:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.stack(vectors).astype(np.float32)
+
+def text_cache_stats() -> dict:
+    """Hit/miss counters and size of the query embedding cache, and the encoder backend in use."""
+    return {**_cache.stats(), "encoder": TEXT_ENCODER}
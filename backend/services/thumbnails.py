@@ -0,0 +1,95 @@
+"""
+Resized variants of media files (search-grid thumbnails, previews), rendered once
+and kept in their own size-bounded disk cache keyed by (media_key, width, format).
+
+Widths snap up to one of THUMB_WIDTHS so the number of variants per frame stays
+small. Rendering decodes at reduced size where the format allows it (JPEG
+``draft`` scales in the DCT domain while decoding), box-reduces by the remaining
+integer factor and finishes with one LANCZOS resize, so a 1242px KITTI PNG
+becomes a 256px WebP without a full-quality resample of the whole frame.
+
+Imported by routes/media.py and scripts/generate_thumbnails.py.
+"""
+from __future__ import annotations
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, List
+import os
+
+from PIL import Image
+
+# Relative so the same module serves `services.thumbnails` (scripts) and `backend.services.thumbnails` (API)
+from .media_cache import MediaCache
+
+THUMB_WIDTHS = sorted(int(w) for w in os.environ.get("THUMB_WIDTHS", "128,256,512,1024").split(","))
+THUMB_QUALITY = int(os.environ.get("THUMB_QUALITY", "80"))
+THUMB_CACHE_DIR = Path(os.environ.get("THUMB_CACHE_DIR", "/tmp/navis_cache/variants"))
+THUMB_CACHE_MAX_MB = float(os.environ.get("THUMB_CACHE_MAX_MB", "2048"))
+
+# format -> (Pillow encoder, content type, encoder options)
+FORMATS = {
+    "webp": ("WEBP", "image/webp", {"method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", {"optimize": True}),
+}
+
+variant_cache = MediaCache(THUMB_CACHE_DIR, int(THUMB_CACHE_MAX_MB * 1024 * 1024))
+
+
+def snap_width(width: int) -> int:
+    """Smallest configured width at or above ``width`` (the largest one if none is)."""
+    for allowed in THUMB_WIDTHS:
+        if allowed >= width:
+            return allowed
+    return THUMB_WIDTHS[-1]
+
+
+def variant_key(media_key: str, width: int, fmt: str) -> str:
+    return f"{media_key}|w={width}|{fmt}|q={THUMB_QUALITY}"
+
+
+def render_variants(data: bytes, widths: List[int], fmt: str, quality: int = THUMB_QUALITY) -> Dict[int, bytes]:
+    """
+    Encode image bytes ``data`` at each of ``widths`` (never upscaled) as ``fmt``,
+    decoding once: at reduced scale for the largest width, then deriving the rest.
+    """
+    encoder, _, options = FORMATS[fmt]
+    img = Image.open(BytesIO(data))
+    aspect = img.height / img.width
+    largest = min(max(widths), img.width)
+    # JPEG sources decode straight at 1/2, 1/4 or 1/8 scale; no-op for other formats
+    img.draft("RGB", (largest, max(1, round(largest * aspect))))
+    img = img.convert("RGB")
+
+    rendered = {}
+    for width in sorted(widths, reverse=True):
+        width = min(width, img.width)
+        height = max(1, round(width * aspect))
+        resized = img
+        factor = min(resized.width // width, resized.height // height)
+        if factor >= 2:
+            resized = resized.reduce(factor)
+        if resized.size != (width, height):
+            resized = resized.resize((width, height), Image.LANCZOS)
+        out = BytesIO()
+        resized.save(out, encoder, quality=quality, **options)
+        rendered[width] = out.getvalue()
+    return {w: rendered[min(w, img.width)] for w in widths}
+
+
+def cache_variant(media_key: str, width: int, fmt: str, data: bytes) -> None:
+    try:
+        variant_cache.put(variant_key(media_key, width, fmt), data)
+    except Exception as e:
+        print(f"[CACHE WARNING] Failed to cache {width}px {fmt} variant of {media_key}: {e}")
+
+
+def missing_widths(media_key: str, widths: List[int], fmt: str) -> List[int]:
+    """Widths of ``media_key`` that have no cached variant yet."""
+    return [w for w in widths if not variant_cache.contains(variant_key(media_key, w, fmt))]
+
+
+def store_variants(media_key: str, data: bytes, widths: List[int], fmt: str) -> int:
+    """Render several widths from one download into the variant cache; returns the number written."""
+    for width, variant in render_variants(data, widths, fmt).items():
+        cache_variant(media_key, width, fmt, variant)
+    return len(widths)
@@ -19,7 +19,8 @@ if str(BACKEND_ROOT) not in sys.path:
     sys.path.append(str(BACKEND_ROOT))
 
 from db.postgres import get_conn
-from services.drive import resolve_path, download_bytes
+from services.drive import drive_file_sql, ensure_drive_files, resolve_path, download_bytes
+from services.embedding_models import EMBEDDING_MODELS, get_embedding_model, get_or_create_model_id
 
 # -------------------------- CLI args -----------------------------------------
 parser = argparse.ArgumentParser(description="Embed frames and store vectors in Postgres.")
@@ -28,17 +29,18 @@ parser.add_argument("--once", action="store_true", help="Process one batch and e
 parser.add_argument("--dataset", type=str, default=None, help="Filter by dataset slug (e.g., kitti, nuscenes)")
 parser.add_argument("--scene", type=str, default=None, help="Filter by scene_token")
 parser.add_argument("--sensor", type=str, default=None, help="Filter by sensor (e.g., image_00, CAM_FRONT)")
+parser.add_argument("--model", choices=list(EMBEDDING_MODELS), default=None,
+                    help="Embedding model (default: SEARCH_DEFAULT_MODEL); run one worker per model")
 
 ARGS = parser.parse_args()
 
 # -------------------------- Model --------------------------------------------
+MODEL = get_embedding_model(ARGS.model)
+
 @lru_cache(maxsize=1)
 def _get_model():
-    """Load CLIP model using sentence-transformers (cached)."""
-    return SentenceTransformer('clip-ViT-B-32')
-
-MODEL_NAME = "openai/clip-vit-b-32"
-MODEL_DIMS = 512
+    """Load the CLIP model using sentence-transformers (cached)."""
+    return SentenceTransformer(MODEL.encoder)
 
 # -------------------------- Helpers ------------------------------------------
 def get_col(row, key_or_idx):
@@ -47,41 +49,33 @@ def get_col(row, key_or_idx):
         return row[key_or_idx]
     return row[key_or_idx]  # index for tuple rows
 
-def get_or_create_model_id(cur) -> int:
-    cur.execute("SELECT id FROM navis.models WHERE name=%s", (MODEL_NAME,))
-    r = cur.fetchone()
-    if r:
-        return get_col(r, "id") if isinstance(r, dict) else r[0]
-    cur.execute(
-        "INSERT INTO navis.models(name, dims) VALUES (%s,%s) RETURNING id",
-        (MODEL_NAME, MODEL_DIMS),
-    )
-    r = cur.fetchone()
-    return get_col(r, "id") if isinstance(r, dict) else r[0]
-
 def load_image_for_frame(conn, frame_id: int, media_key: str) -> Image.Image:
     """Use dataset media_base_uri to decide how to fetch (gdrive vs local)."""
+    parts = drive_file_sql(conn)
     with conn.cursor() as cur:
         cur.execute(
             """
-            SELECT d.media_base_uri AS media_base_uri
+            SELECT d.media_base_uri AS media_base_uri, {file_id} AS file_id
             FROM navis.frames f
             JOIN navis.sequences s ON s.id = f.sequence_id
             JOIN navis.datasets  d ON d.id = s.dataset_id
+            {drive_files_join}
             WHERE f.id = %s
             LIMIT 1
-            """,
+            """.format(**parts),
             (frame_id,),
         )
         row = cur.fetchone()
         if not row:
             raise RuntimeError(f"No dataset root for frame_id={frame_id}")
         media_base_uri = row["media_base_uri"] if isinstance(row, dict) else row[0]
+        stored_file_id = row["file_id"] if isinstance(row, dict) else row[1]
 
     parsed = urlparse(media_base_uri or "")
     if parsed.scheme == "gdrive":
         root_id = parsed.netloc  # folder id after gdrive://
-        file_id = resolve_path(root_id, media_key)
+        # File id recorded at ingest; walk the path only for keys without one
+        file_id = stored_file_id or resolve_path(root_id, media_key)
         if not file_id:
             raise FileNotFoundError(f"GDrive path not found: {media_key}")
         data = download_bytes(file_id)
@@ -110,7 +104,8 @@ def embed_image(img: Image.Image) -> np.ndarray:
 def main():
     while True:
         with get_conn() as conn, conn.cursor() as cur:
-            model_id = get_or_create_model_id(cur)
+            ensure_drive_files(conn)
+            model_id = get_or_create_model_id(cur, MODEL)
             conn.commit()
 
             # Build dynamic WHERE with optional filters
@@ -144,13 +139,14 @@ def main():
             """
             params.append(ARGS.limit)
 
+            cur.execute(sql, params)
             batch = cur.fetchall()
             # psycopg might return dict or tuple rows
             if batch and isinstance(batch[0], dict):
                 batch = [(r["id"], r["media_key"]) for r in batch]
 
         if not batch:
-            print("✅ No pending frames for this model/filter. Sleeping 10s…")
+            print(f"✅ No pending frames for {MODEL.key}/filter. Sleeping 10s…")
             if ARGS.once:
                 return
             time.sleep(10)
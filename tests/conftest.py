@@ -0,0 +1,46 @@
+"""
+Shared fixtures. Tests import the API modules as ``backend.*`` (like uvicorn does) and
+never talk to Postgres or Drive: indexes, stores and caches are built in memory or
+under pytest's tmp_path.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+# services/drive.py checks for a service account key at import; the tests never call Drive
+if not (os.environ.get("GOOGLE_APPLICATION_CREDENTIALS") or os.environ.get("GOOGLE_APPLICATION_CREDENTIALS_JSON")):
+    _key = Path(tempfile.mkdtemp(prefix="navis-tests-")) / "drive-key.json"
+    _key.write_text("{}")
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = str(_key)
+
+
+def frame_rows(frames):
+    """
+    Rows for frame_store_from_rows from (frame_id, dataset slug, sequence, sensor, media_key)
+    tuples, with the column names build_frame_store selects.
+    """
+    return {
+        fid: {
+            "frame_id": fid, "media_key": media_key, "sample_token": None,
+            "slug": slug, "name": slug.upper(), "media_base_uri": f"gdrive://{slug}-root",
+            "scene_token": sequence, "sensor": sensor,
+        }
+        for fid, slug, sequence, sensor, media_key in frames
+    }
+
+
+@pytest.fixture
+def make_store():
+    """FrameStore for a list of (frame_id, dataset, sequence, sensor, media_key) tuples, in that row order."""
+    from backend.services.frame_store import frame_store_from_rows
+
+    def make(frames):
+        return frame_store_from_rows(np.array([f[0] for f in frames]), frame_rows(frames))
+    return make
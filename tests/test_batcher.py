@@ -0,0 +1,82 @@
+import asyncio
+import threading
+
+import pytest
+
+from backend.services.batcher import MicroBatcher
+
+
+def submit_all(batcher, items):
+    async def run():
+        return await asyncio.gather(*(batcher.submit(item) for item in items), return_exceptions=True)
+    return asyncio.run(run())
+
+
+def test_concurrent_items_share_one_batch():
+    calls = []
+
+    def fn(items):
+        calls.append(list(items))
+        return [item * 10 for item in items]
+
+    batcher = MicroBatcher(fn, window_ms=50, max_batch=32)
+    assert submit_all(batcher, [1, 2, 3]) == [10, 20, 30]
+    assert calls == [[1, 2, 3]]
+    assert batcher.stats()["batches"] == 1 and batcher.stats()["largest_batch"] == 3
+
+
+def test_max_batch_flushes_early():
+    calls = []
+    lock = threading.Lock()
+
+    def fn(items):
+        with lock:
+            calls.append(list(items))
+        return items
+
+    batcher = MicroBatcher(fn, window_ms=1000, max_batch=2)
+    assert submit_all(batcher, [1, 2, 3, 4]) == [1, 2, 3, 4]
+    assert sorted(calls) == [[1, 2], [3, 4]]
+
+
+def test_exception_reaches_every_caller():
+    def fn(items):
+        raise ValueError("encoder down")
+
+    results = submit_all(MicroBatcher(fn, window_ms=20, max_batch=8), ["a", "b"])
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_short_result_cancels_the_rest():
+    results = submit_all(MicroBatcher(lambda items: items[:1], window_ms=20, max_batch=8), ["a", "b", "c"])
+    assert results[0] == "a"
+    assert all(isinstance(r, asyncio.CancelledError) for r in results[1:])
+
+
+def test_running_batches_are_referenced_until_done():
+    release = threading.Event()
+
+    def fn(items):
+        release.wait(5)
+        return items
+
+    batcher = MicroBatcher(fn, window_ms=0, max_batch=8)
+
+    async def run():
+        pending = asyncio.ensure_future(batcher.submit("a"))
+        await asyncio.sleep(0.05)
+        assert len(batcher._tasks) == 1
+        release.set()
+        assert await pending == "a"
+        await asyncio.sleep(0.01)
+        assert not batcher._tasks
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("window_ms", [0, 5])
+def test_stats_count_items(window_ms):
+    batcher = MicroBatcher(lambda items: items, window_ms=window_ms, max_batch=4, name="search")
+    submit_all(batcher, list(range(6)))
+    stats = batcher.stats()
+    assert stats["name"] == "search" and stats["items"] == 6 and stats["pending"] == 0
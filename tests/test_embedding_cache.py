@@ -0,0 +1,58 @@
+import sqlite3
+
+import numpy as np
+
+from backend.services.text_embed import EmbeddingCache, normalize_query
+
+
+def vec(x):
+    return np.full(4, x, dtype=np.float32)
+
+
+def test_normalize_query():
+    assert normalize_query("  Cars   at NIGHT ") == "cars at night"
+
+
+def test_memory_hit_and_lru_eviction(tmp_path):
+    cache = EmbeddingCache(tmp_path / "text.sqlite3", max_items=2)
+    cache.put("clip", "a", vec(1))
+    cache.put("clip", "b", vec(2))
+    assert cache.get("clip", "A ") is not None  # a is now most recently used
+    cache.put("clip", "c", vec(3))
+    assert list(cache._lru) == [("clip", "a"), ("clip", "c")]
+    assert cache.get("other-model", "a") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_evicted_entries_come_back_from_disk(tmp_path):
+    cache = EmbeddingCache(tmp_path / "text.sqlite3", max_items=1)
+    cache.put("clip", "a", vec(1))
+    cache.put("clip", "b", vec(2))
+    np.testing.assert_array_equal(cache.get("clip", "a"), vec(1))
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_restart_warms_most_hit_queries(tmp_path):
+    path = tmp_path / "text.sqlite3"
+    cache = EmbeddingCache(path, max_items=8)
+    for text, x in [("rare", 1), ("popular", 2), ("medium", 3)]:
+        cache.put("clip", text, vec(x))
+    for text, n in [("popular", 5), ("medium", 2)]:
+        for _ in range(n):
+            cache.get("clip", text)
+    cache.flush()
+    hits = dict(sqlite3.connect(str(path)).execute("SELECT query, hits FROM text_embeddings").fetchall())
+    assert hits == {"rare": 0, "popular": 5, "medium": 2}
+
+    restarted = EmbeddingCache(path, max_items=2)
+    np.testing.assert_array_equal(restarted.get("clip", "popular"), vec(2))
+    assert set(restarted._lru) == {("clip", "popular"), ("clip", "medium")}
+    assert restarted.stats()["disk_hits"] == 0
+
+
+def test_unwritable_path_falls_back_to_memory(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    cache = EmbeddingCache(blocker / "text.sqlite3", max_items=4)
+    cache.put("clip", "a", vec(1))
+    np.testing.assert_array_equal(cache.get("clip", "a"), vec(1))
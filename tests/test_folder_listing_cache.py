@@ -0,0 +1,87 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backend.services.drive import FolderListingCache
+
+
+class FakeDrive:
+    """list_children stand-in that counts calls and can hold them until released."""
+
+    def __init__(self, block=False):
+        self.calls = []
+        self.release = threading.Event()
+        if not block:
+            self.release.set()
+        self.fail = False
+
+    def __call__(self, folder_id):
+        self.calls.append(folder_id)
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError("Drive API error")
+        return [{"name": "a.png", "id": f"{folder_id}-a"}, {"name": "a.png", "id": f"{folder_id}-dup"},
+                {"name": "b.png", "id": f"{folder_id}-b"}]
+
+
+def test_concurrent_misses_list_the_folder_once():
+    drive = FakeDrive(block=True)
+    cache = FolderListingCache(16, 60, fetch=drive)
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        futures = [pool.submit(cache.get, "folder") for _ in range(5)]
+        deadline = time.monotonic() + 5
+        while cache.stats()["coalesced"] < 4 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        drive.release.set()
+        results = [f.result() for f in futures]
+
+    assert drive.calls == ["folder"]
+    assert all(r == {"a.png": "folder-a", "b.png": "folder-b"} for r in results)
+    stats = cache.stats()
+    assert (stats["misses"], stats["coalesced"], stats["hits"]) == (1, 4, 0)
+    cache.get("folder")
+    assert cache.stats()["hits"] == 1
+
+
+def test_failed_listing_is_raised_and_not_cached():
+    drive = FakeDrive()
+    drive.fail = True
+    cache = FolderListingCache(16, 60, fetch=drive)
+    with pytest.raises(RuntimeError):
+        cache.get("folder")
+    drive.fail = False
+    assert cache.get("folder")["b.png"] == "folder-b"
+    assert drive.calls == ["folder", "folder"]
+
+
+def test_expired_listings_are_fetched_again():
+    drive = FakeDrive()
+    cache = FolderListingCache(16, 0.05, fetch=drive)
+    cache.get("folder")
+    cache.get("folder")
+    time.sleep(0.1)
+    cache.get("folder")
+    assert drive.calls == ["folder", "folder"]
+
+
+def test_lru_eviction_and_invalidate():
+    drive = FakeDrive()
+    cache = FolderListingCache(2, 60, fetch=drive)
+    for folder in ["a", "b", "a", "c"]:
+        cache.get(folder)
+    assert cache.stats()["evictions"] == 1 and cache.stats()["folders"] == 2
+    cache.get("a")  # still cached: b was the least recently used
+    assert drive.calls == ["a", "b", "c"]
+    cache.invalidate("a")
+    cache.get("a")
+    assert drive.calls == ["a", "b", "c", "a"]
+
+
+def test_disabled_cache_always_lists():
+    drive = FakeDrive()
+    cache = FolderListingCache(0, 60, fetch=drive)
+    cache.get("folder")
+    cache.get("folder")
+    assert drive.calls == ["folder", "folder"]
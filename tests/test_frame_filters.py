@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+
+from backend.services.frame_filters import FrameFilters
+from backend.services.object_index import ObjectIndex, build_object_index
+
+FRAMES = [
+    (10, "kitti", "seq-a", "image_02", "a.png"),
+    (11, "kitti", "seq-a", "image_03", "b.png"),
+    (12, "kitti", "2011_09_26_drive_0001_sync", "image_02", "c.png"),  # excluded sequence
+    (13, "nuscenes", "scene-1", "CAM_FRONT", "d.jpg"),
+    (14, "nuscenes", "scene-1", "CAM_FRONT", "d.jpg"),  # same media_key as 13: not canonical
+    (15, "nuscenes", "scene-2", "CAM_BACK", "e.jpg"),
+]
+
+# (object_type, frame_id, confidence) as navis.frame_objects rows grouped by type and frame
+DETECTIONS = [
+    ("car", 10, 0.9),
+    ("car", 13, 0.4),
+    ("car", 15, 0.8),
+    ("car", 99, 0.9),  # frame not in the index
+    ("person", 10, 0.7),
+    ("person", 15, 0.4),
+]
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=()):
+        if params:
+            self.rows = [r for r in self.rows if r["confidence"] > params[0]]
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConn:
+    def __init__(self, detections):
+        self.detections = detections
+
+    def cursor(self):
+        return FakeCursor([{"object_type": t, "frame_id": f, "confidence": c} for t, f, c in self.detections])
+
+
+@pytest.fixture
+def store(make_store):
+    return make_store(FRAMES)
+
+
+@pytest.fixture
+def objects(store):
+    return build_object_index(FakeConn(DETECTIONS), store.rows_for_frame_ids, len(store))
+
+
+def rows(mask):
+    return np.flatnonzero(mask).tolist()
+
+
+def test_postings_are_sorted_rows_above_threshold(objects):
+    assert objects.object_types == ["car", "person"]
+    assert objects.postings("car").tolist() == [0, 5]
+    assert objects.postings("car", min_confidence=0.3).tolist() == [0, 3, 5]
+    assert objects.postings("person").tolist() == [0]
+    assert objects.postings("person", min_confidence=0.3).tolist() == [0, 5]
+    assert objects.postings("bus").tolist() == []
+
+
+def test_postings_keep_best_detection_per_row(store):
+    # Two frames on one row (a near-duplicate cluster): the row matches on the better one
+    index = build_object_index(
+        FakeConn([("car", 10, 0.2), ("car", 11, 0.7)]),
+        lambda frame_ids: np.zeros(len(frame_ids), dtype=np.int64),
+        len(store),
+    )
+    assert index.postings("car").tolist() == [0]
+    assert index.confidence.tolist() == pytest.approx([0.7])
+
+
+def test_match_any_and_all(objects):
+    assert objects.match(["car", "person"], mode="any").tolist() == [0, 5]
+    assert objects.match(["car", "person"], mode="all").tolist() == [0]
+    assert objects.match(["car", "person"], mode="all", min_confidence=0.3).tolist() == [0, 5]
+    assert objects.match([]).tolist() == []
+
+
+def test_object_index_round_trip(objects, tmp_path):
+    objects.save(tmp_path / "combined_objects")
+    loaded = ObjectIndex.load(tmp_path / "combined_objects")
+    assert loaded.ntotal == objects.ntotal
+    assert loaded.postings("car", min_confidence=0.3).tolist() == [0, 3, 5]
+
+
+def test_base_mask_drops_excluded_and_non_canonical(store, objects):
+    filters = FrameFilters(store, objects)
+    assert rows(filters.mask()) == [0, 1, 3, 5]
+
+
+def test_column_filters_are_anded(store, objects):
+    filters = FrameFilters(store, objects)
+    assert rows(filters.mask(dataset="kitti")) == [0, 1]
+    assert rows(filters.mask(dataset="nuscenes", sensor="CAM_BACK")) == [5]
+    assert rows(filters.mask(dataset="kitti", sequence="scene-1")) == []
+    assert rows(filters.mask(dataset="waymo")) == []
+
+
+def test_object_filter_combines_with_columns(store, objects):
+    filters = FrameFilters(store, objects)
+    assert rows(filters.mask(objects=["car"])) == [0, 5]
+    assert rows(filters.mask(objects=["car"], min_confidence=0.3)) == [0, 3, 5]
+    assert rows(filters.mask(dataset="nuscenes", objects=["car", "person"], objects_mode="all")) == []
+    assert rows(filters.mask(dataset="nuscenes", objects=["car", "person"], objects_mode="all",
+                             min_confidence=0.3)) == [5]
+
+
+def test_dataset_count(store, objects):
+    filters = FrameFilters(store, objects)
+    assert filters.dataset_count(filters.mask()) == 2
+    assert filters.dataset_count(filters.mask(sensor="image_02")) == 1
@@ -0,0 +1,51 @@
+from backend.services.index_meta import (
+    activate_index, index_key, prune_versions, read_manifest, split_index_key,
+)
+
+
+def make_version(index_dir, version, model="clip-vit-b-32", name="combined"):
+    path = index_dir / "versions" / version / model / f"{name}.index"
+    path.parent.mkdir(parents=True)
+    path.write_bytes(b"")
+    return path
+
+
+def test_index_keys():
+    assert index_key("clip-vit-l-14", "kitti") == "clip-vit-l-14/kitti"
+    assert split_index_key("clip-vit-l-14/kitti", "clip-vit-b-32") == ("clip-vit-l-14", "kitti")
+    assert split_index_key("combined", "clip-vit-b-32") == ("clip-vit-b-32", "combined")
+
+
+def test_activate_points_entry_and_bumps_version(tmp_path):
+    first = activate_index(tmp_path, "clip-vit-b-32/combined", make_version(tmp_path, "20250101T000000000000Z"))
+    second = activate_index(tmp_path, "clip-vit-b-32/combined", make_version(tmp_path, "20250102T000000000000Z"))
+    assert second["version"] != first["version"]
+    assert read_manifest(tmp_path) == second
+    assert second["indexes"] == {
+        "clip-vit-b-32/combined": "versions/20250102T000000000000Z/clip-vit-b-32/combined.index",
+    }
+    assert not list(tmp_path.glob(".manifest.json.*"))
+
+
+def test_activate_replaces_legacy_entry(tmp_path):
+    activate_index(tmp_path, "combined", make_version(tmp_path, "20250101T000000000000Z"))
+    manifest = activate_index(tmp_path, "clip-vit-b-32/combined", make_version(tmp_path, "20250102T000000000000Z"),
+                              replaces="combined")
+    assert list(manifest["indexes"]) == ["clip-vit-b-32/combined"]
+
+
+def test_prune_keeps_newest_and_referenced_versions(tmp_path):
+    versions = [f"2025010{d}T000000000000Z" for d in range(1, 6)]
+    paths = {v: make_version(tmp_path, v) for v in versions}
+    # The oldest version is still served for another model
+    activate_index(tmp_path, "clip-vit-l-14/combined", paths[versions[0]])
+    activate_index(tmp_path, "clip-vit-b-32/combined", paths[versions[4]])
+
+    removed = prune_versions(tmp_path, keep=2)
+    assert sorted(removed) == versions[1:3]
+    assert sorted(d.name for d in (tmp_path / "versions").iterdir()) == [versions[0]] + versions[3:]
+    assert prune_versions(tmp_path, keep=2) == []
+
+
+def test_prune_without_versions_dir(tmp_path):
+    assert prune_versions(tmp_path) == []
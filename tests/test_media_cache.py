@@ -0,0 +1,95 @@
+import os
+import time
+
+import pytest
+
+from backend.services.media_cache import MediaCache, MemoryCache
+
+
+def put_all(cache, sizes):
+    for name, size in sizes:
+        cache.put(name, b"x" * size)
+        time.sleep(0.01)  # distinct access times
+
+
+def test_round_trip_in_sharded_layout(tmp_path):
+    cache = MediaCache(tmp_path, 1000)
+    cache.put("file-id", b"payload")
+    key = MediaCache.key_for("file-id")
+    assert (tmp_path / key[:2] / key[2:4] / f"{key}.bin").read_bytes() == b"payload"
+    assert cache.get("file-id") == b"payload"
+    assert cache.get("missing") is None
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["hits"], stats["misses"]) == (1, 7, 1, 1)
+
+
+def test_lru_evicts_least_recently_used_to_low_watermark(tmp_path):
+    cache = MediaCache(tmp_path, 100, policy="lru", low_watermark=0.9)
+    put_all(cache, [("a", 40), ("b", 40)])
+    cache.get("a")
+    time.sleep(0.01)
+    cache.put("c", b"x" * 40)
+    assert [cache.contains(n) for n in "abc"] == [True, False, True]
+    stats = cache.stats()
+    assert (stats["bytes"], stats["evictions"], stats["evicted_bytes"]) == (80, 1, 40)
+
+
+def test_lfu_evicts_least_frequently_used(tmp_path):
+    cache = MediaCache(tmp_path, 130, policy="lfu", low_watermark=0.9)
+    put_all(cache, [("a", 40), ("b", 40), ("c", 40)])
+    for name in ["a", "a", "c"]:
+        cache.get(name)
+    cache.put("d", b"x" * 20)
+    assert [cache.contains(n) for n in "abcd"] == [True, False, True, True]
+
+
+def test_items_over_budget_and_disabled_cache_are_not_stored(tmp_path):
+    cache = MediaCache(tmp_path / "small", 10)
+    cache.put("big", b"x" * 11)
+    assert not cache.contains("big")
+    disabled = MediaCache(tmp_path / "off", 0)
+    disabled.put("a", b"x")
+    assert disabled.get("a") is None and not disabled.contains("a")
+
+
+def test_shared_directory_and_old_flat_layout(tmp_path):
+    MediaCache(tmp_path, 1000).put("written-by-other-process", b"shared")
+    key = MediaCache.key_for("old-layout")
+    (tmp_path / f"{key}.bin").write_bytes(b"flat")
+    stale = tmp_path / "ab" / "cd" / ".abcd.1.2.tmp"
+    stale.parent.mkdir(parents=True)
+    stale.write_bytes(b"partial")
+    old = time.time() - 7200
+    os.utime(stale, (old, old))
+
+    cache = MediaCache(tmp_path, 1000)
+    assert cache.get("old-layout") == b"flat"
+    assert cache.get("written-by-other-process") == b"shared"
+    assert not (tmp_path / f"{key}.bin").exists()
+    assert not stale.exists()
+    assert cache.stats()["bytes"] == 10
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        MediaCache("/tmp/unused", 10, policy="fifo")
+
+
+def test_memory_cache_byte_budget_lru():
+    cache = MemoryCache(100, max_item_bytes=60)
+    cache.put("a", "A", 40)
+    cache.put("b", "B", 40)
+    assert cache.get("a") == "A"
+    cache.put("c", "C", 40)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("A", None, "C")
+    cache.put("huge", "H", 61)
+    assert cache.get("huge") is None
+    cache.put("a", "A2", 10)
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["evictions"]) == (2, 50, 1)
+
+
+def test_memory_cache_disabled():
+    cache = MemoryCache(0)
+    cache.put("a", "A", 1)
+    assert cache.get("a") is None and cache.stats()["misses"] == 0
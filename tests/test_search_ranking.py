@@ -0,0 +1,81 @@
+from pathlib import Path
+
+import faiss
+import numpy as np
+import pytest
+
+from backend.routes import search
+from backend.services.frame_filters import FrameFilters
+from backend.services.object_index import ObjectIndex
+from backend.services.result_cache import ResultCache
+from backend.services.search_index import IndexBundle, Shard
+
+MODEL = "clip-vit-b-32"
+NO_FILTERS = search._filter_key("scene", None, None, None, None, "any", 0.5)
+
+# Six kitti frames close to the origin, three nuscenes frames far from it
+KITTI = [(i, "kitti", "seq-a", "image_02", f"kitti/{i}.png") for i in range(1, 7)]
+NUSCENES = [(i, "nuscenes", "scene-1", "CAM_FRONT", f"nuscenes/{i}.jpg") for i in range(7, 10)]
+VECTORS = np.array([[x, 0.0] for x in (1, 2, 3, 4, 5, 6, 10, 11, 12)], dtype=np.float32)
+
+
+@pytest.fixture
+def bundle(make_store):
+    store = make_store(KITTI + NUSCENES)
+    index = faiss.IndexFlatL2(2)
+    index.add(VECTORS)
+    objects = ObjectIndex({}, np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32), len(store))
+    shard = Shard("combined", Path("combined.index"), index, store.frame_ids, {}, store, FrameFilters(store, objects))
+    return IndexBundle("v1", {"combined": shard}, model=MODEL)
+
+
+@pytest.fixture
+def run_queries(bundle, monkeypatch):
+    """search._run_queries against ``bundle`` with every query text embedded at the origin."""
+    monkeypatch.setattr(search, "_ensure_backend", lambda model: bundle)
+    monkeypatch.setattr(search, "get_text_embeddings",
+                        lambda texts, encoder: np.zeros((len(texts), 2), dtype=np.float32))
+    monkeypatch.setattr(search, "_result_cache", ResultCache(16, 60))
+    return search._run_queries
+
+
+def frame_ids(ranked):
+    return [int(shard.store.frame_ids[row]) for _, shard, row in ranked]
+
+
+def test_interleave_round_robin_keeps_order_within_dataset():
+    labels = np.array([0, 0, 1, 0, 2, 1])
+    assert search._interleave_by_dataset(labels).tolist() == [0, 2, 4, 1, 5, 3]
+    assert search._interleave_by_dataset(np.array([], dtype=np.int64)).tolist() == []
+
+
+def test_rank_interleaves_merged_candidates(bundle):
+    candidates = bundle.search(np.zeros((1, 2), dtype=np.float32), 3)[0]
+    assert frame_ids(candidates) == [1, 2, 3, 4, 5, 6]
+    # Only kitti is within the candidate pool of k=3 (k per dataset)
+    assert frame_ids(search._rank(candidates, 3)) == [1, 2, 3]
+
+    candidates = bundle.search(np.zeros((1, 2), dtype=np.float32), 5)[0]
+    assert frame_ids(search._rank(candidates, 4)) == [1, 7, 2, 8]
+
+
+def test_ranking_does_not_depend_on_batch_mates(run_queries):
+    alone = run_queries([("cars", 2, MODEL, NO_FILTERS)])
+    batched = run_queries([("cars at night", 2, MODEL, NO_FILTERS), ("trucks", 5, MODEL, NO_FILTERS)])
+    assert frame_ids(alone[0][0]) == frame_ids(batched[0][0]) == [1, 2]
+    assert frame_ids(batched[1][0]) == [1, 7, 2, 8, 3]
+
+
+def test_repeated_query_is_served_from_result_cache(run_queries):
+    first = run_queries([("cars", 3, MODEL, NO_FILTERS)])
+    again = run_queries([("Cars ", 3, MODEL, NO_FILTERS), ("cars", 4, MODEL, NO_FILTERS)])
+    assert first[0][1] is False
+    assert again[0][1] is True and frame_ids(again[0][0]) == frame_ids(first[0][0])
+    assert again[1][1] is False  # another depth is another entry
+
+
+def test_filters_restrict_candidates(run_queries):
+    nuscenes_only = search._filter_key("scene", "nuscenes", None, None, None, "any", 0.5)
+    results = run_queries([("cars", 5, MODEL, nuscenes_only), ("cars", 5, MODEL, NO_FILTERS)])
+    assert frame_ids(results[0][0]) == [7, 8, 9]
+    assert frame_ids(results[1][0]) == [1, 7, 2, 8, 3]